@@ -0,0 +1,79 @@
+"""
+Fabrique de l'application : create_app() configure les extensions et enregistre
+les blueprints. Aucune application n'est créée à l'import des modules, ce qui
+garde rapides le démarrage des workers et la collecte des tests
+(benchmarks/bench_importtime.py mesure ce coût).
+
+    flask --app application run            (la CLI Flask trouve create_app)
+    gunicorn -c gunicorn.conf.py           (wsgi.create_app, avec préchauffage)
+"""
+import os
+import secrets
+
+from flask import Flask
+
+from auth import init_auth
+from cache import cache
+from config import Config
+from db_pool import init_db_pool
+from depts import init_depts
+from models import db
+from session_backend import init_sessions
+from sql_stats import init_sql_stats
+from warmup import init_warmup
+
+
+def create_app(config=None):
+    """Crée et configure l'application ; `config` remplace des clés de Config (tests, benchmarks)."""
+    app = Flask(__name__)
+
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    # Configuration de base
+    app.config.from_object(Config)
+    if config:
+        app.config.update(config)
+
+    # Clé identique dans tous les workers : une clé aléatoire invaliderait les sessions d'un worker à l'autre
+    if not app.config['SECRET_KEY']:
+        if not (app.debug or app.testing):
+            raise RuntimeError("La variable d'environnement SECRET_KEY doit être définie.")
+        app.config['SECRET_KEY'] = secrets.token_hex(24)
+
+    # Initialisation de la session (stockage choisi par SESSION_TYPE, voir session_backend.py)
+    init_sessions(app)
+
+    # Initialisation de l'authentification
+    init_auth(app)
+
+    # Initialisation de la base de données (pools mesurés, voir db_pool.py)
+    init_db_pool(app)
+    db.init_app(app)
+
+    # Nombre et durée des requêtes SQL de chaque requête HTTP, par base
+    init_sql_stats(app)
+
+    # Initialisation du cache applicatif
+    cache.init_app(app)
+
+    # Chargement du contour des départements (une seule fois par worker)
+    init_depts(app)
+
+    # État du préchauffage des caches, lu par /ready (préchauffage lancé par wsgi.create_app)
+    init_warmup(app)
+
+    # Flask-Migrate importe alembic : il n'est chargé que par la CLI Flask (commandes « flask db »)
+    if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    from geo_views import bp as geo_bp
+    from views import bp as main_bp
+    app.register_blueprint(main_bp)
+    app.register_blueprint(geo_bp)
+
+    return app
+
+
+if __name__ == "__main__":
+    create_app().run(host="0.0.0.0", port=8000)
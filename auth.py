@@ -1,15 +1,91 @@
-from flask import Flask, redirect, request, session, url_for, render_template, flash
+"""
+Authentification Microsoft 365 (Entra ID) par MSAL.
+
+Une seule application MSAL est créée par processus (la découverte de l'autorité
+n'est faite qu'une fois). Son cache de jetons délègue au cache de l'utilisateur
+courant, sérialisé dans la session Flask. Les appels HTTP vers Entra ID et
+Microsoft Graph passent par une session requests partagée (pool de connexions,
+délais d'attente) ; le profil Graph /me est mis en cache GRAPH_PROFILE_TTL
+secondes par utilisateur. AZURE_AUTHORITY et GRAPH_API_URL permettent de
+travailler contre un fournisseur d'identité bouchon (voir tools/identity_stub.py).
+msal n'est importé qu'à la première connexion.
+"""
+import threading
+from functools import wraps
+from flask import Flask, abort, current_app, g, redirect, request, session, url_for, render_template, flash
 from flask_login import LoginManager, UserMixin, login_user, logout_user, current_user, login_required
-import msal
 from config import Config
 import uuid
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from cache import cache
+from session_backend import stores_tokens
 
 login_manager = LoginManager()
 login_manager.login_view = 'login'
 login_manager.login_message = 'Veuillez vous connecter pour accéder à cette page.'
 login_manager.login_message_category = 'info'
 
+GRAPH_PROFILE_KEY = 'graph:me:{oid}'
+TOKEN_CACHE_SESSION_KEY = 'msal_token_cache'
+
+_lock = threading.RLock()
+_http = None
+_msal_app = None
+
+
+def get_http_session():
+    """Session HTTP du processus pour Entra ID et Microsoft Graph (pool de connexions, nouvelles tentatives sur GET)."""
+    global _http
+    if _http is None:
+        with _lock:
+            if _http is None:
+                retry = Retry(
+                    total=2,
+                    backoff_factor=0.3,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=frozenset(['GET']),
+                    respect_retry_after_header=True,
+                    raise_on_status=False
+                )
+                http = requests.Session()
+                http.mount('http://', HTTPAdapter(max_retries=retry, pool_maxsize=10))
+                http.mount('https://', HTTPAdapter(max_retries=retry, pool_maxsize=10))
+                _http = http
+    return _http
+
+
+def _http_timeout():
+    return (current_app.config['GRAPH_CONNECT_TIMEOUT'], current_app.config['GRAPH_READ_TIMEOUT'])
+
+
+def get_graph_profile(token, oid=None):
+    """
+    Profil Microsoft Graph (/me) de l'utilisateur du jeton.
+    Il est mis en cache par identifiant d'objet Entra ID (oid) lorsqu'il est connu.
+    Les erreurs HTTP et réseau (requests.RequestException) sont propagées.
+    """
+    key = GRAPH_PROFILE_KEY.format(oid=oid) if oid else None
+    if key:
+        profile = cache.get(key)
+        if profile is not None:
+            return profile
+
+    response = get_http_session().get(
+        f"{current_app.config['GRAPH_API_URL']}/me",
+        headers={'Authorization': f'Bearer {token}'},
+        timeout=_http_timeout()
+    )
+    response.raise_for_status()
+    profile = response.json()
+
+    if key:
+        cache.set(key, profile, timeout=current_app.config['GRAPH_PROFILE_TTL'])
+    return profile
+
+
 class User(UserMixin):
     def __init__(self, id, name, email, token=None):
         self.id = id
@@ -18,13 +94,10 @@ class User(UserMixin):
         self.token = token
 
     @staticmethod
-    def get_user_from_token(token):
-        """Récupère les informations de l'utilisateur à partir du token"""
-        graph_data = requests.get(
-            'https://graph.microsoft.com/v1.0/me',
-            headers={'Authorization': f'Bearer {token}'},
-        ).json()
-        
+    def get_user_from_token(token, oid=None):
+        """Récupère les informations de l'utilisateur à partir du token (profil Graph en cache)"""
+        graph_data = get_graph_profile(token, oid)
+
         return User(
             id=graph_data.get('id'),
             name=graph_data.get('displayName'),
@@ -49,30 +122,86 @@ def load_user(user_id):
         token=user_data.get('token')
     )
 
-def _build_msal_app(cache=None):
-    """Construit l'application MSAL pour l'authentification"""
-    return msal.ConfidentialClientApplication(
-        Config.CLIENT_ID,
-        authority=Config.AUTHORITY,
-        client_credential=Config.CLIENT_SECRET,
-        token_cache=cache
-    )
+def admin_required(view):
+    """Réserve une route aux utilisateurs connectés dont l'adresse figure dans ADMIN_EMAILS."""
+    @wraps(view)
+    def decorated(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return login_manager.unauthorized()
+        if (current_user.email or '').lower() not in current_app.config['ADMIN_EMAILS']:
+            abort(403)
+        return view(*args, **kwargs)
+    return decorated
+
+def _user_token_cache():
+    """Cache de jetons MSAL de l'utilisateur courant, chargé depuis la session une fois par requête."""
+    if 'msal_token_cache' not in g:
+        import msal
+
+        token_cache = msal.SerializableTokenCache()
+        if session.get(TOKEN_CACHE_SESSION_KEY):
+            token_cache.deserialize(session[TOKEN_CACHE_SESSION_KEY])
+        g.msal_token_cache = token_cache
+    return g.msal_token_cache
+
+
+def _save_token_cache():
+    """Enregistre dans la session le cache de jetons de l'utilisateur s'il a changé."""
+    # Les sessions par cookie sont trop petites pour le cache de jetons
+    if not stores_tokens(current_app):
+        return
+    token_cache = g.get('msal_token_cache')
+    if token_cache is not None and token_cache.has_state_changed:
+        session[TOKEN_CACHE_SESSION_KEY] = token_cache.serialize()
+
+
+class SessionTokenCache:
+    """
+    Cache de jetons de l'application MSAL partagée : chaque accès est délégué au cache
+    de l'utilisateur de la requête en cours, les jetons ne sont donc jamais mélangés.
+    """
+
+    def __getattr__(self, name):
+        return getattr(_user_token_cache(), name)
+
+
+def get_msal_app():
+    """Application MSAL du processus, créée au premier appel à partir de la configuration."""
+    global _msal_app
+    if _msal_app is None:
+        with _lock:
+            if _msal_app is None:
+                import msal
+
+                config = current_app.config
+                _msal_app = msal.ConfidentialClientApplication(
+                    config['CLIENT_ID'],
+                    authority=config['AUTHORITY'],
+                    client_credential=config['CLIENT_SECRET'],
+                    token_cache=SessionTokenCache(),
+                    http_client=get_http_session(),
+                    timeout=_http_timeout(),
+                    validate_authority=config['AZURE_VALIDATE_AUTHORITY'],
+                    instance_discovery=config['AZURE_VALIDATE_AUTHORITY']
+                )
+    return _msal_app
 
 def _build_auth_url(authority=None, scopes=None, state=None):
     """Construit l'URL d'authentification"""
-    return _build_msal_app().get_authorization_request_url(
+    return get_msal_app().get_authorization_request_url(
         scopes or Config.SCOPE,
         state=state or str(uuid.uuid4()),
         redirect_uri=url_for('auth_callback', _external=True, _scheme='https')
     )
 
 def _get_token_from_code(code):
-    """Récupère le token à partir du code d'autorisation"""
-    result = _build_msal_app().acquire_token_by_authorization_code(
+    """Récupère le token à partir du code d'autorisation (conservé dans le cache de jetons de la session)"""
+    result = get_msal_app().acquire_token_by_authorization_code(
         code,
         scopes=Config.SCOPE,
         redirect_uri=url_for('auth_callback', _external=True, _scheme='https')
     )
+    _save_token_cache()
     return result
 
 def init_auth(app):
@@ -83,7 +212,7 @@ def init_auth(app):
     def login():
         """Page de connexion"""
         if current_user.is_authenticated:
-            return redirect(url_for('map_page'))
+            return redirect(url_for('main.map_page'))
         
         # Génère l'URL d'authentification Microsoft
         auth_url = _build_auth_url()
@@ -106,21 +235,27 @@ def init_auth(app):
             
             # Récupère les informations de l'utilisateur
             token = result.get('access_token')
-            user = User.get_user_from_token(token)
+            try:
+                user = User.get_user_from_token(token, result.get('id_token_claims', {}).get('oid'))
+            except requests.RequestException as e:
+                flash(f"Erreur lors de la récupération du profil Microsoft 365 : {e}", 'danger')
+                return redirect(url_for('login'))
             
             # Sauvegarde l'utilisateur dans la session
             session['user'] = {
                 'id': user.id,
                 'name': user.name,
                 'email': user.email,
-                'token': token
             }
+            # Jeton d'accès conservé seulement si la session est stockée côté serveur
+            if stores_tokens(app):
+                session['user']['token'] = token
             
             # Connecte l'utilisateur
             login_user(user)
             
             # Redirige vers la page demandée ou la page d'accueil
-            next_page = session.get('next', url_for('map_page'))
+            next_page = session.get('next', url_for('main.map_page'))
             session.pop('next', None)
             return redirect(next_page)
         
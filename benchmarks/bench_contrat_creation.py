@@ -0,0 +1,198 @@
+"""
+Compare l'enregistrement d'un contrat saisi : enchaînement historique de COMMIT
+(un par table, et un par type de milieu) contre contrats.create_contrat
+(une seule transaction, flush() et insertions d'association par lots).
+
+Mesure pour chaque chemin le nombre d'allers-retours SQL (requêtes + COMMIT)
+et la latence par contrat créé. Les contrats sont réellement validés en base
+(le coût du COMMIT fait partie de la mesure) puis supprimés à la fin :
+utiliser une base de test.
+
+Usage :
+    python benchmarks/bench_contrat_creation.py --count 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date
+
+from sqlalchemy import delete, event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from application import create_app  # noqa: E402
+from models import (  # noqa: E402
+    db, Agriculteur, AgriculteurSociete, Contrat, ContratSiteCEN, ProduitFiniContrat, Referent,
+    Societe, TypeContrat, TypeMilieu, TypeMilieuContrat, TypeProduction, TypeProductionSociete,
+    TypeProduitFini, VueSites
+)
+from contrats import MODE_PRODUCTION_BIO, MODE_PRODUCTION_CONV, create_contrat  # noqa: E402
+
+app = create_app()
+
+
+def sample_data(i, referentiels):
+    """Saisie synthétique n°i (nouvelle société, 3 milieux, 2 produits finis, 2 productions)."""
+    return {
+        "nom_societe": f"Bench création {i}",
+        "siret": f"98{i:012d}",
+        "telephone": None,
+        "email": None,
+        "adresse_etablissement": None,
+        "tranche_effectif": None,
+        "categorie_juridique": None,
+        "activite_principale": None,
+        "nom_agri": f"Nom {i}",
+        "prenom_agri": f"Prénom {i}",
+        "date_naissance": None,
+        "nom_referent": "Bench",
+        "prenom_referent": "Référent",
+        "surf_contractualisee": 1.5,
+        "date_signature": date(2024, 1, 1),
+        "date_fin": date(2030, 1, 1),
+        "date_prise_effet": date(2024, 1, 1),
+        "latitude": 44.5,
+        "longitude": -0.5,
+        "remarques": None,
+        "appellation_contrat": referentiels["type_contrat"],
+        "code_site": "BENCH",
+        "nom_site": "Site bench",
+        "type_production_bio": referentiels["productions"][:1],
+        "type_production_conv": referentiels["productions"][1:2],
+        "type_milieu": referentiels["milieux"][:3],
+        "produit_fini": referentiels["produits"][:2],
+    }
+
+
+def create_contrat_legacy(data):
+    """Enregistrement historique de map_page : un COMMIT après chaque table (et chaque type de milieu)."""
+    societe = Societe(
+        nom_societe=data["nom_societe"], telephone=data["telephone"], email=data["email"], siret=data["siret"],
+        adresse_etablissement=data["adresse_etablissement"], tranche_effectif=data["tranche_effectif"],
+        categorie_juridique=data["categorie_juridique"], activite_principale=data["activite_principale"]
+    )
+    db.session.add(societe)
+    db.session.commit()
+
+    agriculteur = Agriculteur(nom_agri=data["nom_agri"], prenom_agri=data["prenom_agri"], date_naissance=data["date_naissance"])
+    db.session.add(agriculteur)
+    db.session.commit()
+
+    db.session.add(AgriculteurSociete(id_agriculteur=agriculteur.id_agriculteur, id_societe=societe.id_societe))
+    db.session.commit()
+
+    for key, mode in (("type_production_bio", MODE_PRODUCTION_BIO), ("type_production_conv", MODE_PRODUCTION_CONV)):
+        for production_id in data[key]:
+            db.session.add(TypeProductionSociete(
+                id_societe=societe.id_societe, id_type_production=int(production_id), id_mode_production=mode
+            ))
+    db.session.commit()
+
+    referent = Referent.query.filter_by(nom_referent=data["nom_referent"], prenom_referent=data["prenom_referent"]).first()
+    if not referent:
+        referent = Referent(nom_referent=data["nom_referent"], prenom_referent=data["prenom_referent"])
+        db.session.add(referent)
+        db.session.commit()
+
+    contrat = Contrat(
+        surf_contractualisee=data["surf_contractualisee"], date_signature=data["date_signature"],
+        date_fin=data["date_fin"], date_prise_effet=data["date_prise_effet"], latitude=data["latitude"],
+        longitude=data["longitude"], remarques=data["remarques"], id_societe=societe.id_societe,
+        id_referent=referent.id_referent, id_type_contrat=data["appellation_contrat"]
+    )
+    db.session.add(contrat)
+    db.session.commit()
+
+    vue_site = VueSites.query.filter_by(codesite=data["code_site"]).first()
+    site_id = vue_site.idsite if vue_site else db.session.query(db.func.nextval('saisie.site_cen_id_site_seq')).scalar()
+    db.session.add(ContratSiteCEN(
+        id_site=site_id, id_contrat=contrat.id_contrat, code_site=data["code_site"], nom_site=data["nom_site"]
+    ))
+    db.session.commit()
+
+    for milieu_id in data["type_milieu"]:
+        db.session.add(TypeMilieuContrat(id_type_milieu=int(milieu_id), id_contrat=contrat.id_contrat))
+        db.session.commit()
+
+    for produit_fini_id in data["produit_fini"]:
+        db.session.add(ProduitFiniContrat(id_type_produit_fini=int(produit_fini_id), id_contrat=contrat.id_contrat))
+    db.session.commit()
+    return contrat
+
+
+def cleanup():
+    """Supprime les contrats, sociétés, agriculteurs et le référent créés par la mesure."""
+    societe_ids = db.session.execute(
+        db.select(Societe.id_societe).where(Societe.nom_societe.like("Bench création %"))
+    ).scalars().all()
+    contrat_ids = db.select(Contrat.id_contrat).where(Contrat.id_societe.in_(societe_ids))
+    agriculteur_ids = db.session.execute(
+        db.select(AgriculteurSociete.id_agriculteur).where(AgriculteurSociete.id_societe.in_(societe_ids))
+    ).scalars().all()
+
+    for model in (TypeMilieuContrat, ProduitFiniContrat, ContratSiteCEN):
+        db.session.execute(delete(model).where(model.id_contrat.in_(contrat_ids)))
+    db.session.execute(delete(Contrat).where(Contrat.id_societe.in_(societe_ids)))
+    db.session.execute(delete(TypeProductionSociete).where(TypeProductionSociete.id_societe.in_(societe_ids)))
+    db.session.execute(delete(AgriculteurSociete).where(AgriculteurSociete.id_societe.in_(societe_ids)))
+    db.session.execute(delete(Agriculteur).where(Agriculteur.id_agriculteur.in_(agriculteur_ids)))
+    db.session.execute(delete(Societe).where(Societe.id_societe.in_(societe_ids)))
+    db.session.execute(delete(Referent).where(Referent.nom_referent == "Bench", Referent.prenom_referent == "Référent"))
+    db.session.commit()
+
+
+def measure(create, datas):
+    """Retourne (allers-retours par contrat, latence moyenne en ms, latence p95 en ms)."""
+    round_trips = []
+
+    def count_round_trip(*args):
+        round_trips.append(1)
+
+    # Les deux moteurs comptent : la recherche du site interroge la base secondaire
+    engines = (db.engines[None], db.engines['secondary'])
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", count_round_trip)
+        event.listen(engine, "commit", count_round_trip)
+    latencies = []
+    try:
+        for data in datas:
+            start = time.perf_counter()
+            create(data)
+            latencies.append((time.perf_counter() - start) * 1000)
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", count_round_trip)
+            event.remove(engine, "commit", count_round_trip)
+
+    p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+    return len(round_trips) / len(datas), statistics.mean(latencies), p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=200, help="Nombre de contrats créés par chemin")
+    args = parser.parse_args()
+
+    with app.app_context():
+        referentiels = {
+            "type_contrat": db.session.query(TypeContrat.id_type_contrat).limit(1).scalar(),
+            "milieux": db.session.execute(db.select(TypeMilieu.id_type_milieu).limit(3)).scalars().all(),
+            "produits": db.session.execute(db.select(TypeProduitFini.id_type_produit_fini).limit(2)).scalars().all(),
+            "productions": db.session.execute(db.select(TypeProduction.id_type_production).limit(2)).scalars().all(),
+        }
+        try:
+            for label, create, offset in (("COMMIT par table", create_contrat_legacy, 0),
+                                          ("create_contrat", create_contrat, args.count)):
+                datas = [sample_data(offset + i, referentiels) for i in range(args.count)]
+                per_contrat, mean, p95 = measure(create, datas)
+                print(f"{label:17}  {args.count:5d} contrats  {per_contrat:5.1f} allers-retours/contrat  "
+                      f"moyenne {mean:7.2f} ms  p95 {p95:7.2f} ms")
+        finally:
+            db.session.rollback()
+            cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Compare la lecture des contrats de la carte : graphe ORM (selectinload), requête SQL à plat
+et table saisie.contrat_map.
+
+Pour chaque volume, des contrats synthétiques sont insérés dans une transaction
+annulée à la fin : la base configurée (.env) n'est pas modifiée, mais il est
+préférable d'utiliser une base de test.
+
+Usage :
+    python benchmarks/bench_contrats_projection.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date
+
+from sqlalchemy import event, insert
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from application import create_app  # noqa: E402
+from models import (  # noqa: E402
+    db, Agriculteur, AgriculteurSociete, Contrat, ContratSiteCEN, ProduitFiniContrat, Referent,
+    Societe, TypeContrat, TypeMilieu, TypeMilieuContrat, TypeProduction, TypeProductionSociete,
+    TypeProduitFini
+)
+from contrats import iter_contrats, iter_contrats_flat, iter_contrats_orm, sync_contrat_map  # noqa: E402
+
+app = create_app()
+
+
+def seed(size):
+    """Insère `size` contrats synthétiques (une société et un agriculteur par contrat)."""
+    type_contrat = db.session.query(TypeContrat.id_type_contrat).limit(1).scalar()
+    milieu = db.session.query(TypeMilieu.id_type_milieu).limit(1).scalar()
+    produit = db.session.query(TypeProduitFini.id_type_produit_fini).limit(1).scalar()
+    production = db.session.query(TypeProduction.id_type_production).limit(1).scalar()
+
+    referent_ids = db.session.execute(
+        insert(Referent).returning(Referent.id_referent),
+        [{"nom_referent": f"Référent {i}", "prenom_referent": "Bench"} for i in range(20)]
+    ).scalars().all()
+    societe_ids = db.session.execute(
+        insert(Societe).returning(Societe.id_societe),
+        [{"nom_societe": f"Société {i}", "siret": f"99{i:012d}"} for i in range(size)]
+    ).scalars().all()
+    agriculteur_ids = db.session.execute(
+        insert(Agriculteur).returning(Agriculteur.id_agriculteur),
+        [{"nom_agri": f"Nom {i}", "prenom_agri": f"Prénom {i}"} for i in range(size)]
+    ).scalars().all()
+    db.session.execute(insert(AgriculteurSociete), [
+        {"id_agriculteur": a, "id_societe": s} for a, s in zip(agriculteur_ids, societe_ids)
+    ])
+    if production:
+        db.session.execute(insert(TypeProductionSociete), [
+            {"id_societe": s, "id_type_production": production, "id_mode_production": 1} for s in societe_ids
+        ])
+
+    contrat_ids = db.session.execute(
+        insert(Contrat).returning(Contrat.id_contrat),
+        [{
+            "id_societe": s,
+            "id_referent": referent_ids[i % len(referent_ids)],
+            "id_type_contrat": type_contrat,
+            "surf_contractualisee": 1.5,
+            "date_signature": date(2024, 1, 1),
+            "date_prise_effet": date(2024, 1, 1),
+            "date_fin": date(2030, 1, 1),
+            "latitude": 44.5 + (i % 1000) / 1000,
+            "longitude": -0.5 + (i % 1000) / 1000,
+        } for i, s in enumerate(societe_ids)]
+    ).scalars().all()
+    db.session.execute(insert(ContratSiteCEN), [
+        {"id_site": 900000 + i, "id_contrat": c, "code_site": f"B{i}", "nom_site": f"Site {i}"}
+        for i, c in enumerate(contrat_ids)
+    ])
+    if milieu:
+        db.session.execute(insert(TypeMilieuContrat), [{"id_type_milieu": milieu, "id_contrat": c} for c in contrat_ids])
+    if produit:
+        db.session.execute(insert(ProduitFiniContrat), [{"id_type_produit_fini": produit, "id_contrat": c} for c in contrat_ids])
+    db.session.flush()
+
+
+def measure(loader):
+    """Retourne (nombre de contrats, requêtes SQL, durée en s, pic mémoire en Mo) d'un chargement complet."""
+    queries = []
+
+    def count_query(*args):
+        queries.append(1)
+
+    event.listen(db.engine, "before_cursor_execute", count_query)
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        count = sum(1 for _ in loader())
+    finally:
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        event.remove(db.engine, "before_cursor_execute", count_query)
+    return count, len(queries), elapsed, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    with app.app_context():
+        for size in args.sizes:
+            seed(size)
+            # Table de la carte remplie dans la transaction du jeu de données : annulée avec lui
+            sync_contrat_map(contrat_ids=db.session.execute(db.select(Contrat.id_contrat)).scalars().all())
+            for label, loader in (("ORM", iter_contrats_orm), ("SQL à plat", iter_contrats_flat),
+                                  ("Table", iter_contrats)):
+                db.session.expunge_all()
+                count, queries, elapsed, peak = measure(loader)
+                print(f"{size:7d} contrats  {label:10}  {count:7d} lus  {queries:6d} requêtes  "
+                      f"{elapsed:8.2f} s  pic {peak:8.1f} Mo")
+            db.session.rollback()
+
+
+if __name__ == '__main__':
+    main()
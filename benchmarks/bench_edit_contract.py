@@ -0,0 +1,72 @@
+"""
+Compte les requêtes SQL d'un affichage (GET) de la page de modification d'un contrat.
+
+La page est demandée une première fois pour remplir les caches (référentiels,
+empreinte des sites, cache LRU des sites par code), puis --repeat fois en
+comptant les requêtes exécutées sur chaque base. Le code de sortie vaut 1 si
+un affichage dépasse --max-queries requêtes.
+
+Usage :
+    python benchmarks/bench_edit_contract.py [--contract-id 12] --max-queries 1
+"""
+import argparse
+import os
+import sys
+import time
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from application import create_app  # noqa: E402
+from models import db, Contrat  # noqa: E402
+
+app = create_app()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--contract-id', type=int, help="Contrat affiché (le premier contrat par défaut)")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--max-queries', type=int, default=1, help="Nombre maximal de requêtes par affichage")
+    args = parser.parse_args()
+
+    with app.app_context():
+        contract_id = args.contract_id or db.session.query(db.func.min(Contrat.id_contrat)).scalar()
+        if contract_id is None:
+            sys.exit("Aucun contrat en base.")
+        engines = {bind or 'principale': engine for bind, engine in db.engines.items()}
+
+    client = app.test_client()
+    url = f"/edit_contract/{contract_id}"
+    response = client.get(url)
+    if response.status_code != 200:
+        sys.exit(f"{url} : réponse {response.status_code}")
+
+    counts = {name: 0 for name in engines}
+    listeners = {}
+    for name, engine in engines.items():
+        def count_query(*args, name=name):
+            counts[name] += 1
+        listeners[name] = count_query
+        event.listen(engine, "before_cursor_execute", count_query)
+
+    start = time.perf_counter()
+    try:
+        for _ in range(args.repeat):
+            client.get(url)
+    finally:
+        elapsed = time.perf_counter() - start
+        for name, engine in engines.items():
+            event.remove(engine, "before_cursor_execute", listeners[name])
+
+    per_request = {name: count / args.repeat for name, count in counts.items()}
+    total = sum(per_request.values())
+    detail = "  ".join(f"{name} {count:.1f}" for name, count in per_request.items())
+    print(f"{url}  {total:.1f} requêtes par affichage ({detail})  {elapsed / args.repeat * 1000:.1f} ms")
+
+    sys.exit(1 if total > args.max_queries else 0)
+
+
+if __name__ == '__main__':
+    main()
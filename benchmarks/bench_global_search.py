@@ -0,0 +1,66 @@
+"""
+Mesure la latence de la recherche globale (search.global_search) sur
+l'index matérialisé saisie.search_index, à 100 000 contrats par défaut.
+
+Les contrats synthétiques de bench_contrats_projection sont insérés puis
+l'index est recalculé dans une transaction annulée à la fin. Les migrations
+doivent avoir été appliquées (flask db upgrade). Utiliser une base de test.
+Le code de sortie vaut 1 si le p95 d'un terme dépasse --max-p95.
+
+Usage :
+    python benchmarks/bench_global_search.py --size 100000 --max-p95 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models import db  # noqa: E402
+from search import global_search  # noqa: E402
+from bench_contrats_projection import app, seed  # noqa: E402
+
+# Préfixes courts, SIRET, noms sans accents, code de site, faute de frappe
+TERMS = ("so", "societe 42", "99000000012", "prenom 7", "nom 123", "b12", "referent", "socete 9")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=100000, help="Nombre de contrats synthétiques")
+    parser.add_argument('--repeat', type=int, default=50, help="Nombre d'exécutions par terme")
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--max-p95', type=float, default=20.0, help="Seuil de latence p95 (ms)")
+    args = parser.parse_args()
+
+    over_threshold = False
+    with app.app_context():
+        try:
+            start = time.perf_counter()
+            seed(args.size)
+            db.session.execute(text("REFRESH MATERIALIZED VIEW saisie.search_index"))
+            db.session.execute(text("ANALYZE saisie.search_index"))
+            print(f"{args.size} contrats insérés et indexés en {time.perf_counter() - start:.1f} s")
+
+            for term in TERMS:
+                latencies = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    results = global_search(term, limit=args.limit)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+                over_threshold = over_threshold or p95 > args.max_p95
+                print(f"{term!r:16} {len(results):3d} résultats  médiane {statistics.median(latencies):7.2f} ms  "
+                      f"p95 {p95:7.2f} ms{'  > seuil' if p95 > args.max_p95 else ''}")
+        finally:
+            db.session.rollback()
+
+    sys.exit(1 if over_threshold else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Mesure le temps d'import de l'application (python -X importtime), qui retarde
+le démarrage de chaque worker et la collecte des tests.
+
+Chaque mesure est faite dans un nouvel interpréteur ; la meilleure des
+--repeat mesures est retenue. Avec --create-app, create_app() est aussi
+appelé (sans connexion à la base). Le script affiche les --top modules les
+plus coûteux et sort avec le code 1 si le temps dépasse --max-ms ou si une
+bibliothèque qui doit rester importée au premier usage (LAZY_MODULES) a été
+chargée.
+
+Usage :
+    python benchmarks/bench_importtime.py --max-ms 800 [--create-app]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Bibliothèques lourdes importées seulement lorsqu'elles servent (voir sites_cen.py, auth.py, application.py)
+LAZY_MODULES = ('shapely', 'numpy', 'msal', 'flask_migrate', 'alembic')
+
+
+def measure(code):
+    """Exécute `code` sous -X importtime : {module: (propre, cumulé)} en microsecondes, modules de premier niveau."""
+    env = dict(os.environ, SECRET_KEY=os.environ.get('SECRET_KEY') or 'bench-importtime')
+    env.pop('FLASK_RUN_FROM_CLI', None)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(result.stderr)
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us), not name[1:].startswith(' '))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-ms', type=float, default=800, help="Temps d'import maximal (ms)")
+    parser.add_argument('--top', type=int, default=15, help="Nombre de modules affichés")
+    parser.add_argument('--create-app', action='store_true', help="Appeler aussi create_app()")
+    args = parser.parse_args()
+
+    code = "import application"
+    if args.create_app:
+        code += "; application.create_app()"
+
+    runs = [measure(code) for _ in range(args.repeat)]
+    totals = [sum(self_us for self_us, _, _ in modules.values()) / 1000 for modules in runs]
+    best = min(range(len(runs)), key=lambda i: totals[i])
+    modules = runs[best]
+
+    print(f"{code} : {totals[best]:.1f} ms (meilleure de {args.repeat} mesures, pire {max(totals):.1f} ms)")
+    top_level = sorted(
+        ((name, cumulative) for name, (_, cumulative, is_top) in modules.items() if is_top),
+        key=lambda item: item[1], reverse=True
+    )
+    for name, cumulative in top_level[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    loaded = sorted({name.split('.')[0] for name in modules} & set(LAZY_MODULES))
+    if loaded:
+        print(f"Importés alors qu'ils devraient l'être au premier usage : {', '.join(loaded)}")
+
+    sys.exit(1 if totals[best] > args.max_ms or loaded else 0)
+
+
+if __name__ == '__main__':
+    main()
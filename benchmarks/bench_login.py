@@ -0,0 +1,76 @@
+"""
+Test de charge de la connexion (/auth/callback) contre le fournisseur
+d'identité bouchon (tools/identity_stub.py), qui doit être lancé et configuré
+comme l'indique sa documentation (AZURE_AUTHORITY, GRAPH_API_URL...).
+
+--threads clients se connectent --logins fois chacun avec un code d'un des
+--users utilisateurs. Le script affiche les latences de la connexion et le
+nombre d'appels reçus par le bouchon : l'application MSAL n'est créée
+qu'une fois par processus (une seule découverte OpenID), et le profil Graph
+/me n'est demandé qu'une fois par utilisateur pendant GRAPH_PROFILE_TTL.
+
+Usage :
+    python benchmarks/bench_login.py --stub https://127.0.0.1:8766 --threads 10 --logins 50
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from application import create_app  # noqa: E402
+
+app = create_app()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stub', default='https://127.0.0.1:8766', help="URL du fournisseur d'identité bouchon")
+    parser.add_argument('--threads', type=int, default=10)
+    parser.add_argument('--logins', type=int, default=50, help="Connexions par client")
+    parser.add_argument('--users', type=int, default=10, help="Nombre d'utilisateurs distincts")
+    args = parser.parse_args()
+
+    stats_before = requests.get(f"{args.stub}/stats", timeout=5).json()
+    latencies, failures = [], []
+    lock = threading.Lock()
+
+    def client():
+        http = app.test_client()
+        for _ in range(args.logins):
+            start = time.perf_counter()
+            response = http.get(f"/auth/callback?code=stub-{random.randrange(args.users)}&state=bench")
+            elapsed = time.perf_counter() - start
+            with lock:
+                if response.status_code == 302 and '/login' not in response.headers.get('Location', ''):
+                    latencies.append(elapsed)
+                else:
+                    failures.append(response.status_code)
+            http.get('/logout')
+
+    threads = [threading.Thread(target=client) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    stats_after = requests.get(f"{args.stub}/stats", timeout=5).json()
+    calls = {endpoint: count - stats_before.get(endpoint, 0) for endpoint, count in stats_after.items()}
+
+    if latencies:
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+        print(f"{len(latencies)} connexions en {elapsed:.1f} s ({len(latencies) / elapsed:.1f}/s)  "
+              f"médiane {statistics.median(latencies) * 1000:.1f} ms  p95 {p95 * 1000:.1f} ms")
+    print(f"Échecs : {len(failures)}  Appels reçus par le bouchon : {calls}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Test de charge des pools de connexions : --threads threads simulent des
+requêtes web qui exécutent chacune une requête SQL de --sleep secondes
+(pg_sleep) sur la base choisie, pendant --duration secondes. Une requête sur
+--slow-every dure --slow secondes pour simuler une requête FoncierCEN lente.
+
+Les réglages du pool sont ceux de la configuration (.env), remplaçables par
+les options ci-dessous. Le script affiche le débit, les latences, le nombre
+d'attentes expirées (pool_timeout) et de requêtes interrompues
+(statement_timeout), puis les métriques du pool (db_pool.pool_stats).
+
+Usage :
+    python benchmarks/bench_pool.py --bind secondary --threads 30 --pool-size 5 --max-overflow 5 \\
+        --statement-timeout 2000 --slow-every 10 --slow 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+OVERRIDES = {
+    'pool_size': 'DB_POOL_SIZE',
+    'max_overflow': 'DB_MAX_OVERFLOW',
+    'pool_timeout': 'DB_POOL_TIMEOUT',
+    'pool_recycle': 'DB_POOL_RECYCLE',
+    'pre_ping': 'DB_POOL_PRE_PING',
+    'statement_timeout': 'DB_STATEMENT_TIMEOUT',
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bind', choices=('principale', 'secondary'), default='principale')
+    parser.add_argument('--threads', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=20.0, help="Durée du test (s)")
+    parser.add_argument('--sleep', type=float, default=0.05, help="Durée d'une requête normale (s)")
+    parser.add_argument('--slow-every', type=int, default=0, help="Une requête lente toutes les N (0 : aucune)")
+    parser.add_argument('--slow', type=float, default=5.0, help="Durée d'une requête lente (s)")
+    parser.add_argument('--pool-size', type=int)
+    parser.add_argument('--max-overflow', type=int)
+    parser.add_argument('--pool-timeout', type=float)
+    parser.add_argument('--pool-recycle', type=int)
+    parser.add_argument('--pre-ping', choices=('true', 'false'))
+    parser.add_argument('--statement-timeout', type=int, help="statement_timeout (ms, 0 : aucun)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # La configuration est lue à l'import de l'application : les options remplacent les variables d'environnement
+    suffix = '2' if args.bind == 'secondary' else ''
+    for option, variable in OVERRIDES.items():
+        value = getattr(args, option)
+        if value is not None:
+            os.environ[f"{variable}{suffix}"] = str(value)
+
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+    from application import create_app
+    from models import db
+    from db_pool import pool_stats
+
+    app = create_app()
+
+    bind = None if args.bind == 'principale' else args.bind
+    latencies, errors = [], {'attente_expiree': 0, 'requete_interrompue': 0, 'autre': 0}
+    lock = threading.Lock()
+    counter = {'n': 0}
+    deadline = time.monotonic() + args.duration
+
+    def worker():
+        with app.app_context():
+            engine = db.engines[bind]
+            while time.monotonic() < deadline:
+                with lock:
+                    counter['n'] += 1
+                    slow = args.slow_every and counter['n'] % args.slow_every == 0
+                start = time.perf_counter()
+                try:
+                    with engine.connect() as connection:
+                        connection.execute(text("SELECT pg_sleep(:s)"), {"s": args.slow if slow else args.sleep})
+                except PoolTimeoutError:
+                    with lock:
+                        errors['attente_expiree'] += 1
+                    continue
+                except OperationalError as e:
+                    with lock:
+                        errors['requete_interrompue' if 'statement timeout' in str(e) else 'autre'] += 1
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+
+    with app.app_context():
+        options = app.config['SQLALCHEMY_ENGINE_OPTIONS'] if bind is None else app.config['SQLALCHEMY_BINDS'][bind]
+        print("Réglages : " + ", ".join(
+            f"{key}={options.get(key)}" for key in ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle', 'pool_pre_ping')
+        ) + f", connect_args={options.get('connect_args', {})}")
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    if latencies:
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+        print(f"{len(latencies)} requêtes en {elapsed:.1f} s ({len(latencies) / elapsed:.1f}/s)  "
+              f"médiane {statistics.median(latencies) * 1000:.1f} ms  p95 {p95 * 1000:.1f} ms")
+    print(f"Erreurs : {errors}")
+    with app.app_context():
+        print(f"Pool : {pool_stats()['bases'][args.bind]}")
+
+
+if __name__ == '__main__':
+    main()
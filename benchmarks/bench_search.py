@@ -0,0 +1,89 @@
+"""
+Compare la recherche d'agriculteurs : filtre historique lower(col) LIKE '%terme%'
+(sans limite) contre search.search_query (index trigrammes, unaccent, classement, limite).
+
+Des agriculteurs synthétiques (un million par défaut) sont insérés par
+generate_series dans une transaction annulée à la fin. La migration
+a1c3e5f7b9d2 doit avoir été appliquée (flask db upgrade). Utiliser une base de test.
+
+Usage :
+    python benchmarks/bench_search.py --size 1000000 --repeat 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from application import create_app  # noqa: E402
+from models import db, Agriculteur  # noqa: E402
+from search import search_query  # noqa: E402
+
+app = create_app()
+
+SEED_SQL = text("""
+    INSERT INTO saisie.agriculteur (nom_agri, prenom_agri)
+    SELECT
+        (ARRAY['Dupont', 'Martin', 'Bernard', 'Lefèvre', 'Moreau', 'Fournier', 'Girard', 'Lambert',
+               'Bonnefoy', 'Château', 'Étienne', 'Mercier'])[1 + i % 12] || ' ' || i,
+        (ARRAY['Jean', 'Hélène', 'Zoé', 'François', 'Cécile', 'Noël', 'Agnès', 'Jérôme'])[1 + (i / 12) % 8]
+    FROM generate_series(1, :size) AS i
+""")
+
+# Termes tapés au clavier : préfixes, sans accents, prénom, faute de frappe
+TERMS = ("dup", "dupont", "lefevre", "helene", "chateau 12", "bonefoy", "jerome", "mer")
+
+
+def legacy_query(term):
+    term = term.lower()
+    return db.select(Agriculteur).where(db.or_(
+        db.func.lower(Agriculteur.nom_agri).contains(term),
+        db.func.lower(Agriculteur.prenom_agri).contains(term)
+    ))
+
+
+def measure(build_query, term, repeat):
+    """Retourne (nombre de résultats, latence médiane en ms, latence p95 en ms)."""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = len(db.session.execute(build_query(term)).scalars().all())
+        latencies.append((time.perf_counter() - start) * 1000)
+        db.session.expunge_all()
+    p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+    return count, statistics.median(latencies), p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=1000000, help="Nombre d'agriculteurs synthétiques")
+    parser.add_argument('--repeat', type=int, default=20, help="Nombre d'exécutions par terme")
+    parser.add_argument('--limit', type=int, default=20, help="Limite de la recherche indexée")
+    args = parser.parse_args()
+
+    with app.app_context():
+        try:
+            start = time.perf_counter()
+            db.session.execute(SEED_SQL, {"size": args.size})
+            # Intègre la liste d'attente de l'index GIN (sinon parcourue à chaque requête) et met à jour les statistiques
+            db.session.execute(text("SELECT gin_clean_pending_list('saisie.idx_agriculteur_recherche_trgm')"))
+            db.session.execute(text("ANALYZE saisie.agriculteur"))
+            print(f"{args.size} agriculteurs insérés en {time.perf_counter() - start:.1f} s")
+
+            for term in TERMS:
+                for label, build_query in (
+                    ("LIKE sans index", legacy_query),
+                    ("trigrammes", lambda t: search_query('agriculteur', t, args.limit)),
+                ):
+                    count, median, p95 = measure(build_query, term, args.repeat)
+                    print(f"{term!r:14} {label:16} {count:8d} résultats  médiane {median:8.2f} ms  p95 {p95:8.2f} ms")
+        finally:
+            db.session.rollback()
+
+
+if __name__ == '__main__':
+    main()
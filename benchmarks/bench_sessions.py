@@ -0,0 +1,101 @@
+"""
+Surcoût par requête de chaque stockage de session (session_backend.py).
+
+Pour chaque stockage demandé, une application Flask minimale est créée avec la
+configuration de l'application (base principale, durée de vie des sessions).
+Un client se connecte une fois, puis enchaîne --requests requêtes de lecture
+(la session est lue, rien n'est réécrit) et --requests requêtes d'écriture (la
+session est modifiée à chaque requête). Le script affiche la moyenne et le p95
+de chaque série, et le surcoût par rapport à une route qui n'utilise pas la
+session.
+
+Le stockage postgresql exige la table saisie.flask_session (flask db upgrade).
+
+Usage :
+    python benchmarks/bench_sessions.py --backends postgresql cookie filesystem --requests 500
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, session  # noqa: E402
+
+from config import Config  # noqa: E402
+from models import db  # noqa: E402
+from session_backend import SESSION_TYPES, init_sessions  # noqa: E402
+
+
+def create_bench_app(session_type):
+    """Application minimale : une route sans session, une de lecture, une d'écriture."""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SESSION_TYPE'] = session_type
+    app.config['SECRET_KEY'] = 'bench-sessions'
+    app.config['SESSION_FILE_DIR'] = tempfile.mkdtemp(prefix='bench_sessions_')
+    db.init_app(app)
+    init_sessions(app)
+
+    @app.route('/login')
+    def login():
+        # Session comparable à celle d'un utilisateur connecté
+        session['user'] = {'id': 'bench', 'name': 'Utilisateur Bench', 'email': 'bench@example.org'}
+        session['counter'] = 0
+        return 'ok'
+
+    @app.route('/none')
+    def none():
+        return 'ok'
+
+    @app.route('/read')
+    def read():
+        return session['user']['name']
+
+    @app.route('/write')
+    def write():
+        session['counter'] = session.get('counter', 0) + 1
+        return 'ok'
+
+    return app
+
+
+def measure(client, url, count):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        response = client.get(url)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f"{url} : statut {response.status_code}")
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', choices=SESSION_TYPES, default=list(SESSION_TYPES))
+    parser.add_argument('--requests', type=int, default=500, help="Requêtes par série")
+    args = parser.parse_args()
+
+    for session_type in args.backends:
+        app = create_bench_app(session_type)
+        client = app.test_client()
+        client.get('/login')
+        # Préchauffage (connexions du pool, fichiers)
+        measure(client, '/read', 10)
+
+        baseline = statistics.mean(measure(client, '/none', args.requests))
+        print(f"{session_type} :")
+        for label, url in (('sans session', '/none'), ('lecture', '/read'), ('écriture', '/write')):
+            latencies = measure(client, url, args.requests)
+            mean = statistics.mean(latencies)
+            p95 = statistics.quantiles(latencies, n=20)[-1]
+            print(f"  {label:<13} moyenne {mean * 1000:.3f} ms  p95 {p95 * 1000:.3f} ms  "
+                  f"surcoût {(mean - baseline) * 1000:+.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
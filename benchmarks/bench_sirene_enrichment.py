@@ -0,0 +1,58 @@
+"""
+Mesure le débit des appels SIRENE concurrents de l'enrichissement en masse.
+
+Le serveur bouchon (tools/sirene_stub.py) est lancé dans le processus, avec
+une latence simulée ; le cache et le limiteur utilisent un fichier SQLite
+temporaire. Aucune base PostgreSQL n'est nécessaire.
+
+Usage :
+    python benchmarks/bench_sirene_enrichment.py --count 200 --latency 150 --workers 1 2 4 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tools'))
+
+from sirene_stub import make_server  # noqa: E402
+from sirene import SireneCache, SireneClient, TokenBucket  # noqa: E402
+from enrichment import lookup_many  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=200, help="Nombre de SIRET par mesure")
+    parser.add_argument('--latency', type=int, default=150, help="Latence simulée du bouchon (ms)")
+    parser.add_argument('--rate-limit', type=int, default=6000, help="Quota (requêtes par minute)")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    server = make_server(port=0, latency_ms=args.latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for workers in args.workers:
+            path = os.path.join(tmp_dir, f"sirene_{workers}.sqlite3")
+            client = SireneClient(base_url, "stub", SireneCache(path), TokenBucket(path, args.rate_limit), max_wait=600)
+            sirets = [f"{i:014d}" for i in range(1, args.count + 1)]
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = lookup_many(client, sirets, executor)
+            elapsed = time.perf_counter() - start
+
+            ok = sum(1 for _, _, status in results if status == 200)
+            print(f"{workers:3d} threads  {len(results):5d} SIRET ({ok} trouvés)  {elapsed:7.2f} s  {len(results) / elapsed:7.1f} SIRET/s")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
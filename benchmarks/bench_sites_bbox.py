@@ -0,0 +1,52 @@
+"""
+Compare la taille et la latence de /sites_cen_geojson complet et filtré par emprise.
+
+Usage (application lancée en local) :
+    python benchmarks/bench_sites_bbox.py --url http://localhost:8000 --bbox -0.7,44.7,-0.4,45.0
+"""
+import argparse
+import statistics
+import time
+
+import requests
+
+
+def measure(session, url, params, repeat):
+    """Retourne (taille en octets, nombre de sites, latences en ms) pour une requête répétée."""
+    timings = []
+    size = features = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = session.get(url, params=params, timeout=60)
+        timings.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+        size = len(response.content)
+        features = len(response.json()["features"])
+    return size, features, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--bbox', default='-0.7,44.7,-0.4,45.0', help="Emprise minx,miny,maxx,maxy")
+    parser.add_argument('--zoom', type=int, help="Niveau de simplification (optionnel)")
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    session = requests.Session()
+    endpoint = f"{args.url}/sites_cen_geojson"
+    base_params = {'zoom': args.zoom} if args.zoom is not None else {}
+
+    for label, params in (
+        ("complet", base_params),
+        ("emprise", {**base_params, 'bbox': args.bbox}),
+    ):
+        size, features, timings = measure(session, endpoint, params, args.repeat)
+        print(
+            f"{label:8} {features:6d} sites  {size / 1024:10.1f} Ko  "
+            f"médiane {statistics.median(timings):8.1f} ms  max {max(timings):8.1f} ms"
+        )
+
+
+if __name__ == '__main__':
+    main()
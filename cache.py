@@ -0,0 +1,4 @@
+from flask_caching import Cache
+
+# Cache applicatif partagé (backend défini par CACHE_TYPE dans la configuration)
+cache = Cache()
@@ -4,6 +4,25 @@ from urllib.parse import quote
 # Charger le fichier .env
 load_dotenv()
 
+
+def engine_options(suffix="", default_statement_timeout=0):
+    """
+    Options create_engine d'une base, lues dans DB_POOL_SIZE{suffix}, DB_MAX_OVERFLOW{suffix},
+    DB_POOL_TIMEOUT{suffix}, DB_POOL_RECYCLE{suffix}, DB_POOL_PRE_PING{suffix} et
+    DB_STATEMENT_TIMEOUT{suffix} (millisecondes, 0 pour aucune limite).
+    """
+    options = {
+        "pool_size": int(os.environ.get(f"DB_POOL_SIZE{suffix}", 5)),
+        "max_overflow": int(os.environ.get(f"DB_MAX_OVERFLOW{suffix}", 10)),
+        "pool_timeout": float(os.environ.get(f"DB_POOL_TIMEOUT{suffix}", 10)),  # Attente maximale d'une connexion libre (s)
+        "pool_recycle": int(os.environ.get(f"DB_POOL_RECYCLE{suffix}", 1800)),  # Connexions renouvelées après ce délai (s)
+        "pool_pre_ping": os.environ.get(f"DB_POOL_PRE_PING{suffix}", "true").lower() in ("1", "true", "yes"),
+    }
+    statement_timeout = int(os.environ.get(f"DB_STATEMENT_TIMEOUT{suffix}", default_statement_timeout))
+    if statement_timeout:
+        options["connect_args"] = {"options": f"-c statement_timeout={statement_timeout}"}
+    return options
+
 class Config:
 
     try:
@@ -21,20 +40,92 @@ class Config:
 
     # Configuration de la base de données secondaire
     SQLALCHEMY_BINDS = {
-        'secondary': (
-            f'postgresql://{os.environ.get("DB_USERNAME2")}:{encoded_password}'
-            f'@{os.environ.get("DB_HOST2")}:{os.environ.get("DB_PORT2")}/{os.environ.get("DB_NAME2")}'
-        )
+        'secondary': {
+            'url': (
+                f'postgresql://{os.environ.get("DB_USERNAME2")}:{encoded_password}'
+                f'@{os.environ.get("DB_HOST2")}:{os.environ.get("DB_PORT2")}/{os.environ.get("DB_NAME2")}'
+            ),
+            # Requêtes FoncierCEN interrompues après 10 s par défaut : un worker n'est pas bloqué
+            **engine_options("2", default_statement_timeout=10000),
+        }
     }
 
+    # Pool de connexions et délai maximal des requêtes de la base principale (voir db_pool.py)
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(default_statement_timeout=30000)
+
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Configuration du cache applicatif (Flask-Caching)
+    CACHE_TYPE = os.environ.get("CACHE_TYPE", "SimpleCache")  # "FileSystemCache" pour partager entre workers
+    CACHE_DIR = os.environ.get("CACHE_DIR", "cache")  # Utilisé uniquement par FileSystemCache
+    CACHE_DEFAULT_TIMEOUT = int(os.environ.get("CACHE_DEFAULT_TIMEOUT", 3600))
+    SITES_VERSION_CHECK_INTERVAL = int(os.environ.get("SITES_VERSION_CHECK_INTERVAL", 60))  # Secondes entre deux vérifications de la vue des sites
+    SITES_GEOJSON_CACHE_TIMEOUT = int(os.environ.get("SITES_GEOJSON_CACHE_TIMEOUT", 86400))
+    SITES_GEOJSON_BUILDER = os.environ.get("SITES_GEOJSON_BUILDER", "postgis")  # "postgis" (ST_AsGeoJSON) ou "shapely"
+    SITES_SRID = int(os.environ.get("SITES_SRID", 4326))  # Système de coordonnées des géométries de saisie.site_geojson
+    SITES_SIMPLIFY_MAX_ZOOM = int(os.environ.get("SITES_SIMPLIFY_MAX_ZOOM", 15))  # À partir de ce zoom, géométries en pleine résolution
+    SITES_WARM_ZOOMS = os.environ.get("SITES_WARM_ZOOMS", "full")  # Niveaux préchauffés au démarrage : zooms séparés par des virgules, "full" = pleine résolution (carte)
+    DEPTS_SIMPLIFIED_MAX_ZOOM = int(os.environ.get("DEPTS_SIMPLIFIED_MAX_ZOOM", 9))  # Contour simplifié des départements jusqu'à ce zoom, détaillé au-delà
+
+    # Compteur de requêtes SQL par requête HTTP et journal des requêtes lentes (voir sql_stats.py)
+    SQL_STATS_LOG = os.environ.get("SQL_STATS_LOG", "true").lower() == "true"  # Ligne JSON par requête HTTP
+    SQL_STATS_TOP = int(os.environ.get("SQL_STATS_TOP", 3))  # Requêtes les plus lentes rapportées
+    SQL_SLOW_QUERY_MS = int(os.environ.get("SQL_SLOW_QUERY_MS", 500))  # Seuil du journal avec EXPLAIN (0 : désactivé)
+
+    # Préchauffage des caches au démarrage du worker (voir warmup.py)
+    WARMUP = os.environ.get("WARMUP", "sync")  # "sync", "background" ou "off"
+    WARMUP_RETRY_DELAY = int(os.environ.get("WARMUP_RETRY_DELAY", 5))  # Délai avant de relancer une étape en échec (s), doublé à chaque tentative
+    WARMUP_RETRY_MAX_DELAY = int(os.environ.get("WARMUP_RETRY_MAX_DELAY", 300))
+
+    # Cache en mémoire des tables du schéma referentiel
+    REFERENTIELS_CACHE_TTL = int(os.environ.get("REFERENTIELS_CACHE_TTL", 3600))
+
+    # Client de l'API SIRENE (INSEE)
+    SIRENE_API_URL = os.environ.get("SIRENE_API_URL", "https://api.insee.fr/api-sirene/3.11")
+    SIRENE_API_KEY = os.environ.get("INSEE_API_KEY", "")
+    SIRENE_CONNECT_TIMEOUT = float(os.environ.get("SIRENE_CONNECT_TIMEOUT", 3.05))
+    SIRENE_READ_TIMEOUT = float(os.environ.get("SIRENE_READ_TIMEOUT", 10))
+    SIRENE_RETRIES = int(os.environ.get("SIRENE_RETRIES", 3))
+    SIRENE_BACKOFF = float(os.environ.get("SIRENE_BACKOFF", 0.5))  # Attente entre tentatives : backoff * 2^n secondes
+    SIRENE_RATE_LIMIT = int(os.environ.get("SIRENE_RATE_LIMIT", 30))  # Requêtes par minute (quota INSEE)
+    SIRENE_RATE_LIMIT_MAX_WAIT = float(os.environ.get("SIRENE_RATE_LIMIT_MAX_WAIT", 10))  # Attente totale (jetons et nouvelles tentatives) par appel
+    SIRENE_CACHE_PATH = os.environ.get("SIRENE_CACHE_PATH", "sirene_cache.sqlite3")  # Partagé par les workers
+    SIRENE_CACHE_TTL = int(os.environ.get("SIRENE_CACHE_TTL", 7 * 86400))
+    SIRENE_NOT_FOUND_TTL = int(os.environ.get("SIRENE_NOT_FOUND_TTL", 3600))
+    SIRENE_ENRICH_CHECKPOINT = os.environ.get("SIRENE_ENRICH_CHECKPOINT", "sirene_enrich.checkpoint")  # Point de reprise de "flask enrich-societes"
+
+    # Pagination de /api/contrats
+    CONTRATS_PAGE_SIZE = int(os.environ.get("CONTRATS_PAGE_SIZE", 500))
+    CONTRATS_PAGE_MAX_SIZE = int(os.environ.get("CONTRATS_PAGE_MAX_SIZE", 5000))
+
+    # Import en masse des contrats (flask import-contrats, /api/contrats/import)
+    IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", 1000))  # Contrats insérés par transaction
+    IMPORT_MAX_REPORTED_ERRORS = int(os.environ.get("IMPORT_MAX_REPORTED_ERRORS", 1000))  # Erreurs détaillées dans la réponse de l'API
+    IMPORT_MAX_HTTP_SIZE = int(os.environ.get("IMPORT_MAX_HTTP_SIZE", 5 * 1024 * 1024))  # Taille maximale (octets) d'un fichier envoyé à l'API ; au-delà : flask import-contrats
+
+    # Recherche des agriculteurs et des référents (autocomplétion)
+    SEARCH_DEFAULT_LIMIT = int(os.environ.get("SEARCH_DEFAULT_LIMIT", 20))
+    SEARCH_MAX_LIMIT = int(os.environ.get("SEARCH_MAX_LIMIT", 100))
+
+    # Tuiles vectorielles (MVT)
+    TILES_CACHE_DIR = os.environ.get("TILES_CACHE_DIR", "tiles_cache")
+    TILES_SEED_MAX_ZOOM = int(os.environ.get("TILES_SEED_MAX_ZOOM", 10))  # Zoom maximal précalculé par "flask seed-tiles"
     
     # Configuration pour l'authentification Microsoft 365
     CLIENT_ID = os.environ.get("AZURE_CLIENT_ID", "")
     CLIENT_SECRET = os.environ.get("AZURE_CLIENT_SECRET", "")
     TENANT_ID = os.environ.get("AZURE_TENANT_ID", "")
-    AUTHORITY = f"https://login.microsoftonline.com/{TENANT_ID}"
+    AUTHORITY = os.environ.get("AZURE_AUTHORITY", f"https://login.microsoftonline.com/{TENANT_ID}")  # Autre autorité : fournisseur bouchon
+    AZURE_VALIDATE_AUTHORITY = os.environ.get("AZURE_VALIDATE_AUTHORITY", "true").lower() in ("1", "true", "yes")
+    GRAPH_API_URL = os.environ.get("GRAPH_API_URL", "https://graph.microsoft.com/v1.0")
+    GRAPH_CONNECT_TIMEOUT = float(os.environ.get("GRAPH_CONNECT_TIMEOUT", 3.05))
+    GRAPH_READ_TIMEOUT = float(os.environ.get("GRAPH_READ_TIMEOUT", 10))
+    GRAPH_PROFILE_TTL = int(os.environ.get("GRAPH_PROFILE_TTL", 3600))  # Durée de cache du profil /me (s)
     REDIRECT_PATH = "/auth/callback"  # Route de redirection après authentification
     SCOPE = ["User.Read"]  # Permissions demandées
-    SESSION_TYPE = "filesystem"  # Pour stocker les sessions utilisateur
+    ADMIN_EMAILS = [email.strip().lower() for email in os.environ.get("ADMIN_EMAILS", "").split(",") if email.strip()]  # Accès aux routes /admin
+    SESSION_TYPE = os.environ.get("SESSION_TYPE", "filesystem")  # "filesystem", "postgresql" (après flask db upgrade) ou "cookie" (voir session_backend.py)
+    SESSION_TOUCH_INTERVAL = int(os.environ.get("SESSION_TOUCH_INTERVAL", 300))  # Expiration repoussée au plus une fois par intervalle (s)
+    SESSION_PURGE_INTERVAL = int(os.environ.get("SESSION_PURGE_INTERVAL", 3600))  # Purge des sessions expirées par chaque worker (s)
+    SECRET_KEY = os.environ.get("SECRET_KEY")  # Obligatoire pour SESSION_TYPE=cookie
     PERMANENT_SESSION_LIFETIME = 7200  # Durée de vie de la session en secondes
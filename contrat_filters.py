@@ -0,0 +1,244 @@
+"""
+Filtrage et facettes des contrats côté serveur (/api/contrats/query).
+
+Les filtres portent sur les référentiels (type de contrat, milieux, produits
+finis, types et modes de production), le référent, les noms (agriculteur,
+société, référent), les dates, la surface et l'emprise. Plusieurs valeurs
+d'un même filtre se combinent par OU, les filtres entre eux par ET. Chaque
+filtre est une condition SQL indexée (voir les migrations c3e5a7b9d1f4 et
+b8d0f2a4c6e9) ; la réponse contient les identifiants des contrats retenus
+et, pour chaque facette, le nombre de contrats par valeur. Une facette est
+comptée sans son propre filtre : les autres valeurs restent proposées avec
+leur nombre. Les mêmes filtres restreignent les contrats de /api/contrats,
+qui charge les marqueurs de la carte.
+"""
+from datetime import date
+
+from models import (
+    db, Agriculteur, AgriculteurSociete, Contrat, ProduitFiniContrat, Referent, Societe, TypeMilieuContrat,
+    TypeProductionSociete
+)
+from referentiel import get_label
+from sites_cen import parse_bbox
+
+# Filtres à liste d'identifiants -> référentiel des libellés (None : libellé lu en base)
+LIST_FILTERS = {
+    'type_contrat': 'type_contrat',
+    'type_milieu': 'type_milieu',
+    'produit_fini': 'type_produit_fini',
+    'type_production': 'type_production',
+    'mode_production': 'mode_production',
+    'referent': None,
+}
+# Filtres par nom (égalité insensible à la casse, libellés de l'autocomplétion /api/search)
+NAME_FILTERS = ('agriculteur', 'societe', 'referent_nom')
+# Filtres ignorés pour compter une facette (par défaut : le filtre du même nom)
+FACET_EXCLUDES = {'referent': ('referent', 'referent_nom')}
+DATE_COLUMNS = ('date_signature', 'date_prise_effet', 'date_fin')
+
+
+def _parse_ids(args, name):
+    """Identifiants d'un filtre, passés répétés (?f=1&f=2) ou séparés par des virgules (?f=1,2)."""
+    values = [value for raw in args.getlist(name) for value in raw.split(',') if value.strip()]
+    try:
+        return [int(value) for value in values]
+    except ValueError:
+        raise ValueError(f"Le filtre {name} attend des identifiants entiers.")
+
+
+def _parse_date(args, name):
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Le filtre {name} attend une date AAAA-MM-JJ.")
+
+
+def _parse_float(args, name):
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"Le filtre {name} attend un nombre.")
+
+
+def parse_contrat_filters(args):
+    """Lit les filtres d'une requête (request.args) ; lève ValueError pour une valeur invalide."""
+    filters = {name: _parse_ids(args, name) for name in LIST_FILTERS}
+    for name in NAME_FILTERS:
+        filters[name] = args.get(name, '').strip() or None
+    for column in DATE_COLUMNS:
+        filters[f"{column}_min"] = _parse_date(args, f"{column}_min")
+        filters[f"{column}_max"] = _parse_date(args, f"{column}_max")
+    filters['surface_min'] = _parse_float(args, 'surface_min')
+    filters['surface_max'] = _parse_float(args, 'surface_max')
+    filters['en_cours'] = args.get('en_cours') in ('1', 'true')
+    filters['bbox'] = parse_bbox(args['bbox']) if args.get('bbox') else None
+    return filters
+
+
+def contrat_point():
+    """Point PostGIS d'un contrat ; expression identique à l'index GiST de la migration."""
+    return db.func.ST_SetSRID(
+        db.func.ST_MakePoint(db.cast(Contrat.longitude, db.Float), db.cast(Contrat.latitude, db.Float)), 4326
+    )
+
+
+def _same_name(prenom, nom, value):
+    """
+    « Prénom nom » égal à la valeur, sans tenir compte de la casse.
+    L'expression doit rester identique à celle des index de la migration b8d0f2a4c6e9
+    (concat_ws n'étant pas IMMUTABLE, elle ne peut pas être indexée).
+    """
+    empty, space = db.literal_column("''"), db.literal_column("' '")
+    full_name = db.func.coalesce(prenom, empty).op('||')(space).op('||')(db.func.coalesce(nom, empty))
+    return db.func.lower(full_name) == value.lower()
+
+
+def filter_conditions(filters, today=None, exclude=()):
+    """Conditions SQL (liste) correspondant aux filtres, hormis ceux nommés dans `exclude`."""
+    filters = {name: value for name, value in filters.items() if name not in exclude}
+    conditions = []
+    if filters.get('type_contrat'):
+        conditions.append(Contrat.id_type_contrat.in_(filters['type_contrat']))
+    if filters.get('referent'):
+        conditions.append(Contrat.id_referent.in_(filters['referent']))
+    if filters.get('referent_nom'):
+        conditions.append(db.exists().where(
+            Referent.id_referent == Contrat.id_referent,
+            _same_name(Referent.prenom_referent, Referent.nom_referent, value=filters['referent_nom'])
+        ))
+    if filters.get('societe'):
+        conditions.append(db.exists().where(
+            Societe.id_societe == Contrat.id_societe,
+            db.func.lower(Societe.nom_societe) == filters['societe'].lower()
+        ))
+    if filters.get('agriculteur'):
+        conditions.append(db.exists().where(
+            AgriculteurSociete.id_societe == Contrat.id_societe,
+            Agriculteur.id_agriculteur == AgriculteurSociete.id_agriculteur,
+            _same_name(Agriculteur.prenom_agri, Agriculteur.nom_agri, value=filters['agriculteur'])
+        ))
+    if filters.get('type_milieu'):
+        conditions.append(db.exists().where(
+            TypeMilieuContrat.id_contrat == Contrat.id_contrat,
+            TypeMilieuContrat.id_type_milieu.in_(filters['type_milieu'])
+        ))
+    if filters.get('produit_fini'):
+        conditions.append(db.exists().where(
+            ProduitFiniContrat.id_contrat == Contrat.id_contrat,
+            ProduitFiniContrat.id_type_produit_fini.in_(filters['produit_fini'])
+        ))
+    if filters.get('type_production'):
+        conditions.append(db.exists().where(
+            TypeProductionSociete.id_societe == Contrat.id_societe,
+            TypeProductionSociete.id_type_production.in_(filters['type_production'])
+        ))
+    if filters.get('mode_production'):
+        conditions.append(db.exists().where(
+            TypeProductionSociete.id_societe == Contrat.id_societe,
+            TypeProductionSociete.id_mode_production.in_(filters['mode_production'])
+        ))
+
+    for column in DATE_COLUMNS:
+        if filters.get(f"{column}_min"):
+            conditions.append(getattr(Contrat, column) >= filters[f"{column}_min"])
+        if filters.get(f"{column}_max"):
+            conditions.append(getattr(Contrat, column) <= filters[f"{column}_max"])
+    if filters.get('en_cours'):
+        today = today or date.today()
+        conditions.append(db.and_(Contrat.date_prise_effet <= today, Contrat.date_fin >= today))
+
+    if filters.get('surface_min') is not None:
+        conditions.append(Contrat.surf_contractualisee >= filters['surface_min'])
+    if filters.get('surface_max') is not None:
+        conditions.append(Contrat.surf_contractualisee <= filters['surface_max'])
+
+    if filters.get('bbox'):
+        conditions.append(contrat_point().op('&&')(db.func.ST_MakeEnvelope(*filters['bbox'], 4326)))
+    return conditions
+
+
+def _selection(filters, exclude=(), name='selection'):
+    """CTE des contrats retenus par les filtres (hormis `exclude`)."""
+    return (
+        db.select(Contrat.id_contrat, Contrat.id_type_contrat, Contrat.id_referent, Contrat.id_societe)
+        .where(*filter_conditions(filters, exclude=exclude))
+        .cte(name)
+    )
+
+
+def facets_query(filters, selection):
+    """
+    Une seule requête (UNION ALL) comptant les contrats par valeur de chaque facette.
+    Chaque facette est comptée sur la sélection obtenue sans son propre filtre ; `selection`
+    (tous les filtres) sert aux facettes dont le filtre n'est pas renseigné.
+    Colonnes : facette, valeur, libelle (référents uniquement), nb.
+    """
+    no_label = db.cast(db.null(), db.Text)
+
+    def facet_selection(name):
+        exclude = FACET_EXCLUDES.get(name, (name,))
+        if not any(filters.get(excluded) for excluded in exclude):
+            return selection
+        return _selection(filters, exclude=exclude, name=f"selection_{name}")
+
+    def facet(name, value_of, *joins_of, label=no_label):
+        facet_rows = facet_selection(name)
+        value = value_of(facet_rows)
+        query = db.select(
+            db.literal(name, db.Text).label('facette'),
+            value.label('valeur'),
+            label.label('libelle'),
+            db.func.count(db.distinct(facet_rows.c.id_contrat)).label('nb')
+        ).select_from(facet_rows)
+        for join_of in joins_of:
+            query = query.join(*join_of(facet_rows))
+        return query.where(value.isnot(None)).group_by(value)
+
+    return db.union_all(
+        facet('type_contrat', lambda rows: rows.c.id_type_contrat),
+        facet('referent', lambda rows: rows.c.id_referent,
+              lambda rows: (Referent, Referent.id_referent == rows.c.id_referent),
+              label=db.func.min(db.func.concat_ws(' ', Referent.prenom_referent, Referent.nom_referent))),
+        facet('type_milieu', lambda rows: TypeMilieuContrat.id_type_milieu,
+              lambda rows: (TypeMilieuContrat, TypeMilieuContrat.id_contrat == rows.c.id_contrat)),
+        facet('produit_fini', lambda rows: ProduitFiniContrat.id_type_produit_fini,
+              lambda rows: (ProduitFiniContrat, ProduitFiniContrat.id_contrat == rows.c.id_contrat)),
+        facet('type_production', lambda rows: TypeProductionSociete.id_type_production,
+              lambda rows: (TypeProductionSociete, TypeProductionSociete.id_societe == rows.c.id_societe)),
+        facet('mode_production', lambda rows: TypeProductionSociete.id_mode_production,
+              lambda rows: (TypeProductionSociete, TypeProductionSociete.id_societe == rows.c.id_societe)),
+    )
+
+
+def query_contrats(filters, with_ids=True):
+    """
+    Contrats correspondant aux filtres : {'total', 'ids', 'facettes'}.
+    Les facettes comptent, par valeur, les contrats retenus par les autres filtres,
+    triées par nombre décroissant.
+    """
+    selection = _selection(filters)
+
+    ids = None
+    if with_ids:
+        ids = db.session.execute(
+            db.select(selection.c.id_contrat).order_by(selection.c.id_contrat)
+        ).scalars().all()
+
+    facettes = {name: [] for name in LIST_FILTERS}
+    for row in db.session.execute(facets_query(filters, selection)):
+        referentiel = LIST_FILTERS[row.facette]
+        libelle = row.libelle if referentiel is None else get_label(referentiel, row.valeur, "Non spécifié")
+        facettes[row.facette].append({"id": row.valeur, "libelle": libelle, "nb": row.nb})
+    for values in facettes.values():
+        values.sort(key=lambda value: (-value["nb"], str(value["libelle"])))
+
+    total = len(ids) if ids is not None else db.session.execute(
+        db.select(db.func.count()).select_from(selection)
+    ).scalar()
+    return {"total": total, "ids": ids, "facettes": facettes}
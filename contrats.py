@@ -0,0 +1,664 @@
+"""
+Services des contrats : lecture pour la carte et enregistrement d'une saisie.
+
+Les contrats sont servis par /api/contrats, paginés par curseur (id_contrat
+croissant), avec projection optionnelle des champs, les filtres de la
+recherche avancée (contrat_filters) et un mode NDJSON diffusé ligne par ligne.
+
+Les données sont lues dans la table saisie.contrat_map, une ligne par contrat
+avec les relations multiples déjà agrégées : une lecture est un simple
+parcours de sa clé primaire. Ses lignes sont calculées par la requête à plat
+contrats_flat_query et mises à jour par sync_contrat_map dans la transaction
+de chaque écriture, avant le COMMIT : la carte affichée après une saisie, une
+modification ou une suppression est donc déjà à jour. L'ancienne lecture par
+l'ORM (iter_contrats_orm) reste la référence des mesures de performance.
+
+Un contrat saisi est enregistré par create_contrat en une seule transaction :
+les identifiants générés sont obtenus par flush() et les lignes d'association
+sont insérées par lots (executemany), avec un unique COMMIT final. La
+suppression (delete_contrats) est ensembliste : quelques DELETE ... WHERE NOT
+EXISTS, quel que soit le nombre de contrats ou d'agriculteurs.
+
+La page de modification d'un contrat est préparée par get_edit_context : une
+seule requête pour le contrat et ses relations, le GeoJSON du site venant du
+cache LRU des sites par code.
+"""
+from sqlalchemy import column, delete, insert, table
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert as pg_insert
+from sqlalchemy.orm import joinedload, selectinload
+
+from models import (
+    db, Agriculteur, AgriculteurSociete, Contrat, ContratSiteCEN, ModeProduction,
+    ProduitFiniContrat, Referent, Societe, TypeActivitePrincipale, TypeCategorieJuridique,
+    TypeContrat, TypeMilieu, TypeMilieuContrat, TypeProduction, TypeProductionSociete,
+    TypeProduitFini, TypeTrancheEffectif, VueSites
+)
+from matviews import SEARCH_INDEX, schedule_refresh
+from sites_cen import get_site_geojson_by_code
+
+# Champs renvoyés pour chaque contrat (ordre conservé dans les réponses)
+CONTRAT_FIELDS = (
+    "id", "latitude", "longitude", "nom_site", "code_site", "nom_societe", "agriculteur",
+    "telephone", "email", "siret", "adresse_etablissement", "tranche_effectif",
+    "categorie_juridique", "activite_principale", "date_naissance", "mode_production",
+    "type_productions", "produits_finis", "type_contrat", "date_signature",
+    "date_prise_effet", "date_fin", "date_ajout_bdd", "referent", "surface_contractualisee",
+    "type_milieux", "remarques", "remarques_contrat",
+)
+
+# Table saisie.contrat_map (colonnes de contrats_flat_query, dans le même ordre)
+contrat_map = table(
+    'contrat_map',
+    *(column(name) for name in (
+        "id_contrat", "latitude", "longitude", "surf_contractualisee", "date_signature",
+        "date_prise_effet", "date_fin", "date_ajout_bdd", "remarques_contrat", "nom_societe",
+        "telephone", "email", "siret", "adresse_etablissement", "remarques_societe",
+        "code_type_tranche_effectif", "lib_type_tranche_effectif", "code_type_categorie_juridique",
+        "lib_type_categorie_juridique", "code_type_activite_principale", "lib_type_activite_principale",
+        "appellation_contrat", "id_referent", "prenom_referent", "nom_referent", "id_site", "nom_site",
+        "code_site", "id_agriculteur", "prenom_agri", "nom_agri", "date_naissance", "type_productions",
+        "produits_finis", "type_milieux",
+    )),
+    schema='saisie'
+)
+
+# Identifiants des modes de production (referentiel.mode_production)
+MODE_PRODUCTION_BIO = 1
+MODE_PRODUCTION_CONV = 2
+
+
+def contrats_query():
+    """Requête ORM des contrats avec toutes les relations nécessaires à la carte."""
+    return (
+        db.session.query(Contrat)
+        .options(
+            selectinload(Contrat.societe).selectinload(Societe.activite_principale_obj),
+            selectinload(Contrat.societe).selectinload(Societe.categorie_juridique_obj),
+            selectinload(Contrat.societe).selectinload(Societe.tranche_effectif_obj),
+            selectinload(Contrat.societe).selectinload(Societe.types_production_societe).selectinload(TypeProductionSociete.type_production),
+            selectinload(Contrat.societe).selectinload(Societe.types_production_societe).selectinload(TypeProductionSociete.mode_production),
+            selectinload(Contrat.types_milieu).selectinload(TypeMilieuContrat.type_milieu),
+            selectinload(Contrat.produits_finis).selectinload(ProduitFiniContrat.produit_fini),
+            selectinload(Contrat.sites_cen),
+            selectinload(Contrat.referent)
+        )
+        .order_by(Contrat.id_contrat)
+    )
+
+
+def serialize_contrat(contrat):
+    """Construit le dictionnaire d'un contrat (objet ORM) tel qu'affiché sur la carte et dans le panneau latéral."""
+    # Types de milieu
+    type_milieux = [milieu.type_milieu.milieu for milieu in contrat.types_milieu] if contrat.types_milieu else []
+
+    # Traitement des types de production avec leurs modes
+    type_productions = []
+    if contrat.societe and contrat.societe.types_production_societe:
+        for tps in contrat.societe.types_production_societe:
+            type_productions.append({
+                'type': tps.type_production.nature_production,
+                'mode_production': tps.mode_production.nom if tps.mode_production else None
+            })
+
+    # Récupérer le premier mode de production (s'il existe)
+    mode_production = type_productions[0]['mode_production'] if type_productions else "Non spécifié"
+
+    # Produits finis
+    produits_finis = [
+        produit.produit_fini.nature_produit_fini if produit.produit_fini else "Non spécifié"
+        for produit in contrat.produits_finis
+    ]
+
+    return {
+        "id": contrat.id_contrat,
+        "latitude": float(contrat.latitude) if contrat.latitude else None,
+        "longitude": float(contrat.longitude) if contrat.longitude else None,
+        "nom_site": contrat.sites_cen[0].nom_site if contrat.sites_cen and len(contrat.sites_cen) > 0 else "Non spécifié",
+        "code_site": contrat.sites_cen[0].code_site if contrat.sites_cen and len(contrat.sites_cen) > 0 else "Non spécifié",
+        "nom_societe": contrat.societe.nom_societe if contrat.societe else "Non spécifié",
+        "agriculteur": f"{contrat.societe.agriculteurs_intermediaires[0].agriculteur.prenom_agri} {contrat.societe.agriculteurs_intermediaires[0].agriculteur.nom_agri}" if contrat.societe and contrat.societe.agriculteurs_intermediaires else "Non spécifié",
+        "telephone": contrat.societe.telephone if contrat.societe else "Non spécifié",
+        "email": contrat.societe.email if contrat.societe else "Non spécifié",
+        "siret": contrat.societe.siret,
+        "adresse_etablissement": contrat.societe.adresse_etablissement,
+        "tranche_effectif": contrat.societe.tranche_effectif_obj.lib_type_tranche_effectif if contrat.societe and contrat.societe.tranche_effectif_obj else "Non spécifié",
+        "categorie_juridique": contrat.societe.categorie_juridique_obj.lib_type_categorie_juridique if contrat.societe and contrat.societe.categorie_juridique_obj else "Non spécifié",
+        "activite_principale": contrat.societe.activite_principale_obj.lib_type_activite_principale if contrat.societe and contrat.societe.activite_principale_obj else "Non spécifié",
+        "date_naissance": contrat.societe.agriculteurs_intermediaires[0].agriculteur.date_naissance if contrat.societe and contrat.societe.agriculteurs_intermediaires else "Non spécifié",
+        "mode_production": mode_production,
+        "type_productions": type_productions,
+        "produits_finis": produits_finis,
+        "type_contrat": contrat.type_contrat.appellation_contrat if contrat.type_contrat else "Non spécifié",
+        "date_signature": contrat.date_signature.strftime("%Y-%m-%d") if contrat.date_signature else "Non spécifié",
+        "date_prise_effet": contrat.date_prise_effet.strftime("%Y-%m-%d") if contrat.date_prise_effet else "Non spécifié",
+        "date_fin": contrat.date_fin.strftime("%Y-%m-%d") if contrat.date_fin else "Non spécifié",
+        "date_ajout_bdd": contrat.date_ajout_bdd.strftime("%Y-%m-%d %H:%M:%S") if contrat.date_ajout_bdd else "Non spécifié",
+        "referent": f"{contrat.referent.prenom_referent} {contrat.referent.nom_referent}" if contrat.referent else "Non spécifié",
+        "surface_contractualisee": contrat.surf_contractualisee if contrat.surf_contractualisee else 'Non spécifié',
+        "type_milieux": type_milieux,
+        "remarques": contrat.societe.remarques if contrat.societe and contrat.societe.remarques else "Non spécifié",
+        "remarques_contrat": contrat.remarques if contrat.remarques else "Non spécifié",
+    }
+
+
+def contrats_flat_query():
+    """
+    Requête à plat des contrats : une seule requête SQL renvoie toutes les colonnes de la carte.
+    Le premier site et le premier agriculteur sont lus par des sous-requêtes LATERAL, les relations
+    multiples (productions, produits finis, milieux) par des agrégats corrélés.
+    """
+    premier_site = (
+        db.select(ContratSiteCEN.id_site, ContratSiteCEN.nom_site, ContratSiteCEN.code_site)
+        .where(ContratSiteCEN.id_contrat == Contrat.id_contrat)
+        .order_by(ContratSiteCEN.id_site)
+        .limit(1)
+        .lateral('premier_site')
+    )
+
+    premier_agriculteur = (
+        db.select(Agriculteur.id_agriculteur, Agriculteur.prenom_agri, Agriculteur.nom_agri, Agriculteur.date_naissance)
+        .join(AgriculteurSociete, AgriculteurSociete.id_agriculteur == Agriculteur.id_agriculteur)
+        .where(AgriculteurSociete.id_societe == Contrat.id_societe)
+        .order_by(Agriculteur.id_agriculteur)
+        .limit(1)
+        .lateral('premier_agriculteur')
+    )
+
+    type_productions = (
+        db.select(db.func.jsonb_agg(aggregate_order_by(
+            db.func.jsonb_build_object(
+                'type', TypeProduction.nature_production,
+                'mode_production', ModeProduction.nom
+            ),
+            TypeProductionSociete.id_type_production
+        )))
+        .select_from(TypeProductionSociete)
+        .join(TypeProduction, TypeProduction.id_type_production == TypeProductionSociete.id_type_production)
+        .outerjoin(ModeProduction, ModeProduction.id == TypeProductionSociete.id_mode_production)
+        .where(TypeProductionSociete.id_societe == Contrat.id_societe)
+        .scalar_subquery()
+    )
+
+    produits_finis = (
+        db.select(db.func.array_agg(aggregate_order_by(
+            db.func.coalesce(TypeProduitFini.nature_produit_fini, "Non spécifié"),
+            ProduitFiniContrat.id_type_produit_fini
+        )))
+        .select_from(ProduitFiniContrat)
+        .outerjoin(TypeProduitFini, TypeProduitFini.id_type_produit_fini == ProduitFiniContrat.id_type_produit_fini)
+        .where(ProduitFiniContrat.id_contrat == Contrat.id_contrat)
+        .scalar_subquery()
+    )
+
+    type_milieux = (
+        db.select(db.func.array_agg(aggregate_order_by(TypeMilieu.milieu, TypeMilieu.id_type_milieu)))
+        .select_from(TypeMilieuContrat)
+        .join(TypeMilieu, TypeMilieu.id_type_milieu == TypeMilieuContrat.id_type_milieu)
+        .where(TypeMilieuContrat.id_contrat == Contrat.id_contrat)
+        .scalar_subquery()
+    )
+
+    return (
+        db.select(
+            Contrat.id_contrat,
+            Contrat.latitude,
+            Contrat.longitude,
+            Contrat.surf_contractualisee,
+            Contrat.date_signature,
+            Contrat.date_prise_effet,
+            Contrat.date_fin,
+            Contrat.date_ajout_bdd,
+            Contrat.remarques.label('remarques_contrat'),
+            Societe.nom_societe,
+            Societe.telephone,
+            Societe.email,
+            Societe.siret,
+            Societe.adresse_etablissement,
+            Societe.remarques.label('remarques_societe'),
+            TypeTrancheEffectif.code_type_tranche_effectif,
+            TypeTrancheEffectif.lib_type_tranche_effectif,
+            TypeCategorieJuridique.code_type_categorie_juridique,
+            TypeCategorieJuridique.lib_type_categorie_juridique,
+            TypeActivitePrincipale.code_type_activite_principale,
+            TypeActivitePrincipale.lib_type_activite_principale,
+            TypeContrat.appellation_contrat,
+            Referent.id_referent,
+            Referent.prenom_referent,
+            Referent.nom_referent,
+            premier_site.c.id_site,
+            premier_site.c.nom_site,
+            premier_site.c.code_site,
+            premier_agriculteur.c.id_agriculteur,
+            premier_agriculteur.c.prenom_agri,
+            premier_agriculteur.c.nom_agri,
+            premier_agriculteur.c.date_naissance,
+            type_productions.label('type_productions'),
+            produits_finis.label('produits_finis'),
+            type_milieux.label('type_milieux'),
+        )
+        .select_from(Contrat)
+        .join(Societe, Societe.id_societe == Contrat.id_societe)
+        .outerjoin(TypeTrancheEffectif, TypeTrancheEffectif.code_type_tranche_effectif == Societe.tranche_effectif)
+        .outerjoin(TypeCategorieJuridique, TypeCategorieJuridique.code_type_categorie_juridique == Societe.categorie_juridique)
+        .outerjoin(TypeActivitePrincipale, TypeActivitePrincipale.code_type_activite_principale == Societe.activite_principale)
+        .outerjoin(TypeContrat, TypeContrat.id_type_contrat == Contrat.id_type_contrat)
+        .outerjoin(Referent, Referent.id_referent == Contrat.id_referent)
+        .outerjoin(premier_site, db.true())
+        .outerjoin(premier_agriculteur, db.true())
+        .order_by(Contrat.id_contrat)
+    )
+
+
+def contrat_row_to_dict(row):
+    """Construit, à partir d'une ligne de contrats_flat_query, le même dictionnaire que serialize_contrat."""
+    type_productions = row.type_productions or []
+    has_site = row.id_site is not None
+    has_agriculteur = row.id_agriculteur is not None
+
+    return {
+        "id": row.id_contrat,
+        "latitude": float(row.latitude) if row.latitude else None,
+        "longitude": float(row.longitude) if row.longitude else None,
+        "nom_site": row.nom_site if has_site else "Non spécifié",
+        "code_site": row.code_site if has_site else "Non spécifié",
+        "nom_societe": row.nom_societe,
+        "agriculteur": f"{row.prenom_agri} {row.nom_agri}" if has_agriculteur else "Non spécifié",
+        "telephone": row.telephone,
+        "email": row.email,
+        "siret": row.siret,
+        "adresse_etablissement": row.adresse_etablissement,
+        "tranche_effectif": row.lib_type_tranche_effectif if row.code_type_tranche_effectif is not None else "Non spécifié",
+        "categorie_juridique": row.lib_type_categorie_juridique if row.code_type_categorie_juridique is not None else "Non spécifié",
+        "activite_principale": row.lib_type_activite_principale if row.code_type_activite_principale is not None else "Non spécifié",
+        "date_naissance": row.date_naissance if has_agriculteur else "Non spécifié",
+        "mode_production": type_productions[0]['mode_production'] if type_productions else "Non spécifié",
+        "type_productions": type_productions,
+        "produits_finis": row.produits_finis or [],
+        "type_contrat": row.appellation_contrat or "Non spécifié",
+        "date_signature": row.date_signature.strftime("%Y-%m-%d") if row.date_signature else "Non spécifié",
+        "date_prise_effet": row.date_prise_effet.strftime("%Y-%m-%d") if row.date_prise_effet else "Non spécifié",
+        "date_fin": row.date_fin.strftime("%Y-%m-%d") if row.date_fin else "Non spécifié",
+        "date_ajout_bdd": row.date_ajout_bdd.strftime("%Y-%m-%d %H:%M:%S") if row.date_ajout_bdd else "Non spécifié",
+        "referent": f"{row.prenom_referent} {row.nom_referent}" if row.id_referent is not None else "Non spécifié",
+        "surface_contractualisee": row.surf_contractualisee if row.surf_contractualisee else 'Non spécifié',
+        "type_milieux": row.type_milieux or [],
+        "remarques": row.remarques_societe or "Non spécifié",
+        "remarques_contrat": row.remarques_contrat or "Non spécifié",
+    }
+
+
+def parse_fields(value):
+    """
+    Convertit le paramètre ?fields=a,b,c en tuple de champs.
+    Retourne None (tous les champs) si absent ; lève ValueError pour un champ inconnu.
+    """
+    if not value:
+        return None
+    fields = tuple(field.strip() for field in value.split(',') if field.strip())
+    unknown = [field for field in fields if field not in CONTRAT_FIELDS]
+    if unknown:
+        raise ValueError(f"Champ(s) inconnu(s) : {', '.join(unknown)}")
+    if "id" not in fields:
+        fields = ("id",) + fields
+    return fields
+
+
+def project(contrat_data, fields):
+    """Restreint un contrat sérialisé aux champs demandés."""
+    if fields is None:
+        return contrat_data
+    return {field: contrat_data[field] for field in fields}
+
+
+def contrats_map_query(conditions=()):
+    """
+    Lecture de la table des contrats à plat, par identifiant croissant.
+    `conditions` (voir contrat_filters.filter_conditions) restreint la lecture aux contrats retenus.
+    """
+    query = db.select(contrat_map).order_by(contrat_map.c.id_contrat)
+    if conditions:
+        query = query.where(contrat_map.c.id_contrat.in_(db.select(Contrat.id_contrat).where(*conditions)))
+    return query
+
+
+def get_contrats_page(cursor=None, limit=500, fields=None, conditions=()):
+    """
+    Retourne une page de contrats d'identifiant strictement supérieur au curseur,
+    ainsi que le curseur de la page suivante (None s'il n'y en a plus).
+    """
+    query = contrats_map_query(conditions)
+    if cursor is not None:
+        query = query.where(contrat_map.c.id_contrat > cursor)
+
+    # Une ligne de plus que demandé pour savoir s'il reste une page
+    rows = db.session.execute(query.limit(limit + 1)).all()
+    next_cursor = rows[limit - 1].id_contrat if len(rows) > limit else None
+
+    return [project(contrat_row_to_dict(row), fields) for row in rows[:limit]], next_cursor
+
+
+def _iter_rows(query, id_column, cursor, limit, fields, yield_per):
+    if cursor is not None:
+        query = query.where(id_column > cursor)
+    if limit is not None:
+        query = query.limit(limit)
+
+    for row in db.session.execute(query.execution_options(yield_per=yield_per)):
+        yield project(contrat_row_to_dict(row), fields)
+
+
+def iter_contrats(cursor=None, limit=None, fields=None, yield_per=500, conditions=()):
+    """Génère les contrats sérialisés par lots (curseur serveur), sans tout charger en mémoire."""
+    return _iter_rows(contrats_map_query(conditions), contrat_map.c.id_contrat, cursor, limit, fields, yield_per)
+
+
+def iter_contrats_flat(cursor=None, limit=None, fields=None, yield_per=500):
+    """Même lecture que iter_contrats, calculée à la volée par contrats_flat_query (sans la table)."""
+    return _iter_rows(contrats_flat_query(), Contrat.id_contrat, cursor, limit, fields, yield_per)
+
+
+def iter_contrats_orm(yield_per=50):
+    """Lecture historique des contrats via le graphe d'objets ORM (référence pour les mesures)."""
+    for contrat in contrats_query().yield_per(yield_per):
+        yield serialize_contrat(contrat)
+
+
+def load_contrat_for_edit(contract_id):
+    """
+    Charge en une seule requête le contrat à modifier avec les relations utilisées par la page de
+    modification : sites, milieux, produits finis, référent, type de contrat, société avec ses
+    agriculteurs, ses types de production et ses autres contrats.
+    Les collections sont chargées par jointure (joinedload) : le produit des relations d'un seul
+    contrat reste de quelques dizaines de lignes. Retourne None si le contrat n'existe pas.
+    """
+    return db.session.execute(
+        db.select(Contrat)
+        .options(
+            joinedload(Contrat.sites_cen),
+            joinedload(Contrat.types_milieu),
+            joinedload(Contrat.produits_finis),
+            joinedload(Contrat.referent),
+            joinedload(Contrat.type_contrat),
+            joinedload(Contrat.societe).options(
+                joinedload(Societe.agriculteurs_intermediaires).joinedload(AgriculteurSociete.agriculteur),
+                joinedload(Societe.types_production_societe),
+                joinedload(Societe.contrats).joinedload(Contrat.type_contrat),
+            ),
+        )
+        .where(Contrat.id_contrat == contract_id)
+    ).unique().scalar_one_or_none()
+
+
+def get_edit_context(contract_id):
+    """
+    Contexte de la page de modification d'un contrat : {'contrat', 'geojson', 'autres_contrats'},
+    ou None si le contrat n'existe pas. Le site vient du cache LRU des sites par code.
+    """
+    contrat = load_contrat_for_edit(contract_id)
+    if contrat is None:
+        return None
+
+    code_site = contrat.sites_cen[0].code_site if contrat.sites_cen else None
+    autres_contrats = sorted(
+        (autre for autre in contrat.societe.contrats if autre.id_contrat != contrat.id_contrat),
+        key=lambda autre: autre.id_contrat
+    ) if contrat.societe else []
+
+    return {
+        "contrat": contrat,
+        "geojson": get_site_geojson_by_code(code_site),
+        "autres_contrats": autres_contrats,
+    }
+
+
+def sync_contrat_map(contrat_ids=(), societe_ids=(), referent_ids=(), agriculteur_ids=()):
+    """
+    Recalcule, dans la transaction courante (avant le COMMIT), les lignes de saisie.contrat_map des
+    contrats indiqués et de ceux des sociétés, référents et agriculteurs indiqués. Les lignes des
+    contrats supprimés disparaissent avec eux (clé étrangère ON DELETE CASCADE).
+    """
+    conditions = []
+    if contrat_ids:
+        conditions.append(Contrat.id_contrat.in_(sorted(set(contrat_ids))))
+    if societe_ids:
+        conditions.append(Contrat.id_societe.in_(sorted(set(societe_ids))))
+    if referent_ids:
+        conditions.append(Contrat.id_referent.in_(sorted(set(referent_ids))))
+    if agriculteur_ids:
+        conditions.append(Contrat.id_societe.in_(
+            db.select(AgriculteurSociete.id_societe)
+            .where(AgriculteurSociete.id_agriculteur.in_(sorted(set(agriculteur_ids))))
+        ))
+    if not conditions:
+        return
+
+    # Les modifications en attente de la session doivent être lues par l'INSERT ... SELECT
+    db.session.flush()
+    columns = [c.name for c in contrat_map.columns]
+    statement = pg_insert(contrat_map).from_select(columns, contrats_flat_query().where(db.or_(*conditions)))
+    statement = statement.on_conflict_do_update(
+        index_elements=['id_contrat'],
+        set_={name: statement.excluded[name] for name in columns if name != 'id_contrat'}
+    )
+    db.session.execute(statement)
+
+
+def rebuild_contrat_map():
+    """Recalcule toute la table saisie.contrat_map (flask refresh-contrat-map) ; retourne le nombre de lignes."""
+    db.session.execute(db.text("SET LOCAL statement_timeout = 0"))
+    db.session.execute(delete(contrat_map))
+    count = db.session.execute(
+        insert(contrat_map).from_select([c.name for c in contrat_map.columns], contrats_flat_query())
+    ).rowcount
+    db.session.commit()
+    return count
+
+
+def contrats_modifies():
+    """
+    À appeler après toute écriture de contrats validée : programme le rafraîchissement de l'index
+    de recherche globale. La table des contrats de la carte est déjà à jour (sync_contrat_map) et
+    les tuiles suivent saisie.data_version (voir tiles.py).
+    """
+    schedule_refresh(SEARCH_INDEX)
+
+
+def societe_values(data):
+    """Colonnes d'une nouvelle société à partir d'une saisie."""
+    return {
+        "nom_societe": data.get('nom_societe'),
+        "telephone": data.get('telephone'),
+        "email": data.get('email'),
+        "siret": data.get('siret'),
+        "adresse_etablissement": data.get('adresse_etablissement'),
+        "tranche_effectif": data.get('tranche_effectif'),
+        "categorie_juridique": data.get('categorie_juridique'),
+        "activite_principale": data.get('activite_principale'),
+    }
+
+
+def agriculteur_values(data):
+    return {
+        "nom_agri": data.get('nom_agri'),
+        "prenom_agri": data.get('prenom_agri'),
+        "date_naissance": data.get('date_naissance'),
+    }
+
+
+def referent_values(data):
+    return {
+        "nom_referent": data.get('nom_referent'),
+        "prenom_referent": data.get('prenom_referent'),
+    }
+
+
+def contrat_values(data):
+    """Colonnes d'un contrat à partir d'une saisie (hors société et référent)."""
+    return {
+        "surf_contractualisee": data.get('surf_contractualisee'),
+        "date_signature": data.get('date_signature'),
+        "date_fin": data.get('date_fin'),
+        "date_prise_effet": data.get('date_prise_effet'),
+        "latitude": data.get('latitude'),
+        "longitude": data.get('longitude'),
+        "remarques": data.get('remarques'),
+        "id_type_contrat": data.get('appellation_contrat'),
+    }
+
+
+def production_modes(data):
+    """{id_type_production: id_mode_production} à partir des listes type_production_bio / type_production_conv."""
+    productions = {}
+    for mode_production, key in ((MODE_PRODUCTION_BIO, 'type_production_bio'), (MODE_PRODUCTION_CONV, 'type_production_conv')):
+        for production_id in data.get(key) or []:
+            if production_id:
+                # Clé primaire (société, type de production) : la dernière saisie l'emporte
+                productions[int(production_id)] = mode_production
+    return productions
+
+
+def find_societe(siret=None, nom_societe=None):
+    """Recherche une société existante par SIRET, puis à défaut par nom."""
+    societe = None
+    if siret:
+        societe = Societe.query.filter_by(siret=siret).first()
+    if societe is None and nom_societe:
+        societe = Societe.query.filter_by(nom_societe=nom_societe).first()
+    return societe
+
+
+def get_site_id(code_site):
+    """Identifiant du site CEN : celui de la vue des sites si le code existe, sinon un nouvel identifiant."""
+    site_id = db.session.execute(
+        db.select(VueSites.idsite).where(VueSites.codesite == code_site).limit(1)
+    ).scalar()
+    if site_id is None:
+        site_id = db.session.query(db.func.nextval('saisie.site_cen_id_site_seq')).scalar()
+    return site_id
+
+
+def create_contrat(data, societe=None):
+    """
+    Enregistre un contrat saisi (champs de CombinedForm dans `data`) en une seule transaction.
+
+    Listes attendues en plus des champs du formulaire : type_production_bio,
+    type_production_conv, type_milieu et produit_fini (identifiants).
+    La société, l'agriculteur et les types de production ne sont créés que si
+    aucune société n'existe pour ce SIRET ou ce nom ; `societe` permet de passer
+    une société déjà recherchée par l'appelant.
+
+    Retourne le contrat créé. En cas d'erreur, la transaction est annulée et l'exception propagée.
+    """
+    try:
+        if societe is None:
+            societe = find_societe(data.get('siret'), data.get('nom_societe'))
+
+        nouvelle_societe = societe is None
+        if nouvelle_societe:
+            societe = Societe(**societe_values(data))
+            agriculteur = Agriculteur(**agriculteur_values(data))
+            db.session.add_all([societe, agriculteur])
+
+        referent = Referent.query.filter_by(**referent_values(data)).first()
+        if referent is None:
+            referent = Referent(**referent_values(data))
+            db.session.add(referent)
+
+        contrat = Contrat(**contrat_values(data), societe=societe, referent=referent)
+        db.session.add(contrat)
+        site_id = get_site_id(data.get('code_site'))
+
+        # Un seul flush : INSERT ... RETURNING des lignes parentes pour obtenir leurs identifiants
+        db.session.flush()
+
+        # Lignes d'association insérées par lots, sans objets ORM
+        if nouvelle_societe:
+            db.session.execute(insert(AgriculteurSociete), [
+                {"id_agriculteur": agriculteur.id_agriculteur, "id_societe": societe.id_societe}
+            ])
+            productions = production_modes(data)
+            if productions:
+                db.session.execute(insert(TypeProductionSociete), [
+                    {"id_societe": societe.id_societe, "id_type_production": production_id, "id_mode_production": mode_production}
+                    for production_id, mode_production in productions.items()
+                ])
+
+        db.session.execute(insert(ContratSiteCEN), [{
+            "id_site": site_id,
+            "id_contrat": contrat.id_contrat,
+            "code_site": data.get('code_site'),
+            "nom_site": data.get('nom_site')
+        }])
+
+        milieux = {int(milieu_id) for milieu_id in data.get('type_milieu') or [] if milieu_id}
+        if milieux:
+            db.session.execute(insert(TypeMilieuContrat), [
+                {"id_type_milieu": milieu_id, "id_contrat": contrat.id_contrat} for milieu_id in sorted(milieux)
+            ])
+
+        produits = {int(produit_id) for produit_id in data.get('produit_fini') or [] if produit_id}
+        if produits:
+            db.session.execute(insert(ProduitFiniContrat), [
+                {"id_type_produit_fini": produit_id, "id_contrat": contrat.id_contrat} for produit_id in sorted(produits)
+            ])
+
+        sync_contrat_map(contrat_ids=[contrat.id_contrat])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    contrats_modifies()
+    return contrat
+
+
+def delete_contrats(contrat_ids):
+    """
+    Supprime des contrats puis, dans la même transaction, les données devenues orphelines :
+    sociétés sans contrat (avec leurs types de production et liens agriculteurs),
+    agriculteurs sans société et référents sans contrat.
+    Retourne le nombre de contrats supprimés. En cas d'erreur, la transaction est annulée et l'exception propagée.
+    """
+    contrat_ids = sorted(set(contrat_ids))
+    if not contrat_ids:
+        return 0
+
+    def execute(statement):
+        # Suppressions ensemblistes : la session n'a pas à synchroniser d'objets chargés
+        return db.session.execute(statement.execution_options(synchronize_session=False))
+
+    try:
+        for model in (ContratSiteCEN, TypeMilieuContrat, ProduitFiniContrat):
+            execute(delete(model).where(model.id_contrat.in_(contrat_ids)))
+        deleted = execute(
+            delete(Contrat).where(Contrat.id_contrat.in_(contrat_ids))
+            .returning(Contrat.id_societe, Contrat.id_referent)
+        ).all()
+
+        societe_ids = {row.id_societe for row in deleted}
+        referent_ids = {row.id_referent for row in deleted if row.id_referent is not None}
+
+        if societe_ids:
+            sans_contrat = ~db.exists().where(Contrat.id_societe == Societe.id_societe)
+            societes_orphelines = db.select(Societe.id_societe).where(Societe.id_societe.in_(societe_ids), sans_contrat)
+            execute(delete(TypeProductionSociete).where(TypeProductionSociete.id_societe.in_(societes_orphelines)))
+            execute(delete(AgriculteurSociete).where(AgriculteurSociete.id_societe.in_(societes_orphelines)))
+            execute(delete(Societe).where(Societe.id_societe.in_(societe_ids), sans_contrat))
+            execute(delete(Agriculteur).where(
+                ~db.exists().where(AgriculteurSociete.id_agriculteur == Agriculteur.id_agriculteur)
+            ))
+
+        if referent_ids:
+            execute(delete(Referent).where(
+                Referent.id_referent.in_(referent_ids),
+                ~db.exists().where(Contrat.id_referent == Referent.id_referent)
+            ))
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if deleted:
+        contrats_modifies()
+    return len(deleted)
@@ -0,0 +1,85 @@
+"""
+Pools de connexions des deux bases (principale et FoncierCEN) et leurs métriques.
+
+La taille des pools, le débordement, le recyclage, le pre-ping et le délai
+maximal des requêtes (statement_timeout) sont lus dans la configuration, base
+par base (voir config.engine_options). Les pools sont des TimedQueuePool : en
+plus de l'état courant (connexions ouvertes, empruntées, débordement), ils
+mesurent le temps d'attente d'une connexion libre et comptent les attentes
+abandonnées (pool_timeout atteint). Ces métriques sont propres au worker.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy.pool import QueuePool
+
+from models import db
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool qui mesure l'attente des connexions (emprunts, attente cumulée et maximale, expirations)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._stats = {'emprunts': 0, 'attente_totale': 0.0, 'attente_max': 0.0, 'expirations': 0}
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            with self._stats_lock:
+                self._stats['expirations'] += 1
+            raise
+        wait = time.perf_counter() - start
+        with self._stats_lock:
+            self._stats['emprunts'] += 1
+            self._stats['attente_totale'] += wait
+            self._stats['attente_max'] = max(self._stats['attente_max'], wait)
+        return connection
+
+    def recreate(self):
+        # Le pool recréé (après invalidation) conserve les compteurs du worker
+        pool = super().recreate()
+        pool._stats = self._stats
+        pool._stats_lock = self._stats_lock
+        return pool
+
+    def stats(self):
+        """État courant et mesures d'attente du pool."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        emprunts = stats['emprunts']
+        return {
+            "taille": self.size(),
+            "ouvertes": self.checkedin() + self.checkedout(),
+            "disponibles": self.checkedin(),
+            "empruntees": self.checkedout(),
+            "debordement": max(0, self.overflow()),
+            "emprunts": emprunts,
+            "expirations": stats['expirations'],
+            "attente_moyenne_ms": round(stats['attente_totale'] / emprunts * 1000, 3) if emprunts else 0.0,
+            "attente_max_ms": round(stats['attente_max'] * 1000, 3),
+        }
+
+
+def init_db_pool(app):
+    """À appeler avant db.init_app(app) : utilise TimedQueuePool pour chaque base."""
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}), 'poolclass': TimedQueuePool
+    }
+    app.config['SQLALCHEMY_BINDS'] = {
+        name: {**bind, 'poolclass': TimedQueuePool} if isinstance(bind, dict) else {'url': bind, 'poolclass': TimedQueuePool}
+        for name, bind in app.config.get('SQLALCHEMY_BINDS', {}).items()
+    }
+
+
+def pool_stats():
+    """Métriques des pools de chaque base pour le worker courant : {'pid', 'bases': {nom: {...}}}."""
+    bases = {}
+    for bind, engine in db.engines.items():
+        pool = engine.pool
+        bases[bind or 'principale'] = pool.stats() if isinstance(pool, TimedQueuePool) else {"etat": pool.status()}
+    return {"pid": os.getpid(), "bases": bases}
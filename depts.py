@@ -0,0 +1,110 @@
+"""
+Contour des départements de Nouvelle-Aquitaine (static/sig/depts_na.geojson).
+
+Le fichier est lu et sérialisé une seule fois au démarrage, avec ses variantes
+gzip et brotli. Il est servi sous une URL versionnée par son empreinte, avec
+des en-têtes de cache longue durée.
+
+La version simplifiée (depts_na_simplified.geojson) est versionnée avec le
+dépôt et servie sous sa propre URL. La carte l'utilise jusqu'au zoom
+DEPTS_SIMPLIFIED_MAX_ZOOM puis charge le contour détaillé. La commande
+"flask simplify-depts" la régénère après une modification du contour
+détaillé (le fichier produit doit alors être commité).
+"""
+import gzip
+import hashlib
+import json
+import os
+
+import brotli
+from flask import current_app, redirect, request, url_for
+
+DEPTS_FILE = os.path.join('sig', 'depts_na.geojson')
+DEPTS_SIMPLIFIED_FILE = os.path.join('sig', 'depts_na_simplified.geojson')
+
+
+def load_depts_geojson(path):
+    """Lit un GeoJSON des départements et prépare ses variantes encodées."""
+    with open(path, encoding='utf-8') as geojson_file:
+        # Re-sérialisation compacte (supprime indentation et espaces du fichier source)
+        payload = json.dumps(json.load(geojson_file), separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    return {
+        'version': hashlib.sha1(payload).hexdigest()[:12],
+        'variants': {
+            'identity': payload,
+            'gzip': gzip.compress(payload, compresslevel=9),
+            'br': brotli.compress(payload, quality=11),
+        },
+    }
+
+
+def load_depts(static_folder):
+    """
+    Contours des départements : {'detail', 'simplifie'}.
+    Sans fichier simplifié (flask simplify-depts), le contour détaillé sert aux deux.
+    """
+    detail = load_depts_geojson(os.path.join(static_folder, DEPTS_FILE))
+    simplified_path = os.path.join(static_folder, DEPTS_SIMPLIFIED_FILE)
+    simplified = load_depts_geojson(simplified_path) if os.path.exists(simplified_path) else detail
+    return {'detail': detail, 'simplifie': simplified}
+
+
+def simplify_depts_geojson(static_folder, tolerance, decimals):
+    """
+    Simplifie hors ligne le GeoJSON des départements pour le zoom d'ensemble.
+    Retourne (taille source, taille simplifiée) en octets.
+    """
+    import numpy as np
+    import shapely
+    from shapely.geometry import mapping, shape
+
+    source = os.path.join(static_folder, DEPTS_FILE)
+    target = os.path.join(static_folder, DEPTS_SIMPLIFIED_FILE)
+
+    with open(source, encoding='utf-8') as geojson_file:
+        data = json.load(geojson_file)
+
+    for feature in data['features']:
+        geometry = shape(feature['geometry']).simplify(tolerance, preserve_topology=True)
+        geometry = shapely.transform(geometry, lambda coords: np.round(coords, decimals))
+        feature['geometry'] = mapping(geometry)
+
+    with open(target, 'w', encoding='utf-8') as geojson_file:
+        json.dump(data, geojson_file, separators=(',', ':'), ensure_ascii=False)
+
+    return os.path.getsize(source), os.path.getsize(target)
+
+
+def depts_geojson_url(simplified=False):
+    """URL versionnée du GeoJSON des départements, détaillé ou simplifié (pour map.html)."""
+    depts = current_app.extensions['depts_geojson']['simplifie' if simplified else 'detail']
+    return url_for('geo.depts_geojson', version=depts['version'])
+
+
+def depts_geojson_response(version):
+    """Contour des départements (détaillé ou simplifié), servi depuis la mémoire avec l'encodage accepté."""
+    depts = next(
+        (depts for depts in current_app.extensions['depts_geojson'].values() if depts['version'] == version),
+        None
+    )
+    if depts is None:
+        return redirect(depts_geojson_url())
+
+    accepted = request.accept_encodings
+    encoding = next((name for name in ('br', 'gzip') if accepted[name]), 'identity')
+
+    response = current_app.response_class(depts['variants'][encoding], mimetype='application/json')
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(f"{depts['version']}-{encoding}")
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+
+def init_depts(app):
+    """Charge les GeoJSON des départements (route et commande de simplification : geo_views.py)."""
+    app.extensions['depts_geojson'] = load_depts(app.static_folder)
@@ -0,0 +1,152 @@
+"""
+Ré-enrichissement en masse des sociétés à partir de l'API SIRENE.
+
+Les sociétés sont parcourues par lots (id_societe croissant). Pour chaque lot,
+les appels SIRENE sont faits en parallèle par un pool de threads borné, le
+quota global étant assuré par le limiteur du client SIRENE ; les mises à jour
+sont ensuite écrites en un seul UPDATE groupé. Le fichier de reprise contient
+le dernier id_societe traité sans erreur avant la première société en échec
+(quota, erreur serveur ou réseau) : une exécution interrompue, ou terminée
+avec des erreurs, repart de ce point et réinterroge les sociétés en échec.
+Les lignes de la carte (saisie.contrat_map) des sociétés modifiées sont
+recalculées dans la transaction de chaque lot ; l'index de recherche est
+rafraîchi une fois en fin de parcours si des sociétés ont été mises à jour.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from contrats import contrats_modifies, sync_contrat_map
+from models import db, Societe
+from referentiel import get_label
+from sirene import get_sirene_client
+
+# Champs SIRENE -> (colonne Societe, référentiel dont le code doit exister)
+ENRICHED_FIELDS = {
+    'adresse_etablissement': None,
+    'tranche_effectif': 'type_tranche_effectif',
+    'activite_principale': 'type_activite_principale',
+    'categorie_juridique': 'type_categorie_juridique',
+}
+
+
+def read_checkpoint(path):
+    """Dernier id_societe traité lors d'une exécution précédente (0 si aucune)."""
+    try:
+        with open(path) as checkpoint_file:
+            return int(checkpoint_file.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path, last_id):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as checkpoint_file:
+        checkpoint_file.write(str(last_id))
+    os.replace(tmp_path, path)
+
+
+def lookup_many(client, sirets, executor):
+    """Interroge SIRENE pour une liste de SIRET en parallèle ; retourne [(siret, résultat, code HTTP)]."""
+    def lookup(siret):
+        try:
+            result, status_code = client.lookup(siret, use_cache=False)
+        except Exception as e:
+            result, status_code = {"error": str(e)}, 500
+        return siret, result, status_code
+
+    return list(executor.map(lookup, sirets))
+
+
+def build_update(societe, result):
+    """
+    Construit les paramètres d'UPDATE d'une société à partir du résultat SIRENE.
+    Les codes absents des référentiels sont ignorés (clé étrangère) : la valeur existante est conservée.
+    """
+    values = {'id_societe': societe.id_societe}
+    changed = False
+    for field, referentiel in ENRICHED_FIELDS.items():
+        current = getattr(societe, field)
+        value = result.get(field)
+        if not value or value == "Non renseigné":
+            value = current
+        elif referentiel and get_label(referentiel, value) is None:
+            value = current
+        values[field] = value
+        changed = changed or value != current
+    return values if changed else None
+
+
+def enrich_societes(batch_size=100, workers=4, resume=True, progress=print):
+    """
+    Ré-enrichit toutes les sociétés ayant un SIRET valide.
+    Retourne les compteurs {'lues', 'mises_a_jour', 'introuvables', 'erreurs'}.
+    """
+    checkpoint_path = current_app.config['SIRENE_ENRICH_CHECKPOINT']
+    last_id = read_checkpoint(checkpoint_path) if resume else 0
+    # N'avance plus après la première société en échec : elle sera réinterrogée à la reprise
+    checkpoint_id = last_id
+    failed = False
+    client = get_sirene_client()
+    stats = {'lues': 0, 'mises_a_jour': 0, 'introuvables': 0, 'erreurs': 0}
+
+    if last_id:
+        progress(f"Reprise après la société {last_id}.")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            batch = db.session.execute(
+                db.select(
+                    Societe.id_societe, Societe.siret, Societe.adresse_etablissement,
+                    Societe.tranche_effectif, Societe.activite_principale, Societe.categorie_juridique
+                )
+                .where(Societe.id_societe > last_id, Societe.siret.isnot(None))
+                .order_by(Societe.id_societe)
+                .limit(batch_size)
+            ).all()
+            if not batch:
+                break
+
+            societes = {row.siret: row for row in batch if len(row.siret) == 14 and row.siret.isdigit()}
+            updates = []
+            failed_ids = set()
+            for siret, result, status_code in lookup_many(client, list(societes), executor):
+                if status_code == 200:
+                    values = build_update(societes[siret], result)
+                    if values:
+                        updates.append(values)
+                elif status_code == 404:
+                    stats['introuvables'] += 1
+                else:
+                    stats['erreurs'] += 1
+                    failed_ids.add(societes[siret].id_societe)
+
+            # Un seul UPDATE groupé (executemany par clé primaire) pour tout le lot
+            if updates:
+                db.session.execute(db.update(Societe), updates)
+                sync_contrat_map(societe_ids=[values['id_societe'] for values in updates])
+            db.session.commit()
+
+            stats['lues'] += len(batch)
+            stats['mises_a_jour'] += len(updates)
+            last_id = batch[-1].id_societe
+            if not failed:
+                if failed_ids:
+                    failed = True
+                    checkpoint_id = max((row.id_societe for row in batch if row.id_societe < min(failed_ids)), default=checkpoint_id)
+                else:
+                    checkpoint_id = last_id
+                write_checkpoint(checkpoint_path, checkpoint_id)
+            progress(f"{stats['lues']} sociétés traitées ({stats['mises_a_jour']} mises à jour), dernière : {last_id}.")
+
+    # Les sociétés mises à jour apparaissent dans l'index de recherche
+    if stats['mises_a_jour']:
+        contrats_modifies()
+
+    if failed:
+        progress(f"{stats['erreurs']} erreurs : la prochaine exécution reprendra après la société {checkpoint_id}.")
+    elif os.path.exists(checkpoint_path):
+        # Parcours terminé sans erreur : la prochaine exécution repartira du début
+        os.remove(checkpoint_path)
+    return stats
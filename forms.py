@@ -5,6 +5,15 @@ from wtforms import (
 )
 from wtforms.validators import DataRequired, Optional, NumberRange, Length, Email
 
+from referentiel import get_choices
+
+# Champs non validés lorsque la société (SIRET) existe déjà : ils ne sont pas enregistrés
+CHAMPS_SOCIETE_EXISTANTE = (
+    'type_production', 'mode_production',  # Champs de production
+    'nom_agri', 'prenom_agri',  # Champs de l'agriculteur
+    'telephone', 'email'
+)
+
 class CombinedForm(FlaskForm):
 
     # Champs Contrat
@@ -108,4 +117,29 @@ class CombinedForm(FlaskForm):
     )
 
     fetch_sirene = SubmitField('Rechercher via l''API de l''INSEE')
-    submit = SubmitField('Enregistrer les données')
\ No newline at end of file
+    submit = SubmitField('Enregistrer les données')
+
+
+def set_form_choices(form):
+    """Renseigne les choix des listes de CombinedForm depuis le cache des référentiels."""
+    form.type_milieu.choices = get_choices('type_milieu')
+    form.appellation_contrat.choices = get_choices('type_contrat')
+    form.produit_fini.choices = get_choices('type_produit_fini')
+    form.type_production.choices = get_choices('type_production')
+    form.mode_production.choices = get_choices('mode_production')
+
+
+def validate_saisie(form, societe_existante=False):
+    """
+    Valide une saisie de CombinedForm. Pour une société existante, les champs de
+    CHAMPS_SOCIETE_EXISTANTE sont ignorés (ils ne sont pas enregistrés).
+    """
+    if not societe_existante:
+        return form.validate()
+
+    validation_ok = True
+    for field_name, field in form._fields.items():
+        if field_name not in CHAMPS_SOCIETE_EXISTANTE and field_name not in ('csrf_token', 'submit'):
+            if not field.validate(form):
+                validation_ok = False
+    return validation_ok
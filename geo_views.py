@@ -0,0 +1,115 @@
+"""
+Routes cartographiques : GeoJSON des sites CEN, contour des départements et
+tuiles vectorielles, avec leurs commandes de précalcul (warm-sites-cache,
+simplify-depts, seed-tiles).
+"""
+import click
+from flask import Blueprint, current_app, jsonify, request
+from flask_login import login_required
+
+from depts import depts_geojson_response, depts_geojson_url, simplify_depts_geojson
+from sites_cen import (
+    get_simplification_level, get_single_site_geojson_entry, make_geojson_response, parse_bbox,
+    sites_bbox_response, sites_geojson_response, warm_sites_cache, EMPTY_FEATURE_COLLECTION
+)
+from tiles import TILE_LAYERS, get_tile, is_valid_tile, seed_tiles
+
+bp = Blueprint('geo', __name__, cli_group=None)
+
+# URL versionnée du contour des départements, utilisée par map.html
+bp.add_app_template_global(depts_geojson_url)
+
+
+@bp.route('/sites_cen_geojson')
+def get_all_sites_cen_geojson():
+    """Récupère les données GeoJSON pour TOUS les sites CEN.
+    Utilisé pour afficher tous les sites sur la carte principale.
+    La FeatureCollection est servie depuis le cache (ETag / Last-Modified, 304 si inchangée).
+    Les paramètres ?zoom= ou ?tolerance= renvoient des géométries simplifiées,
+    et ?bbox=minx,miny,maxx,maxy uniquement les sites visibles dans l'emprise."""
+    try:
+        level = get_simplification_level(request.args)
+    except ValueError:
+        return jsonify({"error": "Paramètre zoom ou tolerance invalide."}), 400
+
+    if request.args.get('bbox'):
+        try:
+            bbox = parse_bbox(request.args['bbox'])
+        except ValueError:
+            return jsonify({"error": "Paramètre bbox invalide (minx,miny,maxx,maxy attendu)."}), 400
+        return sites_bbox_response(bbox, level)
+
+    return sites_geojson_response(level)
+
+
+
+@bp.route('/site_cen_geojson/<int:site_id>')
+def get_single_site_cen_geojson(site_id):
+    """
+    Récupère les données GeoJSON pour un seul site CEN spécifié par son ID.
+    Cela permet d'optimiser le chargement de la page edit_contract.html.
+    """
+    try:
+        level = get_simplification_level(request.args)
+    except ValueError:
+        return jsonify({"error": "Paramètre zoom ou tolerance invalide."}), 400
+
+    # Récupérer uniquement le site spécifié (GeoJSON produit par PostGIS)
+    entry = get_single_site_geojson_entry(site_id, level)
+
+    if entry is None:
+        return current_app.response_class(EMPTY_FEATURE_COLLECTION, status=404, mimetype='application/json')
+
+    return make_geojson_response(entry)
+
+
+@bp.cli.command('warm-sites-cache')
+@click.option('--all', 'all_levels', is_flag=True, help="Tous les niveaux de zoom (par défaut : SITES_WARM_ZOOMS).")
+def warm_sites_cache_command(all_levels):
+    """Précalcule le GeoJSON des sites CEN pour les niveaux de SITES_WARM_ZOOMS (ou tous)."""
+    levels = warm_sites_cache(all_levels)
+    print(f"Cache GeoJSON des sites CEN préchauffé pour {len(levels)} niveaux.")
+
+
+@bp.route('/sig/depts_na.<version>.geojson')
+def depts_geojson(version):
+    """Contour des départements, versionné par son empreinte et mis en cache longue durée."""
+    return depts_geojson_response(version)
+
+
+@bp.cli.command('simplify-depts')
+@click.option('--tolerance', default=0.002, show_default=True, help="Tolérance de simplification (degrés).")
+@click.option('--decimals', default=4, show_default=True, help="Nombre de décimales conservées.")
+def simplify_depts_command(tolerance, decimals):
+    """Génère static/sig/depts_na_simplified.geojson pour les zooms d'ensemble."""
+    source_size, target_size = simplify_depts_geojson(current_app.static_folder, tolerance, decimals)
+    print(f"GeoJSON des départements simplifié : {source_size / 1024:.0f} Ko -> {target_size / 1024:.0f} Ko.")
+
+
+@bp.route('/tiles/<layer>/<int:z>/<int:x>/<int:y>.pbf')
+@login_required
+def vector_tile(layer, z, x, y):
+    """
+    Tuile vectorielle (MVT) d'une couche ('sites' ou 'contrats').
+    Les tuiles sont servies depuis le cache disque et revalidées par ETag.
+    """
+    if layer not in TILE_LAYERS or not is_valid_tile(z, x, y):
+        return jsonify({"error": "Tuile introuvable."}), 404
+
+    tile, version = get_tile(layer, z, x, y)
+
+    response = current_app.response_class(tile, mimetype='application/vnd.mapbox-vector-tile')
+    response.set_etag(f"{layer}-{version}-{z}-{x}-{y}")
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@bp.cli.command('seed-tiles')
+@click.option('--layer', type=click.Choice(sorted(TILE_LAYERS)), multiple=True, help="Couche(s) à précalculer (toutes par défaut).")
+@click.option('--min-zoom', default=0, show_default=True)
+@click.option('--max-zoom', default=lambda: current_app.config['TILES_SEED_MAX_ZOOM'], type=int, help="Zoom maximal (TILES_SEED_MAX_ZOOM par défaut).")
+def seed_tiles_command(layer, min_zoom, max_zoom):
+    """Précalcule les tuiles vectorielles des petits niveaux de zoom."""
+    for name in layer or sorted(TILE_LAYERS):
+        count = seed_tiles(name, min_zoom, max_zoom)
+        print(f"Couche {name} : {count} tuiles générées (zooms {min_zoom} à {max_zoom}).")
@@ -0,0 +1,42 @@
+"""
+Configuration de gunicorn (gunicorn -c gunicorn.conf.py), réglable par variables d'environnement.
+
+Le modèle par défaut est gthread : quelques processus de plusieurs threads,
+adapté à une application qui attend surtout PostgreSQL. Chaque thread peut
+tenir une connexion : GUNICORN_THREADS ne doit pas dépasser
+DB_POOL_SIZE + DB_MAX_OVERFLOW (voir db_pool.py).
+
+Avec GUNICORN_PRELOAD (par défaut), l'application est importée et ses caches
+préchauffés dans le processus maître, puis partagés par les workers en copie
+sur écriture ; le préchauffage est alors forcément synchrone.
+"""
+import gc
+import multiprocessing
+import os
+
+wsgi_app = "wsgi:create_app()"
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")  # "gthread", "sync" ou "gevent"
+workers = int(os.environ.get("GUNICORN_WORKERS", min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))  # Utilisé uniquement par gthread
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))  # Secondes, supérieur au délai du proxy inverse
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+# Redémarrage périodique des workers (fuites mémoire), décalé pour ne pas les relancer tous ensemble
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 200))
+accesslog = os.environ.get("GUNICORN_ACCESSLOG", "-")
+loglevel = os.environ.get("GUNICORN_LOGLEVEL", "info")
+proc_name = "agricen"
+
+if preload_app and os.environ.get("WARMUP") == "background":
+    # Un thread de préchauffage ne survivrait pas au fork des workers
+    os.environ["WARMUP"] = "sync"
+
+
+def when_ready(server):
+    # Les objets chargés par le maître ne sont plus parcourus par le ramasse-miettes :
+    # leurs pages mémoire restent partagées avec les workers au lieu d'être recopiées
+    if preload_app:
+        gc.freeze()
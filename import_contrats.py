@@ -0,0 +1,515 @@
+"""
+Import en masse de contrats depuis un fichier CSV, GeoPackage ou GeoJSON.
+
+Chaque ligne (ou entité) porte les champs de CombinedForm, sous leur nom :
+nom_societe, siret, nom_agri, appellation_contrat, date_signature, code_site...
+Les champs à choix multiples (type_milieu, produit_fini, type_production) sont
+séparés par « | » ; les référentiels sont donnés par identifiant ou par libellé
+(casse et accents ignorés). Pour un GeoPackage ou un GeoJSON, la latitude et
+la longitude sont lues dans la géométrie ponctuelle (EPSG:4326).
+
+Les lignes sont lues en flux et validées avec les règles de CombinedForm. Les
+sociétés, référents, sites et référentiels sont résolus par des tables de
+correspondance en mémoire, chargées une seule fois. Les lignes valides sont
+insérées par lots de IMPORT_CHUNK_SIZE (INSERT groupés, une transaction par
+lot) ; les erreurs sont signalées ligne par ligne, sans interrompre l'import.
+Les codes des référentiels et les bornes des colonnes numériques sont vérifiés
+avant l'écriture ; un lot rejeté malgré tout par la base est réessayé ligne
+par ligne (SAVEPOINT), de sorte que seules les lignes fautives sont écartées.
+"""
+import csv
+import json
+import re
+import sqlite3
+import unicodedata
+from contextlib import closing
+
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.datastructures import MultiDict
+
+from contrats import (
+    agriculteur_values, contrat_values, contrats_modifies, referent_values, societe_values, sync_contrat_map
+)
+from forms import CombinedForm, set_form_choices, validate_saisie
+from models import (
+    db, Agriculteur, AgriculteurSociete, Contrat, ContratSiteCEN, ProduitFiniContrat, Referent,
+    Societe, TypeMilieuContrat, TypeProductionSociete, VueSites
+)
+from referentiel import get_choices
+
+IMPORT_FORMATS = ('csv', 'gpkg', 'geojson')
+LIST_SEPARATOR = '|'
+
+# Champ du formulaire -> référentiel dont il prend les identifiants
+REFERENTIEL_FIELDS = {
+    'appellation_contrat': 'type_contrat',
+    'mode_production': 'mode_production',
+    'type_milieu': 'type_milieu',
+    'produit_fini': 'type_produit_fini',
+    'type_production': 'type_production',
+    # Codes SIRENE de la société (clés étrangères vers les référentiels)
+    'tranche_effectif': 'type_tranche_effectif',
+    'categorie_juridique': 'type_categorie_juridique',
+    'activite_principale': 'type_activite_principale',
+}
+MULTIPLE_FIELDS = ('type_milieu', 'produit_fini', 'type_production')
+# Champ décimal -> bornes acceptées (précision des colonnes : Numeric(4, 2) pour la surface)
+DECIMAL_FIELDS = {
+    'surf_contractualisee': (0, 99.99),
+    'latitude': (-90, 90),
+    'longitude': (-180, 180),
+}
+DATE_FIELDS = ('date_signature', 'date_fin', 'date_prise_effet', 'date_naissance')
+
+DATE_FR = re.compile(r'^(\d{1,2})/(\d{1,2})/(\d{4})$')
+# Taille de l'enveloppe d'une géométrie GeoPackage selon l'indicateur de l'en-tête
+GPKG_ENVELOPE_SIZES = {0: 0, 1: 32, 2: 48, 3: 48, 4: 64}
+
+
+def detect_format(filename):
+    """Format d'import déduit de l'extension du fichier ; lève ValueError s'il n'est pas géré."""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    extension = 'geojson' if extension == 'json' else extension
+    if extension not in IMPORT_FORMATS:
+        raise ValueError(f"Format non géré : « {extension} » (attendu : {', '.join(IMPORT_FORMATS)}).")
+    return extension
+
+
+def normalize_label(value):
+    """Libellé comparable : sans accents, sans casse ni espaces superflus."""
+    value = unicodedata.normalize('NFKD', str(value)).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(value.casefold().split())
+
+
+def iter_csv_rows(path):
+    """Génère (numéro de ligne, champs, erreur) ; séparateur « ; » ou « , » détecté sur l'en-tête."""
+    with open(path, encoding='utf-8-sig', newline='') as csv_file:
+        header = csv_file.readline()
+        csv_file.seek(0)
+        delimiter = ';' if header.count(';') >= header.count(',') else ','
+        reader = csv.DictReader(csv_file, delimiter=delimiter)
+        for row in reader:
+            yield reader.line_num, row, None
+
+
+def geojson_point(geometry):
+    """Coordonnées (x, y) d'une géométrie GeoJSON ; lève ValueError si ce n'est pas un point valide."""
+    if not isinstance(geometry, dict):
+        raise ValueError("Géométrie GeoJSON invalide.")
+    if geometry.get('type') != 'Point':
+        raise ValueError(f"Géométrie {geometry.get('type')} : seuls les points sont acceptés.")
+    coordinates = geometry.get('coordinates')
+    if not isinstance(coordinates, list) or len(coordinates) < 2:
+        raise ValueError("Point GeoJSON sans coordonnées.")
+    return coordinates[0], coordinates[1]
+
+
+def iter_geojson_rows(path):
+    """
+    Génère (numéro d'entité, propriétés + coordonnées, erreur) d'une FeatureCollection.
+    Le document GeoJSON est lu en entier : préférer CSV ou GeoPackage pour les gros volumes.
+    Lève ValueError si le document n'est pas une FeatureCollection.
+    """
+    with open(path, encoding='utf-8') as geojson_file:
+        document = json.load(geojson_file)
+    features = document.get('features') if isinstance(document, dict) else None
+    if not isinstance(features, list):
+        raise ValueError("Le document GeoJSON doit être une FeatureCollection.")
+
+    for number, feature in enumerate(features, start=1):
+        if not isinstance(feature, dict):
+            yield number, {}, "Entité GeoJSON invalide."
+            continue
+        properties = feature.get('properties') or {}
+        if not isinstance(properties, dict):
+            yield number, {}, "Propriétés GeoJSON invalides."
+            continue
+        row = dict(properties)
+        geometry = feature.get('geometry')
+        error = None
+        if geometry:
+            try:
+                row['longitude'], row['latitude'] = geojson_point(geometry)
+            except ValueError as e:
+                error = str(e)
+        yield number, row, error
+
+
+def gpkg_point(blob):
+    """Coordonnées (x, y) d'une géométrie GeoPackage (en-tête « GP » + WKB) ; lève ValueError si ce n'est pas un point valide."""
+    from shapely import wkb
+    from shapely.errors import ShapelyError
+
+    if len(blob) < 8 or blob[:2] != b'GP':
+        raise ValueError("Géométrie GeoPackage invalide.")
+    envelope_size = GPKG_ENVELOPE_SIZES.get((blob[3] >> 1) & 0x07)
+    if envelope_size is None or len(blob) <= 8 + envelope_size:
+        raise ValueError("Géométrie GeoPackage invalide (en-tête ou enveloppe).")
+    try:
+        geometry = wkb.loads(bytes(blob[8 + envelope_size:]))
+    except ShapelyError as e:
+        raise ValueError(f"Géométrie GeoPackage illisible : {e}")
+    if geometry.geom_type != 'Point':
+        raise ValueError(f"Géométrie {geometry.geom_type} : seuls les points sont acceptés.")
+    if geometry.is_empty:
+        raise ValueError("Point GeoPackage vide.")
+    return geometry.x, geometry.y
+
+
+def iter_gpkg_rows(path):
+    """
+    Génère (numéro d'entité, attributs + coordonnées, erreur) de la première couche d'un GeoPackage.
+    Lève ValueError si le fichier n'est pas un GeoPackage lisible.
+    """
+    try:
+        with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as connection:
+            layer = connection.execute(
+                "SELECT table_name, column_name, srs_id FROM gpkg_geometry_columns LIMIT 1"
+            ).fetchone()
+            if layer is None:
+                raise ValueError("Aucune couche géométrique dans le GeoPackage.")
+            table_name, geometry_column, srs_id = layer
+            if srs_id != 4326:
+                raise ValueError(f"Système de coordonnées EPSG:{srs_id} non géré (attendu : EPSG:4326).")
+
+            connection.row_factory = sqlite3.Row
+            table_name = table_name.replace('"', '""')
+            for number, record in enumerate(connection.execute(f'SELECT * FROM "{table_name}"'), start=1):
+                row = {key: record[key] for key in record.keys() if key != geometry_column}
+                error = None
+                if record[geometry_column] is not None:
+                    try:
+                        row['longitude'], row['latitude'] = gpkg_point(record[geometry_column])
+                    except ValueError as e:
+                        error = str(e)
+                yield number, row, error
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f"GeoPackage illisible : {e}") from e
+
+
+ROW_READERS = {
+    'csv': iter_csv_rows,
+    'gpkg': iter_gpkg_rows,
+    'geojson': iter_geojson_rows,
+}
+
+
+class ContratImporter:
+    """
+    Valide les lignes d'un fichier de contrats et les insère par lots.
+    Les erreurs sont transmises ligne par ligne à `on_error(numéro, [messages])`.
+    """
+
+    def __init__(self, chunk_size=1000, dry_run=False, on_error=None):
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.on_error = on_error or (lambda number, messages: None)
+        self.stats = {'lues': 0, 'importees': 0, 'erreurs': 0}
+
+        # Tables de correspondance chargées une seule fois
+        self.referentiels = {}
+        for field, name in REFERENTIEL_FIELDS.items():
+            lookup = {}
+            for code, label in get_choices(name):
+                lookup[normalize_label(label)] = code
+                lookup[str(code)] = code
+            self.referentiels[field] = lookup
+        self.societes_par_siret = dict(db.session.execute(
+            db.select(Societe.siret, Societe.id_societe).where(Societe.siret.isnot(None))
+        ).all())
+        self.societes_par_nom = dict(db.session.execute(
+            db.select(Societe.nom_societe, Societe.id_societe).where(Societe.nom_societe.isnot(None))
+        ).all())
+        self.referents = {
+            (nom, prenom): id_referent for id_referent, nom, prenom in db.session.execute(
+                db.select(Referent.id_referent, Referent.nom_referent, Referent.prenom_referent)
+            )
+        }
+        self.sites = dict(db.session.execute(db.select(VueSites.codesite, VueSites.idsite)).all())
+
+        self._reset_chunk()
+
+    def _reset_chunk(self):
+        self.chunk = []
+        self.chunk_societes = []
+        self.chunk_societes_par_siret = {}
+        self.chunk_societes_par_nom = {}
+        self.chunk_referents = []
+        self.chunk_referents_index = {}
+
+    def report(self, number, messages):
+        self.stats['erreurs'] += 1
+        self.on_error(number, messages)
+
+    def prepare(self, row):
+        """Convertit une ligne brute en données de formulaire ; retourne (MultiDict, erreurs)."""
+        formdata = MultiDict()
+        errors = []
+        for name, value in row.items():
+            if name is None or value is None:
+                continue
+            name = name.strip()
+            value = str(value).strip()
+            if not value:
+                continue
+
+            if name in MULTIPLE_FIELDS:
+                values = [item.strip() for item in value.split(LIST_SEPARATOR) if item.strip()]
+            else:
+                values = [value]
+
+            if name in REFERENTIEL_FIELDS:
+                resolved = []
+                for item in values:
+                    code = self.referentiels[name].get(normalize_label(item))
+                    if code is None:
+                        errors.append(f"{name} : valeur inconnue « {item} »")
+                    else:
+                        resolved.append(str(code))
+                values = resolved
+            elif name in DECIMAL_FIELDS:
+                values = [item.replace(',', '.') for item in values]
+                minimum, maximum = DECIMAL_FIELDS[name]
+                for item in values:
+                    try:
+                        number = float(item)
+                    except ValueError:
+                        errors.append(f"{name} : « {item} » n'est pas un nombre")
+                        continue
+                    if not minimum <= number <= maximum:
+                        errors.append(f"{name} : {item} hors de l'intervalle [{minimum} ; {maximum}]")
+            elif name in DATE_FIELDS:
+                values = [DATE_FR.sub(lambda m: f"{m[3]}-{int(m[2]):02d}-{int(m[1]):02d}", item) for item in values]
+
+            for item in values:
+                formdata.add(name, item)
+        return formdata, errors
+
+    def find_societe(self, siret, nom_societe):
+        """Retourne ('id', id_societe) pour une société en base, ('lot', index) pour une société du lot courant, ou None."""
+        if siret:
+            if siret in self.societes_par_siret:
+                return 'id', self.societes_par_siret[siret]
+            if siret in self.chunk_societes_par_siret:
+                return 'lot', self.chunk_societes_par_siret[siret]
+        if nom_societe:
+            if nom_societe in self.societes_par_nom:
+                return 'id', self.societes_par_nom[nom_societe]
+            if nom_societe in self.chunk_societes_par_nom:
+                return 'lot', self.chunk_societes_par_nom[nom_societe]
+        return None
+
+    def add_row(self, number, row):
+        """Valide une ligne et l'ajoute au lot courant ; le lot est écrit lorsqu'il est plein."""
+        self.stats['lues'] += 1
+        formdata, errors = self.prepare(row)
+
+        siret = formdata.get('siret')
+        societe_existante = bool(siret) and (
+            siret in self.societes_par_siret or siret in self.chunk_societes_par_siret
+        )
+        form = CombinedForm(formdata=formdata, meta={'csrf': False})
+        set_form_choices(form)
+        if not validate_saisie(form, societe_existante=societe_existante) or errors:
+            errors += [
+                f"{form[field].label.text} : {error}"
+                for field, field_errors in form.errors.items() for error in field_errors
+            ]
+            self.report(number, errors)
+            return
+
+        self._append(number, form.data)
+        if len(self.chunk) >= self.chunk_size:
+            self.flush()
+
+    def _append(self, number, data):
+        """Ajoute une ligne validée au lot courant, en réutilisant les sociétés et référents connus."""
+        societe = self.find_societe(data['siret'], data['nom_societe'])
+        if societe is None:
+            index = len(self.chunk_societes)
+            self.chunk_societes.append({
+                'societe': societe_values(data),
+                'agriculteur': agriculteur_values(data),
+                'productions': {production_id: data['mode_production'] for production_id in data['type_production']},
+            })
+            if data['siret']:
+                self.chunk_societes_par_siret[data['siret']] = index
+            if data['nom_societe']:
+                self.chunk_societes_par_nom[data['nom_societe']] = index
+            societe = ('lot', index)
+
+        referent_key = (data['nom_referent'], data['prenom_referent'])
+        if referent_key in self.referents:
+            referent = ('id', self.referents[referent_key])
+        else:
+            if referent_key not in self.chunk_referents_index:
+                self.chunk_referents_index[referent_key] = len(self.chunk_referents)
+                self.chunk_referents.append(referent_values(data))
+            referent = ('lot', self.chunk_referents_index[referent_key])
+
+        self.chunk.append({
+            'number': number,
+            'data': data,
+            'societe': societe,
+            'referent': referent,
+            'contrat': contrat_values(data),
+            'code_site': data['code_site'],
+            'nom_site': data['nom_site'],
+            'type_milieu': sorted(set(data['type_milieu'])),
+            'produit_fini': sorted(set(data['produit_fini'])),
+        })
+
+    def _insert_chunk(self):
+        """Insère le lot courant (INSERT groupés) ; retourne les identifiants des sociétés et référents créés."""
+        societe_ids, referent_ids = [], []
+
+        if self.chunk_societes:
+            societe_ids = db.session.execute(
+                insert(Societe).returning(Societe.id_societe, sort_by_parameter_order=True),
+                [societe['societe'] for societe in self.chunk_societes]
+            ).scalars().all()
+            agriculteur_ids = db.session.execute(
+                insert(Agriculteur).returning(Agriculteur.id_agriculteur, sort_by_parameter_order=True),
+                [societe['agriculteur'] for societe in self.chunk_societes]
+            ).scalars().all()
+            db.session.execute(insert(AgriculteurSociete), [
+                {"id_agriculteur": id_agriculteur, "id_societe": id_societe}
+                for id_agriculteur, id_societe in zip(agriculteur_ids, societe_ids)
+            ])
+            productions = [
+                {"id_societe": id_societe, "id_type_production": production_id, "id_mode_production": mode_production}
+                for id_societe, societe in zip(societe_ids, self.chunk_societes)
+                for production_id, mode_production in societe['productions'].items()
+            ]
+            if productions:
+                db.session.execute(insert(TypeProductionSociete), productions)
+
+        if self.chunk_referents:
+            referent_ids = db.session.execute(
+                insert(Referent).returning(Referent.id_referent, sort_by_parameter_order=True),
+                self.chunk_referents
+            ).scalars().all()
+
+        def resolve(reference, created_ids):
+            kind, value = reference
+            return value if kind == 'id' else created_ids[value]
+
+        contrat_ids = db.session.execute(
+            insert(Contrat).returning(Contrat.id_contrat, sort_by_parameter_order=True),
+            [{
+                **row['contrat'],
+                "id_societe": resolve(row['societe'], societe_ids),
+                "id_referent": resolve(row['referent'], referent_ids),
+            } for row in self.chunk]
+        ).scalars().all()
+
+        # Sites absents de la vue des sites : nouveaux identifiants tirés en une seule requête
+        missing = sum(1 for row in self.chunk if row['code_site'] not in self.sites)
+        new_site_ids = iter(db.session.execute(
+            db.select(db.func.nextval('saisie.site_cen_id_site_seq')).select_from(db.func.generate_series(1, missing))
+        ).scalars().all() if missing else [])
+
+        db.session.execute(insert(ContratSiteCEN), [{
+            "id_site": self.sites[row['code_site']] if row['code_site'] in self.sites else next(new_site_ids),
+            "id_contrat": id_contrat,
+            "code_site": row['code_site'],
+            "nom_site": row['nom_site'],
+        } for id_contrat, row in zip(contrat_ids, self.chunk)])
+
+        milieux = [
+            {"id_type_milieu": milieu_id, "id_contrat": id_contrat}
+            for id_contrat, row in zip(contrat_ids, self.chunk) for milieu_id in row['type_milieu']
+        ]
+        if milieux:
+            db.session.execute(insert(TypeMilieuContrat), milieux)
+        produits = [
+            {"id_type_produit_fini": produit_id, "id_contrat": id_contrat}
+            for id_contrat, row in zip(contrat_ids, self.chunk) for produit_id in row['produit_fini']
+        ]
+        if produits:
+            db.session.execute(insert(ProduitFiniContrat), produits)
+
+        # Lignes de la carte écrites dans la transaction du lot
+        sync_contrat_map(contrat_ids=contrat_ids)
+        return societe_ids, referent_ids
+
+    def _remember(self, societe_ids, referent_ids):
+        """Les sociétés et référents créés par le lot deviennent des correspondances permanentes."""
+        for id_societe, societe in zip(societe_ids, self.chunk_societes):
+            if societe['societe']['siret']:
+                self.societes_par_siret[societe['societe']['siret']] = id_societe
+            if societe['societe']['nom_societe']:
+                self.societes_par_nom[societe['societe']['nom_societe']] = id_societe
+        for id_referent, referent in zip(referent_ids, self.chunk_referents):
+            self.referents[(referent['nom_referent'], referent['prenom_referent'])] = id_referent
+
+    def flush(self):
+        """
+        Écrit le lot courant dans sa propre transaction. Si une ligne enfreint une contrainte de la base,
+        le lot est réessayé ligne par ligne (un SAVEPOINT par ligne) : seules les lignes fautives sont signalées.
+        """
+        if not self.chunk:
+            return
+        if self.dry_run:
+            self.stats['importees'] += len(self.chunk)
+            self._reset_chunk()
+            return
+
+        try:
+            societe_ids, referent_ids = self._insert_chunk()
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            self._retry_rows([(row['number'], row['data']) for row in self.chunk])
+        else:
+            self.stats['importees'] += len(self.chunk)
+            self._remember(societe_ids, referent_ids)
+        self._reset_chunk()
+
+    def _retry_rows(self, rows):
+        """Insère les lignes (numéro, données) une à une, chacune dans un SAVEPOINT, puis valide l'ensemble."""
+        for number, data in rows:
+            self._reset_chunk()
+            self._append(number, data)
+            try:
+                with db.session.begin_nested():
+                    societe_ids, referent_ids = self._insert_chunk()
+            except SQLAlchemyError as e:
+                self.report(number, [f"Échec de l'enregistrement : {getattr(e, 'orig', e)}"])
+            else:
+                self.stats['importees'] += 1
+                self._remember(societe_ids, referent_ids)
+        db.session.commit()
+
+    def run(self, rows):
+        """Importe les lignes (numéro, champs, erreur de lecture) ; retourne les compteurs."""
+        for number, row, error in rows:
+            if error:
+                self.stats['lues'] += 1
+                self.report(number, [error])
+            else:
+                self.add_row(number, row)
+        self.flush()
+
+        if self.stats['importees'] and not self.dry_run:
+            contrats_modifies()
+        return self.stats
+
+
+def import_contrats(path, file_format=None, chunk_size=None, dry_run=False, on_error=None):
+    """
+    Importe les contrats d'un fichier CSV, GeoPackage ou GeoJSON.
+    Retourne les compteurs {'lues', 'importees', 'erreurs'} ; lève ValueError si le fichier est illisible.
+    """
+    file_format = file_format or detect_format(path)
+    if file_format not in ROW_READERS:
+        raise ValueError(f"Format non géré : « {file_format} » (attendu : {', '.join(IMPORT_FORMATS)}).")
+
+    importer = ContratImporter(
+        chunk_size=chunk_size or current_app.config['IMPORT_CHUNK_SIZE'],
+        dry_run=dry_run,
+        on_error=on_error
+    )
+    return importer.run(ROW_READERS[file_format](path))
@@ -0,0 +1,59 @@
+"""
+Vue matérialisée saisie.search_index (recherche globale, voir search.py) et
+son rafraîchissement.
+
+Elle est recalculée par REFRESH MATERIALIZED VIEW CONCURRENTLY, qui ne bloque
+pas les lectures (un index unique est requis). Après une écriture de contrats,
+le rafraîchissement est fait en arrière-plan par un unique thread du worker :
+les demandes reçues pendant un rafraîchissement sont regroupées en un seul
+rafraîchissement suivant. Les contrats de la carte ne passent plus par une vue
+matérialisée : la table saisie.contrat_map est tenue à jour dans la transaction
+des écritures (contrats.sync_contrat_map).
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from sqlalchemy import text
+
+from models import db
+
+SEARCH_INDEX = 'saisie.search_index'
+MATERIALIZED_VIEWS = (SEARCH_INDEX,)
+
+
+def refresh_materialized_view(name):
+    """Recalcule une vue matérialisée sans bloquer les lectures."""
+    if name not in MATERIALIZED_VIEWS:
+        raise ValueError(f"Vue matérialisée inconnue : {name}")
+    # Un recalcul complet peut dépasser le statement_timeout des requêtes web
+    db.session.execute(text("SET LOCAL statement_timeout = 0"))
+    db.session.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}"))
+    db.session.commit()
+
+
+_refresh_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='matviews')
+_refresh_lock = threading.Lock()
+_queued = set()
+
+
+def _run_refresh(app, name):
+    with _refresh_lock:
+        _queued.discard(name)
+    with app.app_context():
+        try:
+            refresh_materialized_view(name)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Échec du rafraîchissement de {name} : {e}")
+
+
+def schedule_refresh(*names):
+    """Programme le rafraîchissement en arrière-plan des vues indiquées, dans l'ordre donné."""
+    app = current_app._get_current_object()
+    for name in names:
+        with _refresh_lock:
+            if name in _queued:
+                continue
+            _queued.add(name)
+        _refresh_executor.submit(_run_refresh, app, name)
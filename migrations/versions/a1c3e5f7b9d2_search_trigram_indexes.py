@@ -0,0 +1,46 @@
+"""Index trigrammes pour la recherche des agriculteurs et des référents
+
+Revision ID: a1c3e5f7b9d2
+Revises: 
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c3e5f7b9d2'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Les expressions indexées doivent rester identiques à search.search_key
+INDEXES = {
+    'idx_agriculteur_recherche_trgm': ('saisie.agriculteur', 'nom_agri', 'prenom_agri'),
+    'idx_referent_recherche_trgm': ('saisie.referent', 'nom_referent', 'prenom_referent'),
+}
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+
+    # unaccent() n'est que STABLE (dictionnaire choisi à l'exécution) : cette version
+    # à dictionnaire explicite est IMMUTABLE et peut donc être utilisée dans un index.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION saisie.f_unaccent(text) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+        AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+    """)
+
+    for name, (table, nom, prenom) in INDEXES.items():
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin "
+            f"(saisie.f_unaccent(lower(coalesce({nom}, '') || ' ' || coalesce({prenom}, ''))) gin_trgm_ops)"
+        )
+
+
+def downgrade():
+    for name in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS saisie.{name}")
+    op.execute("DROP FUNCTION IF EXISTS saisie.f_unaccent(text)")
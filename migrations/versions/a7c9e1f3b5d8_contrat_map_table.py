@@ -0,0 +1,41 @@
+"""Table des contrats à plat (saisie.contrat_map), tenue à jour dans la transaction des écritures
+
+Remplace la vue matérialisée saisie.contrat_map_view : ses lignes sont recopiées
+dans une table ordinaire, mise à jour par contrats.sync_contrat_map() avant
+chaque COMMIT d'une écriture de contrats (plus de rafraîchissement différé).
+
+Revision ID: a7c9e1f3b5d8
+Revises: f6b8d0e2a4c7
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+import os
+import runpy
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c9e1f3b5d8'
+down_revision = 'f6b8d0e2a4c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE TABLE saisie.contrat_map AS SELECT * FROM saisie.contrat_map_view")
+    # Clé primaire : sert la pagination par curseur et les INSERT ... ON CONFLICT de sync_contrat_map ;
+    # la ligne d'un contrat supprimé disparaît avec lui
+    op.execute("""
+        ALTER TABLE saisie.contrat_map
+            ADD PRIMARY KEY (id_contrat),
+            ADD FOREIGN KEY (id_contrat) REFERENCES saisie.contrat (id_contrat) ON DELETE CASCADE
+    """)
+    op.execute("DROP MATERIALIZED VIEW saisie.contrat_map_view")
+
+
+def downgrade():
+    previous = runpy.run_path(os.path.join(os.path.dirname(__file__), 'd4f6b8c0e2a5_contrat_map_view.py'))
+    op.execute(previous['CONTRAT_MAP_VIEW_SQL'])
+    op.execute("CREATE UNIQUE INDEX idx_contrat_map_view_id ON saisie.contrat_map_view (id_contrat)")
+    op.execute("DROP TABLE saisie.contrat_map")
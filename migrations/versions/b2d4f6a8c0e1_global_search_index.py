@@ -0,0 +1,80 @@
+"""Index de recherche globale (vue matérialisée saisie.search_index)
+
+Revision ID: b2d4f6a8c0e1
+Revises: a1c3e5f7b9d2
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2d4f6a8c0e1'
+down_revision = 'a1c3e5f7b9d2'
+branch_labels = None
+depends_on = None
+
+# Une ligne par objet recherchable : type, référence, libellé affiché, détail,
+# premier contrat et nombre de contrats, clé normalisée (minuscules, sans accents).
+SEARCH_INDEX_SQL = """
+CREATE MATERIALIZED VIEW saisie.search_index AS
+WITH contrats_societe AS (
+    SELECT id_societe, min(id_contrat) AS id_contrat, count(*) AS nb_contrats
+    FROM saisie.contrat GROUP BY id_societe
+)
+SELECT 'societe'::text AS type, s.id_societe::text AS ref, s.nom_societe::text AS libelle,
+       s.siret::text AS detail, cs.id_contrat, coalesce(cs.nb_contrats, 0) AS nb_contrats,
+       saisie.f_unaccent(lower(s.nom_societe)) AS cle
+FROM saisie.societe s
+LEFT JOIN contrats_societe cs ON cs.id_societe = s.id_societe
+WHERE s.nom_societe IS NOT NULL
+UNION ALL
+SELECT 'siret', s.id_societe::text, s.siret, s.nom_societe, cs.id_contrat, coalesce(cs.nb_contrats, 0),
+       s.siret
+FROM saisie.societe s
+LEFT JOIN contrats_societe cs ON cs.id_societe = s.id_societe
+WHERE s.siret IS NOT NULL
+UNION ALL
+SELECT 'agriculteur', a.id_agriculteur::text, a.prenom_agri || ' ' || a.nom_agri,
+       min(s.nom_societe), min(cs.id_contrat), coalesce(sum(cs.nb_contrats), 0),
+       saisie.f_unaccent(lower(a.prenom_agri || ' ' || a.nom_agri))
+FROM saisie.agriculteur a
+LEFT JOIN saisie.agriculteur_societe ags ON ags.id_agriculteur = a.id_agriculteur
+LEFT JOIN saisie.societe s ON s.id_societe = ags.id_societe
+LEFT JOIN contrats_societe cs ON cs.id_societe = ags.id_societe
+GROUP BY a.id_agriculteur
+UNION ALL
+SELECT 'referent', r.id_referent::text,
+       coalesce(r.prenom_referent, '') || ' ' || coalesce(r.nom_referent, ''),
+       NULL, min(c.id_contrat), count(c.id_contrat),
+       saisie.f_unaccent(lower(coalesce(r.prenom_referent, '') || ' ' || coalesce(r.nom_referent, '')))
+FROM saisie.referent r
+LEFT JOIN saisie.contrat c ON c.id_referent = r.id_referent
+GROUP BY r.id_referent
+UNION ALL
+SELECT 'site', cs.code_site, min(cs.nom_site), cs.code_site, min(cs.id_contrat), count(*),
+       saisie.f_unaccent(lower(cs.code_site || ' ' || coalesce(min(cs.nom_site), '')))
+FROM saisie.contrat_site_cen cs
+WHERE cs.code_site IS NOT NULL
+GROUP BY cs.code_site
+UNION ALL
+SELECT 'contrat', c.id_contrat::text, c.numero_contrat, s.nom_societe, c.id_contrat, 1,
+       saisie.f_unaccent(lower(c.numero_contrat))
+FROM saisie.contrat c
+JOIN saisie.societe s ON s.id_societe = c.id_societe
+WHERE c.numero_contrat IS NOT NULL
+"""
+
+
+def upgrade():
+    op.execute(SEARCH_INDEX_SQL)
+    # Index unique requis par REFRESH MATERIALIZED VIEW CONCURRENTLY
+    op.execute("CREATE UNIQUE INDEX idx_search_index_ref ON saisie.search_index (type, ref)")
+    # Préfixes (termes courts, SIRET) : B-tree text_pattern_ops
+    op.execute("CREATE INDEX idx_search_index_cle_prefixe ON saisie.search_index (cle text_pattern_ops)")
+    # Similarité : GiST trigrammes, qui permet le tri par distance (<<->) avec LIMIT
+    op.execute("CREATE INDEX idx_search_index_cle_trgm ON saisie.search_index USING gist (cle gist_trgm_ops)")
+
+
+def downgrade():
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS saisie.search_index")
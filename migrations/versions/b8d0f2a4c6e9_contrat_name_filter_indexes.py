@@ -0,0 +1,37 @@
+"""Index des filtres par nom des contrats (agriculteur, société, référent)
+
+Revision ID: b8d0f2a4c6e9
+Revises: a7c9e1f3b5d8
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d0f2a4c6e9'
+down_revision = 'a7c9e1f3b5d8'
+branch_labels = None
+depends_on = None
+
+# Nom de l'index -> définition : mêmes expressions que contrat_filters.filter_conditions
+# (« prénom nom » en minuscules, comme les libellés de /api/search)
+INDEXES = {
+    'idx_agriculteur_nom_complet': (
+        "saisie.agriculteur (lower(coalesce(prenom_agri, '') || ' ' || coalesce(nom_agri, '')))"
+    ),
+    'idx_referent_nom_complet': (
+        "saisie.referent (lower(coalesce(prenom_referent, '') || ' ' || coalesce(nom_referent, '')))"
+    ),
+    'idx_societe_nom_lower': "saisie.societe (lower(nom_societe))",
+}
+
+
+def upgrade():
+    for name, definition in INDEXES.items():
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+
+
+def downgrade():
+    for name in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS saisie.{name}")
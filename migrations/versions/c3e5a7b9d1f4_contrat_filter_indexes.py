@@ -0,0 +1,46 @@
+"""Index des filtres et facettes des contrats (/api/contrats/query)
+
+Revision ID: c3e5a7b9d1f4
+Revises: b2d4f6a8c0e1
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e5a7b9d1f4'
+down_revision = 'b2d4f6a8c0e1'
+branch_labels = None
+depends_on = None
+
+# Nom de l'index -> définition (voir contrat_filters.filter_conditions)
+INDEXES = {
+    # Filtres et facettes portés par le contrat
+    'idx_contrat_type_contrat': "saisie.contrat (id_type_contrat)",
+    'idx_contrat_referent': "saisie.contrat (id_referent)",
+    'idx_contrat_societe': "saisie.contrat (id_societe)",
+    'idx_contrat_date_signature': "saisie.contrat (date_signature)",
+    'idx_contrat_date_prise_effet': "saisie.contrat (date_prise_effet)",
+    'idx_contrat_date_fin': "saisie.contrat (date_fin)",
+    # Tables d'association : la clé primaire commence par le référentiel, la jointure se fait par contrat
+    'idx_type_milieu_contrat_contrat': "saisie.type_milieu_contrat (id_contrat, id_type_milieu)",
+    'idx_produit_fini_contrat_contrat': "saisie.produit_fini_contrat (id_contrat, id_type_produit_fini)",
+    'idx_type_production_societe_type': "saisie.type_production_societe (id_type_production, id_societe)",
+    'idx_type_production_societe_mode': "saisie.type_production_societe (id_mode_production, id_societe)",
+    # Emprise : même expression que contrat_filters.contrat_point()
+    'idx_contrat_point': (
+        "saisie.contrat USING gist ("
+        "ST_SetSRID(ST_MakePoint(CAST(longitude AS double precision), CAST(latitude AS double precision)), 4326))"
+    ),
+}
+
+
+def upgrade():
+    for name, definition in INDEXES.items():
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+
+
+def downgrade():
+    for name in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS saisie.{name}")
@@ -0,0 +1,80 @@
+"""Vue matérialisée des contrats à plat (saisie.contrat_map_view)
+
+Revision ID: d4f6b8c0e2a5
+Revises: c3e5a7b9d1f4
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f6b8c0e2a5'
+down_revision = 'c3e5a7b9d1f4'
+branch_labels = None
+depends_on = None
+
+# Une ligne par contrat, colonnes de contrats.contrats_flat_query : premier site et
+# premier agriculteur, productions (avec leur mode), produits finis, milieux et libellés.
+CONTRAT_MAP_VIEW_SQL = """
+CREATE MATERIALIZED VIEW saisie.contrat_map_view AS
+SELECT c.id_contrat, c.latitude, c.longitude, c.surf_contractualisee,
+       c.date_signature, c.date_prise_effet, c.date_fin, c.date_ajout_bdd,
+       c.remarques AS remarques_contrat,
+       s.nom_societe, s.telephone, s.email, s.siret, s.adresse_etablissement,
+       s.remarques AS remarques_societe,
+       te.code_type_tranche_effectif, te.lib_type_tranche_effectif,
+       cj.code_type_categorie_juridique, cj.lib_type_categorie_juridique,
+       ap.code_type_activite_principale, ap.lib_type_activite_principale,
+       tc.appellation_contrat,
+       r.id_referent, r.prenom_referent, r.nom_referent,
+       premier_site.id_site, premier_site.nom_site, premier_site.code_site,
+       premier_agriculteur.id_agriculteur, premier_agriculteur.prenom_agri,
+       premier_agriculteur.nom_agri, premier_agriculteur.date_naissance,
+       (SELECT jsonb_agg(jsonb_build_object('type', tp.nature_production, 'mode_production', mp.nom)
+                         ORDER BY tps.id_type_production)
+        FROM saisie.type_production_societe tps
+        JOIN referentiel.type_production tp ON tp.id_type_production = tps.id_type_production
+        LEFT JOIN referentiel.mode_production mp ON mp.id = tps.id_mode_production
+        WHERE tps.id_societe = c.id_societe) AS type_productions,
+       (SELECT array_agg(coalesce(tpf.nature_produit_fini, 'Non spécifié') ORDER BY pfc.id_type_produit_fini)
+        FROM saisie.produit_fini_contrat pfc
+        LEFT JOIN referentiel.type_produit_fini tpf ON tpf.id_type_produit_fini = pfc.id_type_produit_fini
+        WHERE pfc.id_contrat = c.id_contrat) AS produits_finis,
+       (SELECT array_agg(tm.milieu ORDER BY tm.id_type_milieu)
+        FROM saisie.type_milieu_contrat tmc
+        JOIN referentiel.type_milieu tm ON tm.id_type_milieu = tmc.id_type_milieu
+        WHERE tmc.id_contrat = c.id_contrat) AS type_milieux
+FROM saisie.contrat c
+JOIN saisie.societe s ON s.id_societe = c.id_societe
+LEFT JOIN referentiel.type_tranche_effectif te ON te.code_type_tranche_effectif = s.tranche_effectif
+LEFT JOIN referentiel.type_categorie_juridique cj ON cj.code_type_categorie_juridique = s.categorie_juridique
+LEFT JOIN referentiel.type_activite_principale ap ON ap.code_type_activite_principale = s.activite_principale
+LEFT JOIN referentiel.type_contrat tc ON tc.id_type_contrat = c.id_type_contrat
+LEFT JOIN saisie.referent r ON r.id_referent = c.id_referent
+LEFT JOIN LATERAL (
+    SELECT cs.id_site, cs.nom_site, cs.code_site
+    FROM saisie.contrat_site_cen cs
+    WHERE cs.id_contrat = c.id_contrat
+    ORDER BY cs.id_site
+    LIMIT 1
+) premier_site ON true
+LEFT JOIN LATERAL (
+    SELECT a.id_agriculteur, a.prenom_agri, a.nom_agri, a.date_naissance
+    FROM saisie.agriculteur a
+    JOIN saisie.agriculteur_societe ags ON ags.id_agriculteur = a.id_agriculteur
+    WHERE ags.id_societe = c.id_societe
+    ORDER BY a.id_agriculteur
+    LIMIT 1
+) premier_agriculteur ON true
+"""
+
+
+def upgrade():
+    op.execute(CONTRAT_MAP_VIEW_SQL)
+    # Index unique requis par REFRESH MATERIALIZED VIEW CONCURRENTLY ; sert aussi la pagination par curseur
+    op.execute("CREATE UNIQUE INDEX idx_contrat_map_view_id ON saisie.contrat_map_view (id_contrat)")
+
+
+def downgrade():
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS saisie.contrat_map_view")
@@ -0,0 +1,31 @@
+"""Table des sessions utilisateur (saisie.flask_session)
+
+Revision ID: e5a7c9d1f3b6
+Revises: d4f6b8c0e2a5
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a7c9d1f3b6'
+down_revision = 'd4f6b8c0e2a5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS saisie.flask_session (
+            session_id text PRIMARY KEY,
+            data text NOT NULL,
+            expiry timestamptz NOT NULL
+        )
+    """)
+    # Lecture filtrée sur expiry et purge périodique des sessions expirées
+    op.execute("CREATE INDEX IF NOT EXISTS idx_flask_session_expiry ON saisie.flask_session (expiry)")
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS saisie.flask_session")
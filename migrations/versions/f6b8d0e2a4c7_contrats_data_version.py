@@ -0,0 +1,52 @@
+"""Compteur de version des contrats (saisie.data_version), incrémenté par trigger
+
+Revision ID: f6b8d0e2a4c7
+Revises: e5a7c9d1f3b6
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6b8d0e2a4c7'
+down_revision = 'e5a7c9d1f3b6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS saisie.data_version (
+            nom text PRIMARY KEY,
+            version bigint NOT NULL DEFAULT 0
+        )
+    """)
+    op.execute("INSERT INTO saisie.data_version (nom) VALUES ('contrats') ON CONFLICT (nom) DO NOTHING")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION saisie.bump_data_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE saisie.data_version SET version = version + 1 WHERE nom = TG_ARGV[0];
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    # Une incrémentation par instruction, dans la transaction de l'écriture : seules les
+    # colonnes présentes dans les tuiles (position) comptent pour les mises à jour
+    op.execute("""
+        CREATE TRIGGER trg_contrat_data_version
+        AFTER INSERT OR DELETE OR UPDATE OF id_contrat, latitude, longitude ON saisie.contrat
+        FOR EACH STATEMENT EXECUTE FUNCTION saisie.bump_data_version('contrats')
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_contrat_data_version_truncate
+        AFTER TRUNCATE ON saisie.contrat
+        FOR EACH STATEMENT EXECUTE FUNCTION saisie.bump_data_version('contrats')
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_contrat_data_version_truncate ON saisie.contrat")
+    op.execute("DROP TRIGGER IF EXISTS trg_contrat_data_version ON saisie.contrat")
+    op.execute("DROP FUNCTION IF EXISTS saisie.bump_data_version()")
+    op.execute("DROP TABLE IF EXISTS saisie.data_version")
@@ -262,5 +262,3 @@ class VueSites(db.Model):
     geom = db.Column(Geometry('MultiPolygon'))
     
 Index('idx_site_geom', VueSites.geom, postgresql_using='gist')
-
-db.configure_mappers()
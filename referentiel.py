@@ -0,0 +1,77 @@
+"""
+Cache en mémoire des tables du schéma referentiel.
+
+Ces tables ne changent presque jamais : elles sont chargées une fois par
+worker puis servies depuis la mémoire (choix des formulaires, libellés à
+partir des codes). L'application n'écrit jamais dans ces tables : le cache
+est simplement rechargé après REFERENTIELS_CACHE_TTL secondes. Chaque
+rechargement construit un nouveau dictionnaire, remplacé en une seule
+affectation : un lecteur voit toujours un cache complet.
+"""
+import threading
+import time
+
+from flask import current_app
+
+from models import (
+    db, ModeProduction, TypeActivitePrincipale, TypeCategorieJuridique, TypeContrat,
+    TypeMilieu, TypeProduction, TypeProduitFini, TypeTrancheEffectif
+)
+
+# Nom du référentiel -> (modèle, colonne code, colonne libellé)
+REFERENTIELS = {
+    'type_milieu': (TypeMilieu, TypeMilieu.id_type_milieu, TypeMilieu.milieu),
+    'type_contrat': (TypeContrat, TypeContrat.id_type_contrat, TypeContrat.appellation_contrat),
+    'type_produit_fini': (TypeProduitFini, TypeProduitFini.id_type_produit_fini, TypeProduitFini.nature_produit_fini),
+    'mode_production': (ModeProduction, ModeProduction.id, ModeProduction.nom),
+    'type_production': (TypeProduction, TypeProduction.id_type_production, TypeProduction.nature_production),
+    'type_activite_principale': (TypeActivitePrincipale, TypeActivitePrincipale.code_type_activite_principale, TypeActivitePrincipale.lib_type_activite_principale),
+    'type_categorie_juridique': (TypeCategorieJuridique, TypeCategorieJuridique.code_type_categorie_juridique, TypeCategorieJuridique.lib_type_categorie_juridique),
+    'type_tranche_effectif': (TypeTrancheEffectif, TypeTrancheEffectif.code_type_tranche_effectif, TypeTrancheEffectif.lib_type_tranche_effectif),
+}
+
+_lock = threading.Lock()
+_cache = None  # {'choices', 'labels', 'loaded_at'}, jamais modifié après sa construction
+
+
+def load_referentiels():
+    """Lit toutes les tables de référence : {nom: [(code, libellé), ...]} triés par code."""
+    return {
+        name: [tuple(row) for row in db.session.execute(db.select(code, label).order_by(code))]
+        for name, (model, code, label) in REFERENTIELS.items()
+    }
+
+
+def _get_cache():
+    """Retourne le cache courant en le (re)chargeant s'il est vide ou expiré."""
+    global _cache
+    ttl = current_app.config['REFERENTIELS_CACHE_TTL']
+    cache = _cache
+    if cache is None or time.monotonic() - cache['loaded_at'] > ttl:
+        with _lock:
+            # Un autre thread a pu recharger le cache pendant l'attente du verrou
+            cache = _cache
+            if cache is None or time.monotonic() - cache['loaded_at'] > ttl:
+                choices = load_referentiels()
+                cache = {
+                    'choices': choices,
+                    'labels': {name: dict(values) for name, values in choices.items()},
+                    'loaded_at': time.monotonic(),
+                }
+                _cache = cache
+    return cache
+
+
+def warm_referentiels():
+    """Charge le cache au démarrage du worker ; retourne le nombre de référentiels."""
+    return len(_get_cache()['choices'])
+
+
+def get_choices(name):
+    """Liste des choix (code, libellé) d'un référentiel, prête pour un SelectField."""
+    return list(_get_cache()['choices'][name])
+
+
+def get_label(name, code, default=None):
+    """Libellé correspondant à un code d'un référentiel."""
+    return _get_cache()['labels'][name].get(code, default)
@@ -0,0 +1,128 @@
+"""
+Recherche des agriculteurs et des référents (autocomplétion des formulaires).
+
+La recherche porte sur « nom prénom », en minuscules et sans accents
+(extension unaccent, via la fonction IMMUTABLE saisie.f_unaccent). Cette
+expression est indexée par un index GIN trigrammes (pg_trgm) : voir la
+migration migrations/versions/a1c3e5f7b9d2_search_trigram_indexes.py.
+
+Une personne correspond si son nom complet contient le terme, ou si le terme
+est proche d'un de ses mots (word_similarity, opérateur <%). Les résultats
+sont classés préfixe d'abord, puis par similarité, et limités.
+
+La recherche globale (/api/search) interroge la vue matérialisée
+saisie.search_index (sociétés, SIRET, agriculteurs, référents, sites et
+numéros de contrat), rafraîchie en arrière-plan après chaque écriture
+(voir matviews.py).
+"""
+from sqlalchemy import text
+
+from matviews import SEARCH_INDEX, refresh_materialized_view
+from models import db, Agriculteur, Referent
+
+# Cible -> (modèle, colonne nom, colonne prénom)
+SEARCH_TARGETS = {
+    'agriculteur': (Agriculteur, Agriculteur.nom_agri, Agriculteur.prenom_agri),
+    'referent': (Referent, Referent.nom_referent, Referent.prenom_referent),
+}
+
+
+def unaccent_lower(expression):
+    """saisie.f_unaccent(lower(expression)) : forme normalisée utilisée par les index."""
+    return db.func.saisie.f_unaccent(db.func.lower(expression), type_=db.Text)
+
+
+def search_key(nom, prenom):
+    """
+    Expression indexée « nom prénom » normalisée.
+    Elle doit rester identique à celle des index de la migration pour que PostgreSQL les utilise.
+    """
+    empty, space = db.literal_column("''"), db.literal_column("' '")
+    return unaccent_lower(db.func.coalesce(nom, empty).op('||')(space).op('||')(db.func.coalesce(prenom, empty)))
+
+
+def escape_like(term):
+    """Protège les caractères spéciaux de LIKE (échappement par « \\ »)."""
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_query(target, term, limit):
+    """Requête de recherche : personnes correspondant au terme, préfixe d'abord puis par similarité."""
+    model, nom, prenom = SEARCH_TARGETS[target]
+    key = search_key(nom, prenom)
+    normalized_term = unaccent_lower(db.literal(term, db.Text))
+    pattern = unaccent_lower(db.literal(escape_like(term), db.Text))
+
+    return (
+        db.select(model)
+        .where(db.or_(
+            key.like('%' + pattern + '%', escape='\\'),
+            normalized_term.op('<%', return_type=db.Boolean)(key)
+        ))
+        .order_by(
+            db.case((key.like(pattern + '%', escape='\\'), 0), else_=1),
+            db.func.word_similarity(normalized_term, key).desc(),
+            nom,
+            prenom
+        )
+        .limit(limit)
+    )
+
+
+def search_people(target, term, limit):
+    """Retourne au plus `limit` agriculteurs ou référents (objets ORM) correspondant au terme."""
+    return db.session.execute(search_query(target, term, limit)).scalars().all()
+
+
+# Recherche globale (/api/search) sur la vue matérialisée saisie.search_index
+SEARCH_INDEX_TYPES = ('societe', 'siret', 'agriculteur', 'referent', 'site', 'contrat')
+TRIGRAM_MIN_LENGTH = 3
+
+# Deux passes bornées par LIMIT : préfixe (B-tree), puis plus proches voisins trigrammes (GiST)
+GLOBAL_SEARCH_SQL = text("""
+    (SELECT type, ref, libelle, detail, id_contrat, nb_contrats, 0 AS passe
+     FROM saisie.search_index
+     WHERE cle LIKE saisie.f_unaccent(lower(:prefix)) || '%' ESCAPE '\\' AND type = ANY(:types)
+     ORDER BY cle, type
+     LIMIT :limit)
+    UNION ALL
+    (SELECT type, ref, libelle, detail, id_contrat, nb_contrats, 1 AS passe
+     FROM saisie.search_index
+     WHERE :trigram AND saisie.f_unaccent(lower(:term)) <% cle AND type = ANY(:types)
+     ORDER BY cle <<-> saisie.f_unaccent(lower(:term)), type
+     LIMIT :limit)
+""")
+
+
+def global_search(term, types=SEARCH_INDEX_TYPES, limit=10):
+    """
+    Recherche typée dans l'index global : préfixes d'abord, puis termes proches.
+    Retourne au plus `limit` résultats {type, id, libelle, detail, id_contrat, nb_contrats}.
+    """
+    rows = db.session.execute(GLOBAL_SEARCH_SQL, {
+        "prefix": escape_like(term),
+        "term": term,
+        "trigram": len(term) >= TRIGRAM_MIN_LENGTH,
+        "types": list(types),
+        "limit": limit,
+    }).all()
+
+    results, seen = [], set()
+    for row in sorted(rows, key=lambda row: row.passe):
+        if (row.type, row.ref) in seen:
+            continue
+        seen.add((row.type, row.ref))
+        results.append({
+            "type": row.type,
+            "id": row.ref,
+            "libelle": row.libelle,
+            "detail": row.detail,
+            "id_contrat": row.id_contrat,
+            "nb_contrats": row.nb_contrats,
+        })
+    return results[:limit]
+
+
+def refresh_search_index():
+    """Recalcule l'index global sans bloquer les lectures (REFRESH ... CONCURRENTLY)."""
+    refresh_materialized_view(SEARCH_INDEX)
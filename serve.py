@@ -0,0 +1,38 @@
+"""
+Serveur de production waitress (un processus, plusieurs threads), pour les
+hôtes sans gunicorn (Windows). Le préchauffage des caches se fait en
+arrière-plan par défaut : le serveur écoute aussitôt et /ready répond 503
+jusqu'à la fin du préchauffage.
+
+Usage :
+    python serve.py --threads 8
+"""
+import argparse
+import os
+
+from waitress import serve
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--listen', default=os.environ.get("WAITRESS_LISTEN", "0.0.0.0:8000"))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get("WAITRESS_THREADS", 8)))
+    parser.add_argument('--connection-limit', type=int, default=int(os.environ.get("WAITRESS_CONNECTION_LIMIT", 100)))
+    parser.add_argument('--channel-timeout', type=int, default=int(os.environ.get("WAITRESS_CHANNEL_TIMEOUT", 60)),
+                        help="Délai d'inactivité d'une connexion keep-alive (s)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("WARMUP", "background")
+    from wsgi import create_app
+
+    serve(
+        create_app(),
+        listen=args.listen,
+        threads=args.threads,
+        connection_limit=args.connection_limit,
+        channel_timeout=args.channel_timeout,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Stockage des sessions utilisateur, choisi par SESSION_TYPE :
+
+- "filesystem" (par défaut) : Flask-Session, un fichier par session ;
+- "postgresql" : table saisie.flask_session de la base principale (migration
+  e5a7c9d1f3b6), partagée par tous les workers et toutes les machines. Le
+  cookie ne contient qu'un identifiant aléatoire ; les données sont
+  sérialisées en JSON (sérialiseur des sessions Flask). Une ligne n'est écrite
+  que si la session a changé, ou pour repousser son expiration au plus une
+  fois par SESSION_TOUCH_INTERVAL secondes. Les sessions expirées sont purgées
+  par le worker toutes les SESSION_PURGE_INTERVAL secondes (index sur expiry)
+  ou par "flask purge-sessions". Si la table manque (migration non
+  appliquée), la première requête et le préchauffage (/ready) échouent avec
+  un message explicite ;
+- "cookie" : session signée dans le cookie (interface par défaut de Flask),
+  sans aucun stockage serveur. Réservée aux petites sessions : le cache de
+  jetons MSAL n'y est pas conservé. Exige une SECRET_KEY fixe.
+"""
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import flask_session
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from sqlalchemy import text
+from werkzeug.datastructures import CallbackDict
+
+from models import db
+
+SESSION_TYPES = ('filesystem', 'postgresql', 'cookie')
+
+SESSION_TABLE_EXISTS_SQL = text("SELECT to_regclass('saisie.flask_session') IS NOT NULL")
+
+SELECT_SESSION_SQL = text(
+    "SELECT data, expiry FROM saisie.flask_session WHERE session_id = :sid AND expiry > now()"
+)
+UPSERT_SESSION_SQL = text(
+    "INSERT INTO saisie.flask_session (session_id, data, expiry) VALUES (:sid, :data, :expiry) "
+    "ON CONFLICT (session_id) DO UPDATE SET data = excluded.data, expiry = excluded.expiry"
+)
+DELETE_SESSION_SQL = text("DELETE FROM saisie.flask_session WHERE session_id = :sid")
+PURGE_SESSIONS_SQL = text("DELETE FROM saisie.flask_session WHERE expiry <= now()")
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dont les données sont stockées côté serveur, identifiée par `sid`."""
+
+    def __init__(self, initial=None, sid=None, expiry=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.expiry = expiry
+        self.new = new
+        self.modified = False
+
+
+class PostgresSessionInterface(SessionInterface):
+    """Sessions stockées dans saisie.flask_session, lues et écrites hors de db.session."""
+
+    serializer = session_json_serializer
+
+    def __init__(self, touch_interval=300, purge_interval=3600):
+        self.touch_interval = timedelta(seconds=touch_interval)
+        self.purge_interval = purge_interval
+        self._purge_lock = threading.Lock()
+        self._last_purge = time.monotonic()
+        self._table_checked = False
+
+    def open_session(self, app, request):
+        if not self._table_checked:
+            check_session_table()
+            self._table_checked = True
+
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            with db.engine.connect() as connection:
+                row = connection.execute(SELECT_SESSION_SQL, {"sid": sid}).first()
+            if row is not None:
+                try:
+                    return ServerSession(self.serializer.loads(row.data), sid, row.expiry)
+                except ValueError:
+                    pass
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def _purge_due(self):
+        with self._purge_lock:
+            if time.monotonic() - self._last_purge < self.purge_interval:
+                return False
+            self._last_purge = time.monotonic()
+            return True
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        # Session vidée (déconnexion) : suppression de la ligne et du cookie
+        if not session:
+            if session.modified and not session.new:
+                with db.engine.begin() as connection:
+                    connection.execute(DELETE_SESSION_SQL, {"sid": session.sid})
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        # Les sessions non permanentes expirent côté serveur après la même durée
+        expiry = datetime.now(timezone.utc) + app.permanent_session_lifetime
+        touch = session.expiry is None or expiry - session.expiry >= self.touch_interval
+        if not (session.modified or touch):
+            return
+
+        with db.engine.begin() as connection:
+            connection.execute(UPSERT_SESSION_SQL, {
+                "sid": session.sid,
+                "data": self.serializer.dumps(dict(session)),
+                "expiry": expiry,
+            })
+            if self._purge_due():
+                connection.execute(PURGE_SESSIONS_SQL)
+
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+def check_session_table():
+    """Vérifie que la table saisie.flask_session existe (lève RuntimeError sinon) ; retourne 1."""
+    with db.engine.connect() as connection:
+        exists = connection.execute(SESSION_TABLE_EXISTS_SQL).scalar()
+    if not exists:
+        raise RuntimeError(
+            "SESSION_TYPE=postgresql : la table saisie.flask_session n'existe pas. Appliquez les migrations "
+            "(flask --app application db upgrade) ou choisissez SESSION_TYPE=filesystem."
+        )
+    return 1
+
+
+def purge_expired_sessions():
+    """Supprime les sessions expirées de saisie.flask_session ; retourne leur nombre."""
+    with db.engine.begin() as connection:
+        return connection.execute(PURGE_SESSIONS_SQL).rowcount
+
+
+def stores_tokens(app):
+    """Indique si la session peut contenir le cache de jetons MSAL (trop volumineux pour un cookie)."""
+    return app.config['SESSION_TYPE'] != 'cookie'
+
+
+def init_sessions(app):
+    """Installe le stockage des sessions choisi par SESSION_TYPE."""
+    session_type = app.config['SESSION_TYPE']
+    if session_type not in SESSION_TYPES:
+        raise ValueError(f"SESSION_TYPE doit valoir {', '.join(SESSION_TYPES)} (reçu : {session_type}).")
+
+    if session_type == 'postgresql':
+        app.session_interface = PostgresSessionInterface(
+            touch_interval=app.config['SESSION_TOUCH_INTERVAL'],
+            purge_interval=app.config['SESSION_PURGE_INTERVAL'],
+        )
+    elif session_type == 'cookie':
+        if not app.config.get('SECRET_KEY'):
+            raise RuntimeError("SESSION_TYPE=cookie exige une clé SECRET_KEY fixe (variable d'environnement).")
+    else:
+        flask_session.Session(app)
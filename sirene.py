@@ -0,0 +1,272 @@
+"""
+Client de l'API SIRENE de l'INSEE.
+
+- une session HTTP réutilisée (pool de connexions), avec délais d'attente ;
+- un limiteur à jetons qui respecte le quota INSEE (SIRENE_RATE_LIMIT requêtes par minute) ;
+- de nouvelles tentatives à intervalle croissant (429 / 5xx, erreurs réseau, en-tête
+  Retry-After respecté), chacune prenant un jeton du limiteur ;
+- un cache persistant des résultats normalisés, avec durée de vie.
+
+Le limiteur et le cache sont stockés dans un fichier SQLite (SIRENE_CACHE_PATH) :
+ils sont donc partagés par tous les workers d'une même machine. L'URL de l'API
+est configurable (SIRENE_API_URL) pour travailler contre un serveur bouchon
+(voir tools/sirene_stub.py).
+"""
+import json
+import random
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+
+# Codes HTTP donnant lieu à une nouvelle tentative
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _connect(path):
+    """Ouvre une connexion SQLite en mode autocommit (transactions gérées explicitement)."""
+    connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    return connection
+
+
+class TokenBucket:
+    """
+    Limiteur à jetons partagé entre processus : l'état du seau est stocké dans SQLite
+    et mis à jour dans une transaction exclusive (BEGIN IMMEDIATE).
+    """
+
+    def __init__(self, path, rate_per_minute, capacity=None, name='insee'):
+        self.path = path
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.name = name
+        with closing(_connect(self.path)) as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit (name TEXT PRIMARY KEY, tokens REAL, updated_at REAL)"
+            )
+
+    def _take(self):
+        """Prend un jeton si possible ; retourne le temps d'attente nécessaire (0 si un jeton a été pris)."""
+        connection = _connect(self.path)
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            row = connection.execute(
+                "SELECT tokens, updated_at FROM rate_limit WHERE name = ?", (self.name,)
+            ).fetchone()
+            tokens = self.capacity if row is None else min(self.capacity, row[0] + (now - row[1]) * self.rate)
+
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+
+            connection.execute(
+                "INSERT OR REPLACE INTO rate_limit (name, tokens, updated_at) VALUES (?, ?, ?)",
+                (self.name, tokens, now)
+            )
+            connection.execute("COMMIT")
+            return wait
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def acquire(self, max_wait):
+        """Attend un jeton au plus max_wait secondes ; retourne False si le quota est épuisé trop longtemps."""
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self._take()
+            if wait == 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class SireneCache:
+    """Cache persistant (SQLite) des réponses normalisées de l'API SIRENE, indexé par SIRET."""
+
+    def __init__(self, path):
+        self.path = path
+        with closing(_connect(self.path)) as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sirene_cache ("
+                "siret TEXT PRIMARY KEY, payload TEXT NOT NULL, status INTEGER NOT NULL, expires_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_sirene_cache_expires ON sirene_cache (expires_at)")
+
+    def get(self, siret):
+        """Retourne (résultat, code HTTP) si le SIRET est en cache et non expiré, sinon None."""
+        with closing(_connect(self.path)) as connection:
+            row = connection.execute(
+                "SELECT payload, status FROM sirene_cache WHERE siret = ? AND expires_at > ?",
+                (siret, time.time())
+            ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def set(self, siret, result, status, ttl):
+        with closing(_connect(self.path)) as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO sirene_cache (siret, payload, status, expires_at) VALUES (?, ?, ?, ?)",
+                (siret, json.dumps(result), status, time.time() + ttl)
+            )
+
+    def purge_expired(self):
+        """Supprime les entrées expirées ; retourne leur nombre."""
+        with closing(_connect(self.path)) as connection:
+            return connection.execute("DELETE FROM sirene_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+
+
+def normalize_etablissement(etablissement):
+    """Extrait de la réponse SIRENE les champs utilisés par le formulaire."""
+    adresse = etablissement.get("adresseEtablissement", {})
+    return {
+        "siren": etablissement.get("siren", "Non renseigné"),
+        "denomination": etablissement.get("uniteLegale", {}).get("denominationUniteLegale", "Non renseigné"),
+        "activite_principale": etablissement.get("uniteLegale", {}).get("activitePrincipaleUniteLegale", "Non renseigné"),
+        "categorie_juridique": etablissement.get("uniteLegale", {}).get("categorieJuridiqueUniteLegale", "Non renseigné"),
+        "tranche_effectif": etablissement.get("trancheEffectifsEtablissement", "Non renseigné"),
+        "adresse_etablissement": ", ".join(filter(
+            None, [
+                adresse.get('numeroVoieEtablissement', ''),
+                adresse.get('typeVoieEtablissement', ''),
+                adresse.get('libelleVoieEtablissement', ''),
+                adresse.get('codePostalEtablissement', ''),
+                adresse.get('libelleCommuneEtablissement', '')
+            ]))
+    }
+
+
+class SireneClient:
+    """
+    Client HTTP de l'API SIRENE avec pool de connexions, limiteur et cache.
+
+    Chaque tentative (la première comme les suivantes) prend un jeton du limiteur : les
+    nouvelles tentatives restent dans le quota partagé. Les attentes (jetons, Retry-After,
+    intervalle croissant) sont bornées à max_wait secondes au total ; un appel dure donc au
+    plus max_wait + (retries + 1) × délai de lecture.
+    """
+
+    def __init__(self, base_url, api_key, cache, limiter, timeout=(3.05, 10), retries=3, backoff=0.5,
+                 cache_ttl=86400, not_found_ttl=3600, max_wait=10):
+        self.base_url = base_url.rstrip('/')
+        self.cache = cache
+        self.limiter = limiter
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.cache_ttl = cache_ttl
+        self.not_found_ttl = not_found_ttl
+        self.max_wait = max_wait
+
+        # Pas de nouvelles tentatives dans l'adaptateur : elles contourneraient le limiteur
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(max_retries=0, pool_maxsize=10))
+        self.session.mount('https://', HTTPAdapter(max_retries=0, pool_maxsize=10))
+        self.session.headers.update({
+            "accept": "application/json",
+            "X-INSEE-Api-Key-Integration": api_key or "",
+        })
+
+    def _retry_delay(self, attempt, response=None):
+        """Attente avant la tentative suivante : en-tête Retry-After s'il est donné, sinon backoff * 2^n (avec gigue)."""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return float(retry_after)
+        return self.backoff * (2 ** attempt) * random.uniform(0.5, 1)
+
+    def _get(self, url):
+        """
+        GET avec nouvelles tentatives, un jeton du limiteur par tentative.
+        Retourne la réponse, ou None si le quota ne permet pas d'essayer dans le délai max_wait.
+        """
+        deadline = time.monotonic() + self.max_wait
+        attempt = 0
+        while True:
+            if not self.limiter.acquire(max(0.0, deadline - time.monotonic())):
+                return None
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                response = None
+                if attempt >= self.retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    return response
+
+            delay = self._retry_delay(attempt, response)
+            if time.monotonic() + delay > deadline:
+                if response is None:
+                    raise requests.ConnectionError(f"API SIRENE injoignable : {url}")
+                return response
+            time.sleep(delay)
+            attempt += 1
+
+    def lookup(self, siret, use_cache=True):
+        """
+        Recherche un établissement par SIRET.
+        Retourne (résultat normalisé, 200) ou ({"error": ...}, code HTTP).
+        Les erreurs réseau (requests.RequestException) sont propagées à l'appelant.
+        """
+        if use_cache:
+            cached = self.cache.get(siret)
+            if cached is not None:
+                return cached
+
+        response = self._get(f"{self.base_url}/siret/{siret}")
+        if response is None:
+            return {"error": "Quota de l'API SIRENE atteint, veuillez réessayer dans quelques instants."}, 429
+
+        if response.status_code == 200:
+            etablissement = response.json().get("etablissement")
+            if etablissement:
+                result = normalize_etablissement(etablissement)
+                self.cache.set(siret, result, 200, self.cache_ttl)
+                return result, 200
+
+        if response.status_code in (200, 404):
+            result = {"error": "Aucun établissement trouvé."}
+            self.cache.set(siret, result, 404, self.not_found_ttl)
+            return result, 404
+
+        return {"error": f"Erreur API : {response.status_code}, {response.text}"}, response.status_code
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_sirene_client():
+    """
+    Retourne le client SIRENE du processus, créé au premier appel à partir de la configuration.
+    Chaque worker crée le sien (la session HTTP n'est pas partagée entre processus).
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                config = current_app.config
+                path = config['SIRENE_CACHE_PATH']
+                _client = SireneClient(
+                    base_url=config['SIRENE_API_URL'],
+                    api_key=config['SIRENE_API_KEY'],
+                    cache=SireneCache(path),
+                    limiter=TokenBucket(path, config['SIRENE_RATE_LIMIT']),
+                    timeout=(config['SIRENE_CONNECT_TIMEOUT'], config['SIRENE_READ_TIMEOUT']),
+                    retries=config['SIRENE_RETRIES'],
+                    backoff=config['SIRENE_BACKOFF'],
+                    cache_ttl=config['SIRENE_CACHE_TTL'],
+                    not_found_ttl=config['SIRENE_NOT_FOUND_TTL'],
+                    max_wait=config['SIRENE_RATE_LIMIT_MAX_WAIT'],
+                )
+    return _client
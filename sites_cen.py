@@ -0,0 +1,359 @@
+"""
+Services de lecture des sites CEN (vue saisie.site_geojson de la base FoncierCEN).
+
+La FeatureCollection de tous les sites est sérialisée une seule fois puis
+conservée en cache tant que la vue n'a pas changé. Le changement est détecté
+par une empreinte peu coûteuse (nombre de lignes + idsite maximal).
+
+Selon SITES_GEOJSON_BUILDER, le GeoJSON est produit directement par PostGIS
+("postgis" : ST_AsGeoJSON / json_build_object, texte recopié tel quel dans la
+réponse) ou en Python ("shapely" : to_shape + mapping, bibliothèques importées
+au premier usage seulement).
+
+Les géométries peuvent être simplifiées par niveau de zoom (?zoom= ou
+?tolerance=) : chaque niveau a sa propre entrée de cache. Une emprise
+(?bbox=) restreint la réponse aux sites visibles grâce à l'index GiST
+idx_site_geom ; ces réponses ne sont pas mises en cache.
+
+La page de modification d'un contrat lit le site par son code
+(get_site_geojson_by_code), depuis un cache LRU propre à chaque worker.
+"""
+import hashlib
+import json
+import math
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from flask import current_app, request, stream_with_context
+
+from cache import cache
+from models import db, VueSites
+
+SITES_VERSION_KEY = 'sites_cen:version'
+SITES_GEOJSON_KEY = 'sites_cen:geojson:{version}:{level}'
+SITE_GEOJSON_KEY = 'sites_cen:site:{version}:{site_id}:{level}'
+EMPTY_FEATURE_COLLECTION = b'{"type":"FeatureCollection","features":[]}'
+EMPTY_FEATURE_COLLECTION_DICT = {"type": "FeatureCollection", "features": []}
+# Nombre de sites (par code) conservés par worker pour la page de modification d'un contrat
+SITE_BY_CODE_CACHE_SIZE = 512
+
+
+def get_sites_version():
+    """
+    Retourne l'empreinte courante de la vue des sites.
+    Elle n'est recalculée qu'une fois par SITES_VERSION_CHECK_INTERVAL secondes.
+    """
+    version = cache.get(SITES_VERSION_KEY)
+    if version is None:
+        count, max_id = db.session.query(
+            db.func.count(VueSites.idsite),
+            db.func.max(VueSites.idsite)
+        ).one()
+        version = f"{count}-{max_id or 0}"
+        cache.set(SITES_VERSION_KEY, version, timeout=current_app.config['SITES_VERSION_CHECK_INTERVAL'])
+    return version
+
+
+def invalidate_sites_cache():
+    """Force le recalcul de l'empreinte (et donc de la FeatureCollection) au prochain appel."""
+    cache.delete(SITES_VERSION_KEY)
+
+
+def zoom_tolerance(zoom):
+    """Tolérance de simplification (en degrés) correspondant à environ un pixel au zoom donné."""
+    return 360.0 / (256 * 2 ** zoom)
+
+
+def zoom_precision(zoom):
+    """Nombre de décimales conservées au zoom donné (arrondi inférieur à la tolérance)."""
+    return max(0, math.ceil(-math.log10(zoom_tolerance(zoom))))
+
+
+def get_simplification_level(args):
+    """
+    Détermine le niveau de simplification demandé par ?zoom= ou ?tolerance=.
+    Une tolérance est ramenée au niveau de zoom le plus proche pour borner le nombre d'entrées de cache.
+    Retourne None pour la pleine résolution ; lève ValueError si le paramètre est invalide.
+    """
+    if args.get('zoom'):
+        zoom = int(args['zoom'])
+        if zoom < 0:
+            raise ValueError("Le paramètre zoom doit être positif.")
+    elif args.get('tolerance'):
+        tolerance = float(args['tolerance'])
+        if tolerance <= 0:
+            return None
+        # Plus petit zoom dont la tolérance ne dépasse pas celle demandée
+        zoom = max(0, math.ceil(math.log2(360.0 / (256 * tolerance))))
+    else:
+        return None
+
+    if zoom >= current_app.config['SITES_SIMPLIFY_MAX_ZOOM']:
+        return None
+    return zoom
+
+
+def parse_bbox(value):
+    """Convertit 'minx,miny,maxx,maxy' en tuple de floats ; lève ValueError si l'emprise est invalide."""
+    bbox = tuple(float(part) for part in value.split(','))
+    if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+        raise ValueError("L'emprise doit être de la forme minx,miny,maxx,maxy.")
+    return bbox
+
+
+def bbox_filter(bbox):
+    """
+    Filtre spatial sur l'emprise : && (index GiST) puis ST_Intersects pour le test exact.
+    """
+    envelope = db.func.ST_MakeEnvelope(*bbox, current_app.config['SITES_SRID'])
+    return db.and_(
+        VueSites.geom.intersects(envelope),
+        db.func.ST_Intersects(VueSites.geom, envelope)
+    )
+
+
+def serialize_geojson(data):
+    """Encode un objet GeoJSON en JSON compact (bytes UTF-8)."""
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def shapely_geometry(geom, level=None):
+    """Convertit une géométrie PostGIS en GeoJSON (dict), simplifiée et arrondie si un niveau est donné."""
+    # Importés au premier usage : inutiles avec SITES_GEOJSON_BUILDER=postgis (par défaut)
+    import numpy as np
+    import shapely
+    from geoalchemy2.shape import to_shape
+    from shapely.geometry import mapping
+
+    shape = to_shape(geom)
+    if level is not None:
+        decimals = zoom_precision(level)
+        shape = shape.simplify(zoom_tolerance(level), preserve_topology=True)
+        shape = shapely.transform(shape, lambda coords: np.round(coords, decimals))
+    return mapping(shape)
+
+
+def build_sites_feature_collection(level=None, bbox=None):
+    """Construit la FeatureCollection de TOUS les sites CEN (ou de ceux de l'emprise)."""
+    query = VueSites.query
+    if bbox is not None:
+        query = query.filter(bbox_filter(bbox))
+
+    features = []
+    for site in query.all():
+        # Convertir la géométrie PostGIS en GeoJSON
+        features.append({
+            "type": "Feature",
+            "geometry": shapely_geometry(site.geom, level),
+            "properties": {
+                "idsite": site.idsite,
+                "codesite": site.codesite,
+                "nom_site": site.nom_site
+            }
+        })
+
+    return {"type": "FeatureCollection", "features": features}
+
+
+def geojson_geometry_sql(level=None):
+    """Expression ST_AsGeoJSON de la géométrie, simplifiée (topologie préservée) et arrondie si besoin."""
+    if level is None:
+        return db.func.ST_AsGeoJSON(VueSites.geom)
+    return db.func.ST_AsGeoJSON(
+        db.func.ST_SimplifyPreserveTopology(VueSites.geom, zoom_tolerance(level)),
+        zoom_precision(level)
+    )
+
+
+def feature_json_query(*properties, level=None):
+    """
+    Requête renvoyant, pour chaque site, sa Feature GeoJSON déjà sérialisée par PostGIS.
+    Le résultat est converti en texte pour éviter le décodage JSON par psycopg2.
+    """
+    property_pairs = []
+    for column in properties:
+        property_pairs.extend([column.key, column])
+
+    feature = db.func.json_build_object(
+        'type', 'Feature',
+        'geometry', db.cast(geojson_geometry_sql(level), db.JSON),
+        'properties', db.func.json_build_object(*property_pairs)
+    )
+    return db.select(db.cast(feature, db.Text)).order_by(VueSites.idsite)
+
+
+def iter_feature_collection(query, yield_per=500):
+    """
+    Génère une FeatureCollection par morceaux à partir d'une requête feature_json_query.
+    Les lignes sont lues avec un curseur serveur : la mémoire reste de l'ordre d'un lot.
+    """
+    yield b'{"type":"FeatureCollection","features":['
+    separator = b''
+    for feature in db.session.execute(query.execution_options(yield_per=yield_per)).scalars():
+        yield separator + feature.encode('utf-8')
+        separator = b','
+    yield b']}'
+
+
+def iter_sites_geojson(level=None, bbox=None):
+    """Génère la FeatureCollection de TOUS les sites CEN (ou de ceux de l'emprise), construite par PostGIS."""
+    query = feature_json_query(VueSites.idsite, VueSites.codesite, VueSites.nom_site, level=level)
+    if bbox is not None:
+        query = query.where(bbox_filter(bbox))
+    return iter_feature_collection(query)
+
+
+def build_site_geojson(condition, level=None):
+    """
+    Sérialise la FeatureCollection (bytes) du premier site vérifiant la condition, ou retourne None.
+    """
+    if current_app.config['SITES_GEOJSON_BUILDER'] == 'shapely':
+        site = VueSites.query.filter(condition).order_by(VueSites.idsite).first()
+        if not site:
+            return None
+        return serialize_geojson({
+            "type": "FeatureCollection",
+            "features": [{
+                "type": "Feature",
+                "geometry": shapely_geometry(site.geom, level),
+                "properties": {
+                    "codesite": site.codesite,
+                    "nom_site": site.nom_site
+                }
+            }]
+        })
+
+    query = feature_json_query(VueSites.codesite, VueSites.nom_site, level=level).where(condition).limit(1)
+    feature = db.session.execute(query).scalar()
+    if feature is None:
+        return None
+    return b'{"type":"FeatureCollection","features":[' + feature.encode('utf-8') + b']}'
+
+
+def build_single_site_geojson(site_id, level=None):
+    """Sérialise la FeatureCollection (bytes) d'un seul site, ou retourne None s'il n'existe pas."""
+    return build_site_geojson(VueSites.idsite == site_id, level)
+
+
+@lru_cache(maxsize=SITE_BY_CODE_CACHE_SIZE)
+def _site_geojson_by_code(version, code_site):
+    payload = build_site_geojson(VueSites.codesite == code_site)
+    return json.loads(payload) if payload is not None else None
+
+
+def get_site_geojson_by_code(code_site):
+    """
+    FeatureCollection (dict) du site de code `code_site`, pleine résolution, vide si le site est inconnu.
+    Les résultats sont conservés par le worker dans un cache LRU indexé par l'empreinte de la vue
+    et le code du site : une nouvelle version de la vue rend les anciennes entrées inutilisées.
+    Le dict renvoyé est partagé et ne doit pas être modifié.
+    """
+    if not code_site:
+        return EMPTY_FEATURE_COLLECTION_DICT
+    return _site_geojson_by_code(get_sites_version(), code_site) or EMPTY_FEATURE_COLLECTION_DICT
+
+
+def build_sites_geojson_payload(level=None):
+    """Sérialise la FeatureCollection complète avec le constructeur configuré."""
+    if current_app.config['SITES_GEOJSON_BUILDER'] == 'shapely':
+        return serialize_geojson(build_sites_feature_collection(level))
+    return b''.join(iter_sites_geojson(level))
+
+
+def make_cache_entry(payload):
+    """Associe au contenu sérialisé son ETag et sa date de génération."""
+    return {
+        'payload': payload,
+        'etag': hashlib.sha1(payload).hexdigest(),
+        'last_modified': datetime.now(timezone.utc).replace(microsecond=0)
+    }
+
+
+def get_sites_geojson_entry(level=None):
+    """Retourne l'entrée de cache de la FeatureCollection complète, en la construisant si besoin."""
+    key = SITES_GEOJSON_KEY.format(version=get_sites_version(), level=level)
+    entry = cache.get(key)
+    if entry is None:
+        entry = make_cache_entry(build_sites_geojson_payload(level))
+        cache.set(key, entry, timeout=current_app.config['SITES_GEOJSON_CACHE_TIMEOUT'])
+    return entry
+
+
+def get_single_site_geojson_entry(site_id, level=None):
+    """Retourne l'entrée de cache d'un seul site, ou None s'il n'existe pas."""
+    key = SITE_GEOJSON_KEY.format(version=get_sites_version(), site_id=site_id, level=level)
+    entry = cache.get(key)
+    if entry is None:
+        payload = build_single_site_geojson(site_id, level)
+        if payload is None:
+            return None
+        entry = make_cache_entry(payload)
+        cache.set(key, entry, timeout=current_app.config['SITES_GEOJSON_CACHE_TIMEOUT'])
+    return entry
+
+
+def warm_levels(all_levels=False):
+    """
+    Niveaux de simplification à préchauffer : ceux de SITES_WARM_ZOOMS (zooms séparés par des virgules,
+    « full » pour la pleine résolution demandée par la carte), ou tous si `all_levels`.
+    """
+    max_zoom = current_app.config['SITES_SIMPLIFY_MAX_ZOOM']
+    if all_levels:
+        return list(range(max_zoom)) + [None]
+
+    levels = []
+    for value in current_app.config['SITES_WARM_ZOOMS'].split(','):
+        value = value.strip()
+        if not value:
+            continue
+        level = None if value == 'full' or int(value) >= max_zoom else int(value)
+        if level not in levels:
+            levels.append(level)
+    return levels
+
+
+def warm_sites_cache(all_levels=False):
+    """Précalcule la FeatureCollection complète pour les niveaux de warm_levels() ; retourne ces niveaux."""
+    levels = warm_levels(all_levels)
+    for level in levels:
+        get_sites_geojson_entry(level)
+    return levels
+
+
+def make_geojson_response(entry):
+    """
+    Construit la réponse HTTP à partir d'une entrée de cache.
+    Le navigateur revalide à chaque chargement et reçoit un 304 si rien n'a changé.
+    """
+    response = current_app.response_class(entry['payload'], mimetype='application/json')
+    response.set_etag(entry['etag'])
+    response.last_modified = entry['last_modified']
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def sites_geojson_response(level=None):
+    """
+    Réponse de /sites_cen_geojson : depuis le cache, ou diffusée directement
+    depuis PostGIS lorsque le cache est désactivé (CACHE_TYPE = "NullCache").
+    """
+    config = current_app.config
+    if config['CACHE_TYPE'] == 'NullCache' and config['SITES_GEOJSON_BUILDER'] == 'postgis':
+        return current_app.response_class(
+            stream_with_context(iter_sites_geojson(level)),
+            mimetype='application/json'
+        )
+    return make_geojson_response(get_sites_geojson_entry(level))
+
+
+def sites_bbox_response(bbox, level=None):
+    """Réponse de /sites_cen_geojson?bbox= : sites intersectant l'emprise, sans mise en cache."""
+    if current_app.config['SITES_GEOJSON_BUILDER'] == 'shapely':
+        return current_app.response_class(
+            serialize_geojson(build_sites_feature_collection(level, bbox)),
+            mimetype='application/json'
+        )
+    return current_app.response_class(
+        stream_with_context(iter_sites_geojson(level, bbox)),
+        mimetype='application/json'
+    )
@@ -0,0 +1,162 @@
+"""
+Compteur des requêtes SQL de chaque requête HTTP, par base (principale et
+secondary), à partir des événements du moteur SQLAlchemy.
+
+Pour chaque requête HTTP sont relevés, par base, le nombre de requêtes SQL,
+leur durée totale et les SQL_STATS_TOP requêtes les plus lentes. Ils sont :
+
+- écrits en une ligne JSON sur le logger enfant « sql » de app.logger à la
+  fin de la réponse (réponses diffusées comprises) si SQL_STATS_LOG est activé ;
+- renvoyés en mode debug dans les en-têtes X-SQL-Queries, X-SQL-Time et
+  Server-Timing (affiché par les outils de développement du navigateur).
+
+Une requête SQL qui dépasse SQL_SLOW_QUERY_MS millisecondes est journalisée
+avec son plan (EXPLAIN, sans ANALYZE : la requête n'est pas rejouée).
+"""
+import json
+import logging
+import time
+
+from flask import current_app, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from models import db
+
+# Statistiques de la requête HTTP, rangées dans l'environnement WSGI : elles restent
+# accessibles pendant la diffusion d'une réponse (stream_with_context)
+ENVIRON_KEY = 'agricen.sql_stats'
+EXPLAINABLE = ('select', 'with', 'insert', 'update', 'delete')
+STATEMENT_MAX_LENGTH = 500
+
+
+def _bind_name(engine):
+    """Nom de la base d'un moteur : « principale » ou la clé du bind."""
+    names = current_app.extensions['sql_stats']['binds']
+    if engine not in names:
+        names.update({bind_engine: bind or 'principale' for bind, bind_engine in db.engines.items()})
+    return names.get(engine, str(engine.url.database))
+
+
+def _explain(conn, cursor, statement, parameters):
+    """Plan d'exécution d'une requête, lu sur la connexion DBAPI (hors événements SQLAlchemy)."""
+    if not statement.lstrip().lower().startswith(EXPLAINABLE):
+        return None
+    explain_cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        # Point de sauvegarde : un EXPLAIN en échec ne doit pas interrompre la transaction de la requête
+        explain_cursor.execute("SAVEPOINT sql_stats_explain")
+        try:
+            explain_cursor.execute(f"EXPLAIN {statement}", parameters)
+            plan = "\n".join(row[0] for row in explain_cursor.fetchall())
+        except Exception:
+            explain_cursor.execute("ROLLBACK TO SAVEPOINT sql_stats_explain")
+            raise
+        explain_cursor.execute("RELEASE SAVEPOINT sql_stats_explain")
+        return plan
+    finally:
+        explain_cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('sql_stats_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['sql_stats_start'].pop()
+    # Hors requête HTTP (CLI, threads d'arrière-plan) ou application sans compteur : rien à relever
+    if not has_request_context() or 'sql_stats' not in current_app.extensions:
+        return
+    stats = request.environ.get(ENVIRON_KEY)
+    slow_ms = current_app.config['SQL_SLOW_QUERY_MS']
+
+    if stats is not None:
+        bind = stats['bases'].setdefault(_bind_name(conn.engine), {'requetes': 0, 'duree': 0.0})
+        bind['requetes'] += 1
+        bind['duree'] += duration
+        stats['lentes'].append((duration, statement))
+        stats['lentes'].sort(key=lambda item: item[0], reverse=True)
+        del stats['lentes'][current_app.config['SQL_STATS_TOP']:]
+
+    if slow_ms and duration * 1000 >= slow_ms and not executemany:
+        try:
+            plan = _explain(conn, cursor, statement, parameters)
+        except Exception as e:
+            plan = f"EXPLAIN impossible : {e}"
+        current_app.extensions['sql_stats']['logger'].warning(
+            "Requête SQL lente (%.0f ms, %s) : %s\n%s",
+            duration * 1000, request.path, statement[:STATEMENT_MAX_LENGTH], plan or "(pas de plan)"
+        )
+
+
+def _handle_error(exception_context):
+    # Requête SQL en échec : after_cursor_execute ne sera pas appelé
+    conn = exception_context.connection
+    if exception_context.cursor is not None and conn is not None and conn.info.get('sql_stats_start'):
+        conn.info['sql_stats_start'].pop()
+
+
+def _summary(stats, response, elapsed):
+    return {
+        "methode": stats['methode'],
+        "chemin": stats['chemin'],
+        "endpoint": stats['endpoint'],
+        "statut": response.status_code,
+        "duree_ms": round(elapsed * 1000, 1),
+        "bases": {
+            name: {"requetes": bind['requetes'], "duree_ms": round(bind['duree'] * 1000, 1)}
+            for name, bind in stats['bases'].items()
+        },
+        "lentes": [
+            {"duree_ms": round(duration * 1000, 1), "sql": " ".join(statement.split())[:STATEMENT_MAX_LENGTH]}
+            for duration, statement in stats['lentes']
+        ],
+    }
+
+
+def init_sql_stats(app):
+    """Active le compteur de requêtes SQL de chaque requête HTTP."""
+    # Logger enfant de app.logger : mêmes gestionnaires, niveau INFO pour la ligne de synthèse
+    logger = app.logger.getChild('sql')
+    if logger.level == logging.NOTSET:
+        logger.setLevel(logging.INFO)
+    app.extensions['sql_stats'] = {'binds': {}, 'logger': logger}
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+    @app.before_request
+    def start_sql_stats():
+        request.environ[ENVIRON_KEY] = {
+            'methode': request.method,
+            'chemin': request.path,
+            'endpoint': request.endpoint,
+            'debut': time.perf_counter(),
+            'bases': {},
+            'lentes': [],
+        }
+
+    @app.after_request
+    def report_sql_stats(response):
+        stats = request.environ.get(ENVIRON_KEY)
+        if stats is None:
+            return response
+
+        if app.debug and stats['bases']:
+            bases = stats['bases'].items()
+            response.headers['X-SQL-Queries'] = ", ".join(f"{name}={bind['requetes']}" for name, bind in bases)
+            response.headers['X-SQL-Time'] = ", ".join(f"{name}={bind['duree'] * 1000:.1f}ms" for name, bind in bases)
+            response.headers['Server-Timing'] = ", ".join(
+                f'db-{name};dur={bind["duree"] * 1000:.1f};desc="{bind["requetes"]} SQL"' for name, bind in bases
+            )
+
+        if app.config['SQL_STATS_LOG']:
+            # Journalisé à la fermeture de la réponse : les requêtes d'une réponse diffusée sont comptées
+            response.call_on_close(
+                lambda: logger.info(json.dumps(
+                    _summary(stats, response, time.perf_counter() - stats['debut']), ensure_ascii=False
+                ))
+            )
+        return response
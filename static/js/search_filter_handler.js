@@ -3,12 +3,7 @@
  * Contient les fonctionnalités liées à la recherche et au filtrage des marqueurs
  */
 
-// Tableau global pour stocker les valeurs uniques pour l'autocomplétion
-let proprietors = [];
-let societes = [];
-let referents = [];
-
-// Utiliser la variable globale allMarkers déjà définie dans map.html
+// Utiliser la variable globale allMarkers déjà définie dans map.html (marqueurs des contrats chargés)
 
 
 /**
@@ -18,33 +13,33 @@ let referents = [];
 function initSearchHandler(markers) {
     // Stocker les marqueurs dans la variable globale
     allMarkers = markers;
-    
-    // Générer les listes dynamiques après l'ajout des marqueurs
-    proprietors = getUniqueValues(markers, "agriculteur");
-    societes = getUniqueValues(markers, "nom_societe");
-    referents = getUniqueValues(markers, "referent");
 
-    // Initialiser l'autocomplétion
+    // Initialiser l'autocomplétion (suggestions fournies par /api/search)
     initAutocomplete();
+
+    // Comptes des listes calculés par le serveur, mis à jour à chaque modification d'un filtre
+    const searchModal = document.getElementById('searchModal');
+    if (searchModal) {
+        searchModal.addEventListener('change', refreshFacetCounts);
+        refreshFacetCounts();
+    }
 }
 
 // Exposer la fonction au niveau global pour qu'elle soit accessible depuis d'autres scripts
 window.initSearchHandler = initSearchHandler;
 
 /**
- * Génère une liste de valeurs uniques à partir d'une clé spécifique
- * @param {Array} markers - Tableau de marqueurs avec leurs données
- * @param {string} key - Clé à extraire
- * @returns {Array} - Tableau de valeurs uniques
+ * Interroge la recherche globale côté serveur
+ * @param {string} term - Terme saisi
+ * @param {string} type - Type de résultat (agriculteur, societe, referent...)
+ * @returns {Promise<Array>} - Libellés uniques des résultats
  */
-function getUniqueValues(markers, key) {
-    const uniqueSet = new Set(); // Utiliser un Set pour éviter les doublons
-    markers.forEach(item => {
-        if (item.data[key]) { // Vérifie si la clé existe et a une valeur
-            uniqueSet.add(item.data[key].trim());
-        }
-    });
-    return Array.from(uniqueSet); // Convertir le Set en tableau
+async function fetchSuggestions(term, type) {
+    const params = new URLSearchParams({ q: term, types: type, limit: 10 });
+    const response = await fetch(`/api/search?${params}`);
+    if (!response.ok) return [];
+    const results = await response.json();
+    return [...new Set(results.map(result => result.libelle).filter(Boolean))];
 }
 
 /**
@@ -86,21 +81,21 @@ function initAutocomplete() {
     autocomplete(
         document.getElementById("searchNom"),
         document.getElementById("suggestionsNom"),
-        proprietors
+        "agriculteur"
     );
 
     // Exemple pour les sociétés
     autocomplete(
         document.getElementById("searchSociete"),
         document.getElementById("suggestionsSociete"),
-        societes
+        "societe"
     );
 
     // Exemple pour les référents
     autocomplete(
         document.getElementById("searchReferent"),
         document.getElementById("suggestionsReferent"),
-        referents
+        "referent"
     );
 }
 
@@ -111,16 +106,19 @@ window.initAutocomplete = initAutocomplete;
  * Configure l'autocomplétion pour un champ de saisie
  * @param {HTMLElement} input - Élément input
  * @param {HTMLElement} suggestionsList - Élément liste de suggestions
- * @param {Array} data - Données pour l'autocomplétion
+ * @param {string} type - Type de résultat demandé à /api/search
  */
-function autocomplete(input, suggestionsList, data) {
-    input.addEventListener("input", debounce(function () {
+function autocomplete(input, suggestionsList, type) {
+    input.addEventListener("input", debounce(async function () {
         const value = this.value.toLowerCase().trim();
         suggestionsList.innerHTML = "";
 
         if (!value) return;
 
-        const matches = data.filter(item => item.toLowerCase().includes(value)).slice(0, 10); // Max 10 résultats
+        const matches = await fetchSuggestions(value, type); // Max 10 résultats, classés par le serveur
+
+        // Une saisie plus récente a pu modifier le champ pendant la requête
+        if (input.value.toLowerCase().trim() !== value) return;
 
         if (matches.length === 0 && input.id === "searchNom") {
             const listItem = document.createElement("li");
@@ -156,7 +154,7 @@ function autocomplete(input, suggestionsList, data) {
             listItem.addEventListener("click", function () {
                 input.value = match;
                 suggestionsList.innerHTML = "";
-                input.dispatchEvent(new Event('change')); // Trigger change event for filtering
+                input.dispatchEvent(new Event('change', { bubbles: true })); // Met à jour les comptes des listes
                 // Ne pas appliquer automatiquement le filtre
             });
 
@@ -186,13 +184,15 @@ function resetFilters() {
         if (element) element.value = '';
     });
     
-    // Rendre tous les marqueurs visibles et les replacer correctement
-    if (allMarkers && allMarkers.length > 0) {
-        allMarkers.forEach(item => {
-            item.marker.setOpacity(1); // Rendre visible
-            item.marker.setLatLng([item.data.latitude, item.data.longitude]); // Replacer au bon endroit
-        });
-    }
+    const contratsEnCours = document.getElementById('searchContratsEnCours');
+    if (contratsEnCours) contratsEnCours.checked = false;
+    refreshFacetCounts();
+
+    // Recharger tous les contrats, sans filtre
+    showLoader();
+    window.reloadContrats(new URLSearchParams())
+        .catch(error => console.error('Erreur lors du chargement des contrats:', error))
+        .finally(hideLoader);
 
     closeModal('searchModal'); // Fermer la modale après application
 }
@@ -201,184 +201,113 @@ function resetFilters() {
 window.resetFilters = resetFilters;
 
 /**
- * Filtre les marqueurs selon les critères sélectionnés
+ * Construit les paramètres de /api/contrats/query à partir des champs de la recherche avancée
+ * @returns {URLSearchParams} - Filtres renseignés
  */
-function filterMarkers() {
-    showLoader(); // Afficher le loader
-
+function buildFilterParams() {
     // Fonction utilitaire pour récupérer la valeur d'un élément s'il existe
     function getElementValue(id, defaultValue = '') {
         const element = document.getElementById(id);
-        return element ? element.value.trim().toLowerCase() : defaultValue;
+        return element ? element.value.trim() : defaultValue;
     }
 
-    const nomProprietaire = getElementValue('searchNom');
-    const nomSociete = getElementValue('searchSociete');
-    const referent = getElementValue('searchReferent');
-    const typeContrat = getElementValue('searchTypeContrat');
-    const typeProduction = getElementValue('searchTypeProduction');
-    const produitFini = getElementValue('searchProduitFini');
-    
-    // Récupérer les valeurs pour le filtre de surface contractualisée
+    const params = new URLSearchParams();
+    const fields = {
+        agriculteur: 'searchNom',
+        societe: 'searchSociete',
+        referent_nom: 'searchReferent',
+        type_contrat: 'searchTypeContrat',
+        type_production: 'searchTypeProduction',
+        produit_fini: 'searchProduitFini'
+    };
+    Object.entries(fields).forEach(([name, id]) => {
+        const value = getElementValue(id);
+        if (value) params.set(name, value);
+    });
+
+    // Filtre de surface contractualisée : « supérieure à » -> minimum, « inférieure à » -> maximum
     const surfaceOperator = getElementValue('searchSurfaceContractualiseeOperator', '>');
     const surfaceValue = getElementValue('searchSurfaceContractualiseeValue');
-    
-    // Ne pas utiliser les filtres SAU s'ils n'existent pas dans le DOM
-    const sauOperator = getElementValue('searchSAUOperator', '>');
-    const sauValue = getElementValue('searchSAUValue');
-    
-    // Vérifier si la case à cocher "Contrats en cours" est cochée
-    const contratsEnCours = document.getElementById('searchContratsEnCours')?.checked || false;
-    const currentDate = new Date();
-
-    let hasResults = false;
-
-    // Simuler un chargement de 500ms avant d'afficher les résultats
-    setTimeout(() => {
-        allMarkers.forEach(item => {
-            let match = true;
-            let data = item.data;
-
-            if (nomProprietaire && data.agriculteur.toLowerCase().trim() !== nomProprietaire) match = false;
-            if (typeContrat && data.type_contrat.toLowerCase().trim() !== typeContrat) match = false;
-            if (nomSociete && data.nom_societe.toLowerCase().trim() !== nomSociete) match = false;
-            if (referent && data.referent.toLowerCase().trim() !== referent) match = false;
-
-            if (typeProduction) {
-
-                // Vérifier que type_productions existe et est un tableau
-                if (!data.type_productions || !Array.isArray(data.type_productions) || data.type_productions.length === 0) {
-                    console.log('Type productions invalide ou vide');
-                    match = false;
-                } else {
-                    let found = false;
-                    // Parcourir chaque type de production et vérifier s'il correspond à la valeur sélectionnée
-                    for (let i = 0; i < data.type_productions.length; i++) {
-                        // Vérifier si l'élément est un objet avec une propriété 'type'
-                        const productionObj = data.type_productions[i];
-                        if (productionObj && typeof productionObj === 'object' && productionObj.type) {
-                            const productionType = productionObj.type.toLowerCase();
-                            console.log(`Comparaison: "${productionType}" === "${typeProduction}"`);
-                            if (productionType === typeProduction) {
-                                found = true;
-                                console.log('Correspondance trouvée!');
-                                break;
-                            }
-                        } else {
-                            // Essayer comme une chaîne simple au cas où
-                            const production = String(productionObj).toLowerCase();
-                            console.log(`Comparaison (string): "${production}" === "${typeProduction}"`);
-                            if (production === typeProduction) {
-                                found = true;
-                                console.log('Correspondance trouvée (string)!');
-                                break;
-                            }
-                        }
-                    }
-                    if (!found) {
-                        console.log('Aucune correspondance trouvée pour le type de production');
-                        match = false;
-                    }
-                }
-            }
+    if (surfaceValue && !isNaN(parseFloat(surfaceValue))) {
+        params.set(surfaceOperator === '<' ? 'surface_max' : 'surface_min', parseFloat(surfaceValue));
+    }
 
-            if (produitFini) {
-                // Vérifier que produits_finis existe et est un tableau
-                if (!data.produits_finis || !Array.isArray(data.produits_finis) || data.produits_finis.length === 0) {
-                    match = false;
-                } else {
-                    // Parcourir chaque produit fini et vérifier s'il correspond à la valeur sélectionnée
-                    let found = false;
-                    for (let i = 0; i < data.produits_finis.length; i++) {
-                        const product = String(data.produits_finis[i]).toLowerCase();
-                        if (product === produitFini) {
-                            found = true;
-                            break;
-                        }
-                    }
-                    if (!found) {
-                        match = false;
-                    }
-                }
-            }
-            
-            // Filtrage par surface contractualisée
-            if (surfaceValue && !isNaN(parseFloat(surfaceValue))) {
-                const surfaceNum = parseFloat(surfaceValue);
-                const dataSurface = parseFloat(data.surface_contractualisee);
-                
-                if (!isNaN(dataSurface)) {
-                    if (surfaceOperator === '>' && dataSurface <= surfaceNum) match = false;
-                    if (surfaceOperator === '<' && dataSurface >= surfaceNum) match = false;
-                } else if (surfaceValue) {
-                    // Si la valeur de surface n'est pas un nombre valide dans les données mais qu'un filtre est appliqué
-                    match = false;
-                }
-            }
-            
-            // Filtrage par SAU (Surface Agricole Utile)
-            if (sauValue && !isNaN(parseFloat(sauValue))) {
-                const sauNum = parseFloat(sauValue);
-                const dataSAU = parseFloat(data.sau || 0); // Utiliser 0 si la SAU n'est pas définie
-                
-                if (!isNaN(dataSAU)) {
-                    if (sauOperator === '>' && dataSAU <= sauNum) match = false;
-                    if (sauOperator === '<' && dataSAU >= sauNum) match = false;
-                } else if (sauValue) {
-                    // Si la valeur de SAU n'est pas un nombre valide dans les données mais qu'un filtre est appliqué
-                    match = false;
-                }
-            }
-            
-            // Filtrage des contrats en cours
-            if (contratsEnCours && match) {
-                // Convertir les dates de string (YYYY-MM-DD) en objets Date
-                let datePriseEffet = null;
-                let dateFin = null;
-                
-                if (data.date_prise_effet) {
-                    datePriseEffet = new Date(data.date_prise_effet);
-                }
-                
-                if (data.date_fin) {
-                    dateFin = new Date(data.date_fin);
-                }
-                
-                // Vérifier si le contrat est en cours (date actuelle est comprise entre date_prise_effet et date_fin)
-                const contratEnCours = (
-                    datePriseEffet && dateFin && 
-                    currentDate >= datePriseEffet && 
-                    currentDate <= dateFin
-                );
-                
-                if (!contratEnCours) {
-                    match = false;
-                }
-            }
+    if (document.getElementById('searchContratsEnCours')?.checked) params.set('en_cours', '1');
+    return params;
+}
 
-            // Plutôt que de supprimer les marqueurs, on les rend invisibles
-            if (match) {
-                item.marker.setOpacity(1); // Visible
-                item.marker.setLatLng([data.latitude, data.longitude]); // Remet à sa position réelle
-                hasResults = true;
-            } else {
-                item.marker.setOpacity(0); // Invisible
-                item.marker.setLatLng([0, 0]); // Déplace en dehors de la vue pour éviter l'interaction
-            }
+/**
+ * Interroge le filtrage côté serveur
+ * @param {URLSearchParams} params - Filtres
+ * @returns {Promise<Object>} - Réponse {total, ids, facettes}
+ */
+async function queryContrats(params) {
+    const response = await fetch(`/api/contrats/query?${params}`);
+    if (!response.ok) {
+        throw new Error(`Erreur ${response.status}: ${response.statusText}`);
+    }
+    return response.json();
+}
+
+/**
+ * Reporte le nombre de contrats de chaque valeur dans les listes de la recherche avancée
+ * @param {Object} facettes - Facettes renvoyées par /api/contrats/query
+ */
+function updateFacetCounts(facettes) {
+    document.querySelectorAll('#searchModal select[data-facette]').forEach(select => {
+        const counts = new Map((facettes[select.dataset.facette] || []).map(value => [String(value.id), value.nb]));
+        Array.from(select.options).forEach(option => {
+            if (!option.value) return;
+            option.textContent = `${option.dataset.libelle} (${counts.get(option.value) || 0})`;
         });
+    });
+}
+
+/**
+ * Met à jour les comptes des listes selon les filtres saisis (sans les identifiants)
+ */
+const refreshFacetCounts = debounce(function () {
+    const params = buildFilterParams();
+    params.set('ids', '0');
+    queryContrats(params)
+        .then(result => updateFacetCounts(result.facettes))
+        .catch(error => console.error('Erreur lors du calcul des facettes:', error));
+}, 300);
+
+/**
+ * Filtre les marqueurs selon les critères sélectionnés : la carte recharge depuis /api/contrats
+ * les seuls contrats retenus par le serveur, /api/contrats/query fournit leur nombre et les facettes
+ */
+function filterMarkers() {
+    showLoader(); // Afficher le loader
+
+    const params = buildFilterParams();
+    const countParams = new URLSearchParams(params);
+    countParams.set('ids', '0');
+
+    Promise.all([window.reloadContrats(params), queryContrats(countParams)])
+        .then(([, result]) => {
+            updateFacetCounts(result.facettes);
 
-        if (!hasResults) {
+            if (result.total === 0) {
+                Swal.fire({
+                    icon: 'error',
+                    title: 'Aucun résultat trouvé',
+                    text: 'Aucun contrat ne correspond aux filtres sélectionnés.'
+                });
+            }
+
+            closeModal('searchModal'); // Fermer la modale après application
+        })
+        .catch(error => {
+            console.error('Erreur lors du filtrage des contrats:', error);
             Swal.fire({
                 icon: 'error',
-                title: 'Aucun résultat trouvé',
-                text: 'Aucun contrat ne correspond aux filtres sélectionnés.'
+                title: 'Erreur',
+                text: 'Le filtrage des contrats a échoué.'
             });
-        }
-        
-        closeModal('searchModal'); // Fermer la modale après application
-
-        hideLoader(); 
-    }, 500); // Délai de 500ms avant d'afficher les résultats
+        })
+        .finally(hideLoader);
 }
 
 // Expose to global
@@ -0,0 +1,61 @@
+"""
+Fixtures communes : application de test et compteur de requêtes SQL.
+
+Les tests utilisent la base configurée dans .env (variables DB_*), qui doit
+contenir au moins un contrat ; ils sont ignorés si elle est injoignable.
+"""
+from collections import Counter
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+
+from application import create_app
+from models import db
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app({
+        'TESTING': True,
+        'SESSION_TYPE': 'cookie',  # Aucune requête SQL pour la session
+        'WARMUP': 'off',
+        'SQL_STATS_LOG': False,
+    })
+    with app.app_context():
+        try:
+            db.session.execute(text("SELECT 1"))
+        except OperationalError as e:
+            pytest.skip(f"Base de données injoignable : {e}")
+        finally:
+            db.session.remove()
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def count_queries(app):
+    """Gestionnaire de contexte qui compte les requêtes SQL exécutées, par base."""
+    @contextmanager
+    def counting():
+        counts = Counter()
+        with app.app_context():
+            engines = {bind or 'principale': engine for bind, engine in db.engines.items()}
+        listeners = {}
+        for name, engine in engines.items():
+            def count_query(*args, name=name):
+                counts[name] += 1
+            listeners[name] = count_query
+            event.listen(engine, "before_cursor_execute", count_query)
+        try:
+            yield counts
+        finally:
+            for name, engine in engines.items():
+                event.remove(engine, "before_cursor_execute", listeners[name])
+
+    return counting
@@ -0,0 +1,29 @@
+"""Nombre de requêtes SQL de la page de modification d'un contrat (voir contrats.get_edit_context)."""
+import pytest
+
+from models import db, Contrat
+
+# Contrat, relations et autres contrats de la société en une requête ; site CEN depuis le cache LRU
+MAX_QUERIES = 1
+
+
+@pytest.fixture
+def contract_id(app):
+    with app.app_context():
+        contract_id = db.session.query(db.func.min(Contrat.id_contrat)).scalar()
+        db.session.remove()
+    if contract_id is None:
+        pytest.skip("Aucun contrat en base.")
+    return contract_id
+
+
+def test_edit_contract_get_query_count(client, count_queries, contract_id):
+    url = f"/edit_contract/{contract_id}"
+    # Premier affichage : remplit les caches (référentiels, empreinte et cache LRU des sites)
+    assert client.get(url).status_code == 200
+
+    with count_queries() as counts:
+        response = client.get(url)
+
+    assert response.status_code == 200
+    assert sum(counts.values()) <= MAX_QUERIES, dict(counts)
@@ -0,0 +1,112 @@
+"""Client SIRENE contre le serveur bouchon (tools/sirene_stub.py) : jetons, limiteur et cache SQLite."""
+import sqlite3
+import threading
+
+import pytest
+
+from sirene import SireneCache, SireneClient, TokenBucket
+from tools.sirene_stub import SireneStubHandler, make_server
+
+SIRET = "12345678900012"
+SIRET_INCONNU = "12345678900000"  # Se termine par 0000 : 404 du bouchon
+
+
+@pytest.fixture
+def stub():
+    """Bouchon SIRENE lancé dans un thread, compteur de requêtes remis à zéro."""
+    server = make_server(port=0)
+    SireneStubHandler.requests_served = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    SireneStubHandler.error_rate = 0.0
+
+
+@pytest.fixture
+def sqlite_path(tmp_path):
+    return str(tmp_path / "sirene.sqlite3")
+
+
+def make_client(stub, path, capacity=10, retries=3, max_wait=5):
+    # Quota d'une requête par minute : le seau ne se remplit pas pendant le test
+    limiter = TokenBucket(path, rate_per_minute=1, capacity=capacity)
+    return SireneClient(f"http://127.0.0.1:{stub.server_address[1]}", "stub", SireneCache(path), limiter,
+                        retries=retries, backoff=0.01, max_wait=max_wait)
+
+
+def remaining_tokens(path):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT tokens FROM rate_limit WHERE name = 'insee'").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_lookup_normalise_l_etablissement(stub, sqlite_path):
+    client = make_client(stub, sqlite_path)
+
+    result, status = client.lookup(SIRET)
+
+    assert status == 200
+    assert result["siren"] == SIRET[:9]
+    assert result["denomination"] == "EARL STUB 0012"
+    assert result["adresse_etablissement"] == "12, RTE, DES MARAIS, 33000, BORDEAUX"
+
+
+def test_chaque_tentative_prend_un_jeton(stub, sqlite_path):
+    SireneStubHandler.error_rate = 1.0  # Toujours 503
+    client = make_client(stub, sqlite_path, capacity=10, retries=2)
+
+    result, status = client.lookup(SIRET)
+
+    assert status == 503
+    assert SireneStubHandler.requests_served == 3  # Première tentative + 2 nouvelles
+    assert remaining_tokens(sqlite_path) == pytest.approx(7, abs=0.1)
+
+
+def test_quota_epuise(stub, sqlite_path):
+    client = make_client(stub, sqlite_path, capacity=1, max_wait=0)
+
+    assert client.lookup(SIRET)[1] == 200
+    result, status = client.lookup("12345678900013")
+
+    assert status == 429
+    assert "Quota" in result["error"]
+    assert SireneStubHandler.requests_served == 1
+
+
+def test_limiteur_partage_par_fichier(sqlite_path):
+    first = TokenBucket(sqlite_path, rate_per_minute=1, capacity=2)
+    second = TokenBucket(sqlite_path, rate_per_minute=1, capacity=2)  # Autre worker, même fichier
+
+    assert first.acquire(0)
+    assert second.acquire(0)
+    assert not first.acquire(0)
+    assert not second.acquire(0)
+
+
+def test_cache_des_resultats(stub, sqlite_path):
+    client = make_client(stub, sqlite_path)
+
+    found = client.lookup(SIRET)
+    not_found = client.lookup(SIRET_INCONNU)
+    assert not_found[1] == 404
+    assert SireneStubHandler.requests_served == 2
+
+    # Nouvelles instances sur le même fichier : le cache est partagé entre workers
+    other = make_client(stub, sqlite_path)
+    assert other.lookup(SIRET) == found
+    assert other.lookup(SIRET_INCONNU) == not_found
+    assert SireneStubHandler.requests_served == 2
+
+    assert other.lookup(SIRET, use_cache=False) == found
+    assert SireneStubHandler.requests_served == 3
+
+
+def test_cache_expire(sqlite_path):
+    cache = SireneCache(sqlite_path)
+    cache.set(SIRET, {"siren": SIRET[:9]}, 200, ttl=-1)
+
+    assert cache.get(SIRET) is None
+    assert cache.purge_expired() == 1
@@ -0,0 +1,192 @@
+"""
+Tuiles vectorielles (Mapbox Vector Tiles) des sites CEN et des contrats.
+
+Les tuiles sont produites par PostGIS (ST_AsMVT) puis conservées sur disque
+dans TILES_CACHE_DIR/<couche>/<version>/<z>/<x>/<y>.pbf. La version change
+avec les données de la couche : les tuiles sont alors recalculées dans un
+nouveau répertoire. Le premier get_tile de chaque worker qui voit une nouvelle
+version supprime les répertoires des versions précédentes (prune_tiles), ce
+qui borne le cache disque à la version courante de chaque couche.
+
+La version des contrats est le compteur saisie.data_version, incrémenté par
+trigger à chaque écriture de saisie.contrat (migration f6b8d0e2a4c7) : elle
+est lue en base à chaque tuile, donc identique dans tous les workers dès la
+validation de l'écriture.
+"""
+import math
+import os
+import shutil
+import tempfile
+
+from flask import current_app
+from sqlalchemy import text
+
+from models import db, Contrat
+from sites_cen import get_sites_version
+
+# Dernière version vue par ce worker, par couche (déclenche la purge des anciennes)
+_seen_versions = {}
+
+CONTRATS_VERSION_SQL = text("SELECT version FROM saisie.data_version WHERE nom = 'contrats'")
+MAX_TILE_ZOOM = 22
+
+SITES_TILE_SQL = text("""
+    SELECT ST_AsMVT(tile, 'sites', 4096, 'geom')
+    FROM (
+        SELECT idsite, codesite, nom_site,
+               ST_AsMVTGeom(ST_Transform(geom, 3857), ST_TileEnvelope(:z, :x, :y), 4096, 64, true) AS geom
+        FROM saisie.site_geojson
+        WHERE geom && ST_Transform(ST_TileEnvelope(:z, :x, :y), :srid)
+    ) AS tile
+""")
+
+CONTRATS_TILE_SQL = text("""
+    SELECT ST_AsMVT(tile, 'contrats', 4096, 'geom')
+    FROM (
+        SELECT id_contrat,
+               ST_AsMVTGeom(point, ST_TileEnvelope(:z, :x, :y), 4096, 64, true) AS geom
+        FROM (
+            SELECT id_contrat,
+                   ST_Transform(ST_SetSRID(ST_MakePoint(longitude::float8, latitude::float8), 4326), 3857) AS point
+            FROM saisie.contrat
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        ) AS contrats
+        WHERE point && ST_TileEnvelope(:z, :x, :y)
+    ) AS tile
+""")
+
+SITES_EXTENT_SQL = text("""
+    SELECT ST_XMin(extent), ST_YMin(extent), ST_XMax(extent), ST_YMax(extent)
+    FROM (SELECT ST_Extent(ST_Transform(geom, 4326)) AS extent FROM saisie.site_geojson) AS sites
+""")
+
+
+def get_contrats_version():
+    """Version courante des contrats (compteur saisie.data_version, lecture par clé primaire)."""
+    return str(db.session.execute(CONTRATS_VERSION_SQL).scalar_one())
+
+
+def _sites_extent():
+    return db.session.execute(
+        SITES_EXTENT_SQL, bind_arguments={'bind': db.engines['secondary']}
+    ).one()
+
+
+def _contrats_extent():
+    return db.session.query(
+        db.func.min(Contrat.longitude), db.func.min(Contrat.latitude),
+        db.func.max(Contrat.longitude), db.func.max(Contrat.latitude)
+    ).one()
+
+
+# Couches disponibles : requête MVT, base interrogée, empreinte des données et emprise (lon/lat)
+TILE_LAYERS = {
+    'sites': {
+        'sql': SITES_TILE_SQL,
+        'bind_key': 'secondary',
+        'version': get_sites_version,
+        'extent': _sites_extent,
+    },
+    'contrats': {
+        'sql': CONTRATS_TILE_SQL,
+        'bind_key': None,
+        'version': get_contrats_version,
+        'extent': _contrats_extent,
+    },
+}
+
+
+def is_valid_tile(z, x, y):
+    """Vérifie que les coordonnées z/x/y désignent une tuile existante."""
+    return 0 <= z <= MAX_TILE_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def tile_path(layer, version, z, x, y):
+    """Chemin de la tuile dans le cache disque."""
+    return os.path.join(current_app.config['TILES_CACHE_DIR'], layer, version, str(z), str(x), f"{y}.pbf")
+
+
+def render_tile(layer, z, x, y):
+    """Calcule une tuile avec ST_AsMVT (bytes, éventuellement vides)."""
+    config = TILE_LAYERS[layer]
+    tile = db.session.execute(
+        config['sql'],
+        {'z': z, 'x': x, 'y': y, 'srid': current_app.config['SITES_SRID']},
+        bind_arguments={'bind': db.engines[config['bind_key']]}
+    ).scalar()
+    return bytes(tile) if tile is not None else b''
+
+
+def get_tile(layer, z, x, y):
+    """
+    Retourne (tuile, version) en la lisant depuis le cache disque, ou en la calculant puis l'écrivant.
+    L'écriture passe par un fichier temporaire pour que les workers ne lisent jamais une tuile partielle.
+    """
+    version = TILE_LAYERS[layer]['version']()
+    if _seen_versions.get(layer) != version:
+        _seen_versions[layer] = version
+        prune_tiles(layer, version)
+    path = tile_path(layer, version, z, x, y)
+
+    try:
+        with open(path, 'rb') as tile_file:
+            return tile_file.read(), version
+    except FileNotFoundError:
+        pass
+
+    tile = render_tile(layer, z, x, y)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(tile)
+        os.replace(tmp_path, path)
+    except FileNotFoundError:
+        # Répertoire purgé entre-temps par un autre worker passé à une version plus récente
+        pass
+    return tile, version
+
+
+def prune_tiles(layer, keep_version):
+    """
+    Supprime du cache disque les tuiles des versions obsolètes d'une couche.
+    Une tuile en cours d'écriture dans un répertoire supprimé est simplement servie sans être conservée.
+    """
+    layer_dir = os.path.join(current_app.config['TILES_CACHE_DIR'], layer)
+    if not os.path.isdir(layer_dir):
+        return
+    for version in os.listdir(layer_dir):
+        if version != keep_version:
+            shutil.rmtree(os.path.join(layer_dir, version), ignore_errors=True)
+
+
+def lonlat_to_tile(lon, lat, z):
+    """Convertit une position WGS84 en indices de tuile (x, y) au zoom z."""
+    lat = max(min(lat, 85.0511), -85.0511)
+    n = 2 ** z
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def seed_tiles(layer, min_zoom, max_zoom):
+    """
+    Précalcule les tuiles d'une couche couvrant l'emprise de ses données, de min_zoom à max_zoom.
+    Retourne le nombre de tuiles générées.
+    """
+    config = TILE_LAYERS[layer]
+    prune_tiles(layer, config['version']())
+
+    minx, miny, maxx, maxy = config['extent']()
+    if minx is None:
+        return 0
+
+    count = 0
+    for z in range(min_zoom, max_zoom + 1):
+        x_min, y_min = lonlat_to_tile(float(minx), float(maxy), z)
+        x_max, y_max = lonlat_to_tile(float(maxx), float(miny), z)
+        for x in range(x_min, x_max + 1):
+            for y in range(y_min, y_max + 1):
+                get_tile(layer, z, x, y)
+                count += 1
+    return count
@@ -0,0 +1,179 @@
+"""
+Fournisseur d'identité bouchon (Entra ID + Microsoft Graph /me), pour tester
+et mesurer la connexion hors ligne.
+
+- GET  /<tenant>/v2.0/.well-known/openid-configuration : découverte OpenID ;
+- GET  /<tenant>/oauth2/v2.0/authorize : redirige aussitôt vers redirect_uri
+  avec un code (utilisateur tiré parmi --users) ;
+- POST /<tenant>/oauth2/v2.0/token : échange le code contre des jetons
+  (id_token non signé, accepté par MSAL) ;
+- GET  /v1.0/me : profil de l'utilisateur du jeton ;
+- GET  /stats : nombre de requêtes servies par point d'accès.
+
+MSAL n'accepte qu'une autorité en https : le bouchon est servi en TLS avec un
+certificat auto-signé, que requests doit accepter (REQUESTS_CA_BUNDLE).
+
+Usage :
+    openssl req -x509 -newkey rsa:2048 -nodes -days 30 -subj "/CN=127.0.0.1" \\
+        -addext "subjectAltName=IP:127.0.0.1" -keyout stub.key -out stub.crt
+    python tools/identity_stub.py --port 8766 --certfile stub.crt --keyfile stub.key
+    AZURE_AUTHORITY=https://127.0.0.1:8766/stub AZURE_VALIDATE_AUTHORITY=false \\
+    GRAPH_API_URL=https://127.0.0.1:8766/v1.0 REQUESTS_CA_BUNDLE=stub.crt flask --app application run
+"""
+import argparse
+import base64
+import json
+import random
+import ssl
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+
+def b64url(data):
+    return base64.urlsafe_b64encode(json.dumps(data).encode('utf-8')).rstrip(b'=').decode('ascii')
+
+
+def fake_user(index):
+    """Utilisateur synthétique déterministe."""
+    return {
+        "oid": f"00000000-0000-0000-0000-{index:012d}",
+        "name": f"Utilisateur Stub {index}",
+        "upn": f"stub{index}@example.org",
+    }
+
+
+class IdentityStubHandler(BaseHTTPRequestHandler):
+    base_url = ''
+    users = 10
+    latency = 0.0
+    stats = Counter()
+    lock = threading.Lock()
+
+    def _count(self, endpoint):
+        with self.lock:
+            IdentityStubHandler.stats[endpoint] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if url.path.endswith('/v2.0/.well-known/openid-configuration'):
+            self._count('openid-configuration')
+            tenant_url = f"{self.base_url}{url.path[:-len('/v2.0/.well-known/openid-configuration')]}"
+            return self._send(200, {
+                "issuer": f"{tenant_url}/v2.0",
+                "authorization_endpoint": f"{tenant_url}/oauth2/v2.0/authorize",
+                "token_endpoint": f"{tenant_url}/oauth2/v2.0/token",
+                "response_types_supported": ["code"],
+            })
+
+        if url.path.endswith('/oauth2/v2.0/authorize'):
+            self._count('authorize')
+            params = {"code": f"stub-{random.randrange(self.users)}", "state": query.get('state', [''])[0]}
+            self.send_response(302)
+            self.send_header('Location', f"{query.get('redirect_uri', [''])[0]}?{urlencode(params)}")
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if url.path == '/v1.0/me':
+            self._count('me')
+            token = self.headers.get('Authorization', '').removeprefix('Bearer ')
+            if not token.startswith('stub-token-'):
+                return self._send(401, {"error": {"code": "InvalidAuthenticationToken"}})
+            user = fake_user(int(token.rsplit('-', 1)[1]))
+            return self._send(200, {"id": user["oid"], "displayName": user["name"], "userPrincipalName": user["upn"]})
+
+        if url.path == '/stats':
+            with self.lock:
+                return self._send(200, dict(self.stats))
+
+        return self._send(404, {"error": "not_found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if not url.path.endswith('/oauth2/v2.0/token'):
+            return self._send(404, {"error": "not_found"})
+        self._count('token')
+
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        code = form.get('code', [''])[0]
+        if not code.startswith('stub-'):
+            return self._send(400, {"error": "invalid_grant", "error_description": "Code inconnu."})
+
+        index = int(code.split('-', 1)[1])
+        user = fake_user(index)
+        tenant_url = f"{self.base_url}{url.path[:-len('/oauth2/v2.0/token')]}"
+        now = int(time.time())
+        id_token = ".".join([
+            b64url({"alg": "none", "typ": "JWT"}),
+            b64url({
+                "iss": f"{tenant_url}/v2.0", "aud": form.get('client_id', [''])[0],
+                "iat": now, "nbf": now, "exp": now + 3600,
+                "sub": user["oid"], "oid": user["oid"], "tid": "stub",
+                "name": user["name"], "preferred_username": user["upn"],
+            }),
+            "",
+        ])
+        return self._send(200, {
+            "token_type": "Bearer",
+            "scope": form.get('scope', [''])[0],
+            "expires_in": 3600,
+            "access_token": f"stub-token-{index}",
+            "refresh_token": f"stub-refresh-{index}",
+            "id_token": id_token,
+            "client_info": b64url({"uid": user["oid"], "utid": "stub"}),
+        })
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host='127.0.0.1', port=8766, users=10, latency_ms=0, certfile=None, keyfile=None):
+    """Crée le serveur bouchon (à lancer avec serve_forever(), éventuellement dans un thread)."""
+    scheme = 'https' if certfile else 'http'
+    IdentityStubHandler.base_url = f"{scheme}://{host}:{port}"
+    IdentityStubHandler.users = users
+    IdentityStubHandler.latency = latency_ms / 1000
+    server = ThreadingHTTPServer((host, port), IdentityStubHandler)
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--users', type=int, default=10, help="Nombre d'utilisateurs synthétiques")
+    parser.add_argument('--latency', type=int, default=0, help="Délai ajouté à chaque réponse (ms)")
+    parser.add_argument('--certfile', help="Certificat TLS (requis par MSAL)")
+    parser.add_argument('--keyfile', help="Clé privée du certificat")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.users, args.latency, args.certfile, args.keyfile)
+    print(f"Fournisseur d'identité bouchon sur {IdentityStubHandler.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Serveur bouchon de l'API SIRENE, pour développer et tester hors ligne.
+
+Répond à GET /siret/<siret> avec un établissement synthétique déterministe :
+- un SIRET se terminant par 0000 renvoie 404 (établissement inconnu) ;
+- --latency ajoute un délai (ms) à chaque réponse ;
+- --error-rate renvoie une proportion de 503 (pour éprouver les nouvelles tentatives).
+
+Usage :
+    python tools/sirene_stub.py --port 8765
+    SIRENE_API_URL=http://127.0.0.1:8765 flask --app application run
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SIRET_PATH = re.compile(r'^/siret/(\d{14})$')
+
+
+def fake_etablissement(siret):
+    """Établissement synthétique au format de l'API SIRENE 3.11."""
+    return {
+        "siren": siret[:9],
+        "siret": siret,
+        "trancheEffectifsEtablissement": "01",
+        "uniteLegale": {
+            "denominationUniteLegale": f"EARL STUB {siret[-4:]}",
+            "activitePrincipaleUniteLegale": "01.11Z",
+            "categorieJuridiqueUniteLegale": "6598",
+        },
+        "adresseEtablissement": {
+            "numeroVoieEtablissement": str(int(siret[-3:]) or 1),
+            "typeVoieEtablissement": "RTE",
+            "libelleVoieEtablissement": "DES MARAIS",
+            "codePostalEtablissement": "33000",
+            "libelleCommuneEtablissement": "BORDEAUX",
+        },
+    }
+
+
+class SireneStubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    error_rate = 0.0
+    requests_served = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            SireneStubHandler.requests_served += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        match = SIRET_PATH.match(self.path)
+        if not match:
+            return self._send(400, {"header": {"statut": 400, "message": "Requête invalide"}})
+        if random.random() < self.error_rate:
+            return self._send(503, {"header": {"statut": 503, "message": "Service indisponible"}})
+
+        siret = match.group(1)
+        if siret.endswith('0000'):
+            return self._send(404, {"header": {"statut": 404, "message": "Aucun élément trouvé"}})
+        return self._send(200, {"header": {"statut": 200, "message": "ok"}, "etablissement": fake_etablissement(siret)})
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host='127.0.0.1', port=8765, latency_ms=0, error_rate=0.0):
+    """Crée le serveur bouchon (à lancer avec serve_forever(), éventuellement dans un thread)."""
+    SireneStubHandler.latency = latency_ms / 1000
+    SireneStubHandler.error_rate = error_rate
+    return ThreadingHTTPServer((host, port), SireneStubHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=int, default=0, help="Délai ajouté à chaque réponse (ms)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Proportion de réponses 503")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.error_rate)
+    print(f"Bouchon SIRENE sur http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,149 +1,58 @@
-from flask import Flask, render_template, jsonify, request, redirect, url_for, flash, session
-from forms import CombinedForm
-from models import *
-from config import Config
-from datetime import datetime  
+"""
+Pages et API de saisie des contrats (blueprint « main ») et commandes associées.
+L'application est créée par application.create_app().
+"""
+import csv
 import json
-import secrets
-import requests
-from shapely.geometry import mapping
-from geoalchemy2.shape import to_shape
-from sqlalchemy.orm import load_only, selectinload
-from flask_migrate import Migrate
-from flask_login import login_required, current_user
-import flask_session
-from auth import init_auth
 import os
-from dotenv import load_dotenv
+import tempfile
+
+import click
+from flask import Blueprint, current_app, render_template, jsonify, request, redirect, url_for, flash, stream_with_context
+from flask_login import login_required
+from sqlalchemy.orm import selectinload
+
+from forms import CombinedForm, set_form_choices, validate_saisie
+from models import db, AgriculteurSociete, Contrat, ProduitFiniContrat, Societe, TypeMilieuContrat, TypeProductionSociete
+from auth import admin_required
+from db_pool import pool_stats
+from session_backend import purge_expired_sessions
+from sirene import get_sirene_client
+from enrichment import enrich_societes
+from contrats import (
+    MODE_PRODUCTION_BIO, MODE_PRODUCTION_CONV, contrats_modifies, create_contrat, delete_contrats,
+    get_contrats_page, get_edit_context, iter_contrats, parse_fields, rebuild_contrat_map, sync_contrat_map
+)
+from contrat_filters import filter_conditions, parse_contrat_filters, query_contrats
+from search import SEARCH_INDEX_TYPES, global_search, refresh_search_index, search_people
+from import_contrats import IMPORT_FORMATS, detect_format, import_contrats
+from warmup import retry_warmup
+
+bp = Blueprint('main', __name__, cli_group=None)
 
-# Chargement des variables d'environnement depuis le fichier .env
-load_dotenv()
-
-app = Flask(__name__)
-
-app.config['WTF_CSRF_ENABLED'] = False
-app.config['SECRET_KEY'] = secrets.token_hex(24)
-
-# Configuration de base
-app.config.from_object(Config)
-
-# Initialisation de la session
-app.config['SESSION_TYPE'] = Config.SESSION_TYPE
-flask_session.Session(app)
-
-# Initialisation de l'authentification
-init_auth(app)
-
-# Initialisation de la base de données
-db.init_app(app)
-
-
-# Configuration de Flask-Migrate
-migrate = Migrate(app, db)
 
 def populate_form_choices(form):
     try:
-        # Exécuter toutes les requêtes SQL en une seule transaction
-        type_milieux = db.session.execute(
-            TypeMilieu.query.options(load_only(TypeMilieu.id_type_milieu, TypeMilieu.milieu))
-        ).scalars()
-
-        contrats = db.session.execute(
-            TypeContrat.query.options(load_only(TypeContrat.id_type_contrat, TypeContrat.appellation_contrat))
-        ).scalars()
-
-        produits_finis = db.session.execute(
-            TypeProduitFini.query.options(load_only(TypeProduitFini.id_type_produit_fini, TypeProduitFini.nature_produit_fini))
-        ).scalars()
-
-                # Ajout du chargement des modes de production
-        modes_production = db.session.execute(
-            ModeProduction.query.options(load_only(ModeProduction.id, ModeProduction.nom))
-        ).scalars()
-
-        # Chargement des types de production
-        productions = db.session.execute(
-            TypeProduction.query.options(
-                load_only(TypeProduction.id_type_production, TypeProduction.nature_production)
-            )
-        ).scalars()
-
-        # Remplir les choix des champs du formulaire
-        form.type_milieu.choices = [(milieu.id_type_milieu, milieu.milieu) for milieu in type_milieux]
-        form.appellation_contrat.choices = [(contrat.id_type_contrat, contrat.appellation_contrat) for contrat in contrats]
-        form.produit_fini.choices = [(prod.id_type_produit_fini, prod.nature_produit_fini) for prod in produits_finis]
-        form.type_production.choices = [(prod.id_type_production, prod.nature_production) for prod in productions]
-        form.mode_production.choices = [(mode.id, mode.nom) for mode in modes_production]
+        # Les choix proviennent du cache des référentiels (aucune requête SQL hors rechargement)
+        set_form_choices(form)
 
     except Exception as e:
         flash("Erreur lors du chargement des données du formulaire.", "danger")
 
 
+@bp.route('/ready')
+def ready():
+    """Disponibilité du worker : 200 une fois les caches préchauffés, 503 sinon (étapes en échec relancées)."""
+    retry_warmup(current_app._get_current_object())
+    state = current_app.extensions['warmup']
+    return jsonify(state), 200 if state['pret'] else 503
 
-@app.route('/sites_cen_geojson')
-def get_all_sites_cen_geojson():
-    """Récupère les données GeoJSON pour TOUS les sites CEN.
-    Utilisé pour afficher tous les sites sur la carte principale."""
-    sites = VueSites.query.all()
-    features = []
-    
-    for site in sites:
-        # Convertir la géométrie PostGIS en GeoJSON
-        shape = to_shape(site.geom)
-        geojson = mapping(shape)
-        
-        feature = {
-            "type": "Feature",
-            "geometry": geojson,
-            "properties": {
-                "idsite": site.idsite,
-                "codesite": site.codesite,
-                "nom_site": site.nom_site
-            }
-        }
-        features.append(feature)
-    
-    geojson_data = {
-        "type": "FeatureCollection",
-        "features": features
-    }
-    
-    return jsonify(geojson_data)
-
-
-
-@app.route('/site_cen_geojson/<int:site_id>')
-def get_single_site_cen_geojson(site_id):
-    """
-    Récupère les données GeoJSON pour un seul site CEN spécifié par son ID.
-    Cela permet d'optimiser le chargement de la page edit_contract.html.
-    """
-    # Récupérer uniquement le site spécifié
-    site = VueSites.query.filter_by(idsite=site_id).first()
-    
-    if not site:
-        return jsonify({"type": "FeatureCollection", "features": []}), 404
-    
-    # Convertir la géométrie PostGIS en GeoJSON
-    shape = to_shape(site.geom)
-    geojson = mapping(shape)
-    
-    feature = {
-        "type": "Feature",
-        "geometry": geojson,
-        "properties": {
-            "codesite": site.codesite,
-            "nom_site": site.nom_site
-        }
-    }
-    
-    geojson_data = {
-        "type": "FeatureCollection",
-        "features": [feature]
-    }
-    
-    return jsonify(geojson_data)
 
+@bp.route('/admin/pool')
+@admin_required
+def admin_pool():
+    """Métriques des pools de connexions du worker (connexions empruntées, attente, expirations)."""
+    return jsonify(pool_stats()), 200
 
 
 def fetch_siret_data(siret, flash_messages = False):
@@ -155,47 +64,21 @@ def fetch_siret_data(siret, flash_messages = False):
             flash("Le numéro SIRET est invalide. Assurez-vous qu'il contient exactement 14 chiffres.", "danger")
         return {"error": "Le numéro SIRET est invalide."}, 400
 
-    url = f"https://api.insee.fr/api-sirene/3.11/siret/{siret}"
-    headers = {
-        "accept": "application/json",
-        "X-INSEE-Api-Key-Integration": os.environ.get("INSEE_API_KEY"),
-    }
-
     try:
-        response = requests.get(url, headers=headers)
-
-        if response.status_code == 200:
-            data = response.json()
-            etablissement = data.get("etablissement")
-
-            if etablissement:
-                adresse = etablissement.get("adresseEtablissement", {})
-                result = {
-                    "siren": etablissement.get("siren", "Non renseigné"),
-                    "denomination": etablissement.get("uniteLegale", {}).get("denominationUniteLegale", "Non renseigné"),
-                    "activite_principale": etablissement.get("uniteLegale", {}).get("activitePrincipaleUniteLegale", "Non renseigné"),
-                    "categorie_juridique": etablissement.get("uniteLegale", {}).get("categorieJuridiqueUniteLegale", "Non renseigné"),
-                    "tranche_effectif": etablissement.get("trancheEffectifsEtablissement", "Non renseigné"),
-                    "adresse_etablissement": ", ".join(filter(
-                        None, [
-                            adresse.get('numeroVoieEtablissement', ''),
-                            adresse.get('typeVoieEtablissement', ''),
-                            adresse.get('libelleVoieEtablissement', ''),
-                            adresse.get('codePostalEtablissement', ''),
-                            adresse.get('libelleCommuneEtablissement', '')
-                        ]))
-                }
-                if flash_messages:
-                    flash("Les données ont été récupérées avec succès depuis l'API SIRENE !", "success")
-                return result, 200
-        
+        # Client mutualisé : session HTTP réutilisée, quota INSEE et cache persistant
+        result, status_code = get_sirene_client().lookup(siret)
+
+        if status_code == 200:
             if flash_messages:
-                flash("Aucun établissement trouvé pour ce SIRET.", "danger")
-            return {"error": "Aucun établissement trouvé."}, 404
+                flash("Les données ont été récupérées avec succès depuis l'API SIRENE !", "success")
+            return result, 200
 
         if flash_messages:
-            flash(f"Erreur API : {response.status_code}, {response.text}", "danger")
-        return {"error": f"Erreur API : {response.status_code}, {response.text}"}, response.status_code
+            if status_code == 404:
+                flash("Aucun établissement trouvé pour ce SIRET.", "danger")
+            else:
+                flash(result["error"], "danger")
+        return result, status_code
 
     except Exception as e:
         if flash_messages:
@@ -203,6 +86,19 @@ def fetch_siret_data(siret, flash_messages = False):
         return {"error": f"Erreur serveur : {str(e)}"}, 500
     
     
+@bp.cli.command('enrich-societes')
+@click.option('--batch-size', default=100, show_default=True, help="Nombre de sociétés par lot (un UPDATE groupé par lot).")
+@click.option('--workers', default=4, show_default=True, help="Nombre d'appels SIRENE simultanés.")
+@click.option('--restart', is_flag=True, help="Ignorer le point de reprise et repartir de la première société.")
+def enrich_societes_command(batch_size, workers, restart):
+    """Ré-enrichit toutes les sociétés à partir de l'API SIRENE (reprise possible après interruption)."""
+    stats = enrich_societes(batch_size=batch_size, workers=workers, resume=not restart)
+    print(
+        f"Terminé : {stats['lues']} sociétés lues, {stats['mises_a_jour']} mises à jour, "
+        f"{stats['introuvables']} introuvables, {stats['erreurs']} erreurs."
+    )
+
+
 def check_siret_in_database(siret):
     """
     Vérifie si un SIRET existe déjà dans la base de données et retourne les données associées.
@@ -323,10 +219,10 @@ def check_siret_in_database(siret):
         return None
     
     except Exception as e:
-        print(f"Erreur lors de la recherche du SIRET dans la base de données : {str(e)}")
+        current_app.logger.error(f"Erreur lors de la recherche du SIRET dans la base de données : {e}")
         return None
 
-@app.route('/api/siret', methods=['POST'])
+@bp.route('/api/siret', methods=['POST'])
 @login_required
 def siret_lookup():
     siret = request.json.get("siret")
@@ -348,23 +244,15 @@ def siret_lookup():
 
 
 
-@app.route('/', methods=['GET', 'POST'])
+@bp.route('/', methods=['GET', 'POST'])
 @login_required
 def map_page():
-    print("Route map_page appelée")  # Vérifie que la route est exécutée
     form = CombinedForm()
 
     # Charger les choix dynamiques
     populate_form_choices(form)
 
-    # Charger le GeoJSON pour la carte
-    try:
-        with open('static/sig/depts_na.geojson') as geojson_file:
-            geojson = json.load(geojson_file)
-    except FileNotFoundError:
-        flash("Erreur : Fichier GeoJSON introuvable.", "danger")
-        geojson = {}
-
+    # Le contour des départements est servi par /sig/depts_na.<version>.geojson (voir depts.py)
 
     # 🔹 Si l'utilisateur clique sur "Rechercher via l'API"
     if form.fetch_sirene.data:
@@ -375,10 +263,11 @@ def map_page():
             form.categorie_juridique.data = siret_data["categorie_juridique"]
             form.activite_principale.data = siret_data["activite_principale"]
             form.nom_societe.data = siret_data["denomination"]
-        return render_template('map.html', form=form, geojson=geojson)
+        return render_template('map.html', form=form)
 
     # Vérifier si le SIRET existe déjà avant la validation du formulaire
     siret_existant = False
+    societe_existante = None
     if form.siret.data:
         societe_existante = Societe.query.filter_by(siret=form.siret.data).first()
         if societe_existante:
@@ -389,178 +278,32 @@ def map_page():
         # Si le SIRET existe, ignorer la validation des champs liés à la société et à l'agriculteur
         validation_ok = True
         if siret_existant:
-            # Liste des champs à ne pas valider pour une société existante
-            champs_a_ignorer = [
-                'type_production', 'mode_production',  # Champs de production
-                'nom_agri', 'prenom_agri',  # Champs de l'agriculteur
-                'telephone', 'email' 
-            ]
-            
-            # Valider manuellement tous les champs sauf ceux à ignorer
-            for field_name, field in form._fields.items():
-                if field_name not in champs_a_ignorer and field_name != 'csrf_token' and field_name != 'submit':
-                    if not field.validate(form):
-                        print(f"Erreur de validation pour le champ {field_name}: {field.errors}")
-                        validation_ok = False
+            # Valider tous les champs sauf ceux de la société et de l'agriculteur (voir forms.CHAMPS_SOCIETE_EXISTANTE)
+            validation_ok = validate_saisie(form, societe_existante=True)
+            if not validation_ok:
+                current_app.logger.debug(f"Erreurs de validation : {form.errors}")
         else:
             # Validation normale de tous les champs
             validation_ok = form.validate_on_submit()
             if not validation_ok:
-                print("Erreurs de validation:", form.errors)
+                current_app.logger.debug(f"Erreurs de validation : {form.errors}")
         
         if validation_ok:  # Si la validation est réussie
-            try:              
-                # Logique pour enregistrer les données
-                # Vérifier si la société existe déjà (par SIRET ou nom)
-                societe = None
-                societe_existante = False
-                if form.siret.data:
-                    societe = Societe.query.filter_by(siret=form.siret.data).first()
-                    if societe:
-                        societe_existante = True
-                if not societe:
-                    societe = Societe.query.filter_by(nom_societe=form.nom_societe.data).first()
-                    if societe:
-                        societe_existante = True
-
-                # Si la société n'existe pas, la créer avec toutes les données associées
-                if not societe:
-                    societe = Societe(
-                        nom_societe=form.nom_societe.data,
-                        telephone=form.telephone.data,
-                        email=form.email.data,
-                        siret=form.siret.data, 
-                        adresse_etablissement=form.adresse_etablissement.data,  
-                        tranche_effectif=form.tranche_effectif.data, 
-                        categorie_juridique=form.categorie_juridique.data,
-                        activite_principale=form.activite_principale.data
-                    )
-
-                    db.session.add(societe)
-                    db.session.commit()
-
-                    # Ajouter un agriculteur uniquement si la société est nouvelle
-                    agriculteur = Agriculteur(
-                        nom_agri=form.nom_agri.data,
-                        prenom_agri=form.prenom_agri.data,
-                        date_naissance=form.date_naissance.data,
-                    )
-                    db.session.add(agriculteur)
-                    db.session.commit()
-
-                    # Ajouter une association dans AgriculteurSociete
-                    agriculteur_societe = AgriculteurSociete(
-                        id_agriculteur=agriculteur.id_agriculteur,
-                        id_societe=societe.id_societe
-                    )
-                    db.session.add(agriculteur_societe)
-                    db.session.commit()
-                    
-                    # Ajouter les types de production uniquement pour une nouvelle société
-                    # Récupérer les types de production bio et conventionnelle
-                    type_production_bio = request.form.getlist('type_production_bio[]')
-                    type_production_conv = request.form.getlist('type_production_conv[]')
-                    
-                    # Définir les IDs des modes de production
-                    mode_production_bio_id = 1  # ID pour le mode Bio
-                    mode_production_conv_id = 2  # ID pour le mode Conventionnelle
-
-                    # Traiter les types de production bio
-                    for production_id in type_production_bio:
-                        if production_id:  # Vérifier que l'ID n'est pas vide
-                            # Créer directement l'association TypeProductionSociete
-                            type_production_societe = TypeProductionSociete(
-                                id_societe=societe.id_societe,
-                                id_type_production=int(production_id),
-                                id_mode_production=mode_production_bio_id
-                            )
-                            db.session.add(type_production_societe)
-                    
-                    # Traiter les types de production conventionnelle
-                    for production_id in type_production_conv:
-                        if production_id:  # Vérifier que l'ID n'est pas vide
-                            # Créer directement l'association TypeProductionSociete
-                            type_production_societe = TypeProductionSociete(
-                                id_societe=societe.id_societe,
-                                id_type_production=int(production_id),
-                                id_mode_production=mode_production_conv_id
-                            )
-                            db.session.add(type_production_societe)
-                            
-                    db.session.commit()
-
-                # Vérifier si le référent existe déjà
-                referent = Referent.query.filter_by(
-                    nom_referent=form.nom_referent.data,
-                    prenom_referent=form.prenom_referent.data
-                ).first()
-                if not referent:
-                    referent = Referent(
-                        nom_referent=form.nom_referent.data,
-                        prenom_referent=form.prenom_referent.data
-                    )
-                    db.session.add(referent)
-                    db.session.commit()
-
-                # Nous n'avons plus besoin de créer un SiteCEN séparé car les informations sont maintenant directement dans ContratSiteCEN
-
-                # Ajouter un contrat (toujours créé, que la société soit nouvelle ou existante)
-                contrat = Contrat(
-                    surf_contractualisee=form.surf_contractualisee.data,
-                    date_signature=form.date_signature.data,
-                    date_fin=form.date_fin.data,
-                    date_prise_effet=form.date_prise_effet.data,
-                    latitude=form.latitude.data,
-                    longitude=form.longitude.data,
-                    remarques=form.remarques.data,
-                    id_societe=societe.id_societe,
-                    id_referent=referent.id_referent,
-                    id_type_contrat=form.appellation_contrat.data
-                )
-                db.session.add(contrat)
-                db.session.commit()
-
-
-                # Rechercher le site correspondant dans VueSites par son code
-                vue_site = VueSites.query.filter_by(codesite=form.code_site.data).first()
-                
-                # Si le site existe dans VueSites, utiliser son idsite
-                # Sinon, générer un nouvel ID
-                site_id = vue_site.idsite if vue_site else db.session.query(db.func.nextval('saisie.site_cen_id_site_seq')).scalar()
-                
-                # Créer directement une entrée ContratSiteCEN avec les informations du site
-                contrat_site_cen = ContratSiteCEN(
-                    id_site=site_id,
-                    id_contrat=contrat.id_contrat,
-                    code_site=form.code_site.data,
-                    nom_site=form.nom_site.data
+            try:
+                # Enregistrement de la saisie en une seule transaction (voir contrats.create_contrat)
+                data = {name: field.data for name, field in form._fields.items()}
+                data.update(
+                    type_production_bio=request.form.getlist('type_production_bio[]'),
+                    type_production_conv=request.form.getlist('type_production_conv[]'),
+                    type_milieu=request.form.getlist('type_milieu'),
+                    produit_fini=request.form.getlist('produit_fini'),
                 )
-                db.session.add(contrat_site_cen)
-                db.session.commit()
-
-                # Associer des types de milieu au contrat (toujours fait, que la société soit nouvelle ou existante)
-                for milieu_id in request.form.getlist('type_milieu'):
-                    type_milieu_contrat = TypeMilieuContrat(
-                        id_type_milieu=int(milieu_id),
-                        id_contrat=contrat.id_contrat
-                    )
-                    db.session.add(type_milieu_contrat)
-                    db.session.commit()
-
-                # Associer des produits finis au contrat (toujours fait, que la société soit nouvelle ou existante)
-                for produit_fini_id in request.form.getlist('produit_fini'):
-                    produit_fini_contrat = ProduitFiniContrat(
-                        id_type_produit_fini=int(produit_fini_id),
-                        id_contrat=contrat.id_contrat
-                    )
-                    db.session.add(produit_fini_contrat)
-
-                db.session.commit()
+                create_contrat(data, societe=societe_existante)
                 flash('Les données ont été ajoutées avec succès !', 'success')
                 return redirect('/')
                 
             except Exception as e:
-                db.session.rollback()
+                # La transaction a déjà été annulée par create_contrat
                 flash(f"Erreur : {str(e)}", 'danger')
     else:
         # Afficher les erreurs spécifiques
@@ -569,469 +312,376 @@ def map_page():
                 flash(f"Erreur dans {getattr(form, field).label.text} : {error}", "danger")
 
 
-    # Préparer les données pour la visualisation avec yield_per()
-    contrats_query = (
-        db.session.query(Contrat)
-        .options(
-            selectinload(Contrat.societe).selectinload(Societe.activite_principale_obj),
-            selectinload(Contrat.societe).selectinload(Societe.categorie_juridique_obj),
-            selectinload(Contrat.societe).selectinload(Societe.tranche_effectif_obj),
-            selectinload(Contrat.societe).selectinload(Societe.types_production_societe).selectinload(TypeProductionSociete.type_production),
-            selectinload(Contrat.societe).selectinload(Societe.types_production_societe).selectinload(TypeProductionSociete.mode_production),
-            selectinload(Contrat.types_milieu).selectinload(TypeMilieuContrat.type_milieu),
-            selectinload(Contrat.produits_finis).selectinload(ProduitFiniContrat.produit_fini),
-            selectinload(Contrat.sites_cen),
-            selectinload(Contrat.referent)
-        )
-    )
+    # Les contrats ne sont plus injectés dans la page : la carte les charge via /api/contrats
+    return render_template('map.html', form=form)
 
-    contrat_data = []
 
-    # Charger les contrats par lots de 50
-    for contrat in contrats_query.yield_per(50):
+@bp.route('/api/contrats')
+@login_required
+def api_contrats():
+    """
+    Liste des contrats pour la carte, paginée par curseur (id_contrat).
+    Paramètres : cursor, limit, fields (projection), format=ndjson (diffusion ligne par ligne)
+    et les filtres de /api/contrats/query, qui restreignent les contrats renvoyés.
+    """
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        conditions = filter_conditions(parse_contrat_filters(request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        # Types de milieu
-        type_milieux = [milieu.type_milieu.milieu for milieu in contrat.types_milieu] if contrat.types_milieu else []
+    cursor = request.args.get('cursor', type=int)
+    limit = request.args.get('limit', type=int)
 
-        # Traitement des types de production avec leurs modes
-        type_productions = []
-        if contrat.societe and contrat.societe.types_production_societe:
-            for tps in contrat.societe.types_production_societe:
-                type_productions.append({
-                    'type': tps.type_production.nature_production,
-                    'mode_production': tps.mode_production.nom if tps.mode_production else None
-                })
+    if request.args.get('format') == 'ndjson':
+        if limit is not None:
+            limit = max(1, limit)
+        lines = (current_app.json.dumps(contrat) + "\n" for contrat in iter_contrats(cursor, limit, fields, conditions=conditions))
+        return current_app.response_class(stream_with_context(lines), mimetype='application/x-ndjson')
 
-        # Récupérer le premier mode de production (s'il existe)
-        mode_production = type_productions[0]['mode_production'] if type_productions else "Non spécifié"
-                
-        # Produits finis
-        produits_finis = [
-            produit.produit_fini.nature_produit_fini if produit.produit_fini else "Non spécifié"
-            for produit in contrat.produits_finis
-        ]
+    limit = min(max(1, limit or current_app.config['CONTRATS_PAGE_SIZE']), current_app.config['CONTRATS_PAGE_MAX_SIZE'])
+    contrats, next_cursor = get_contrats_page(cursor, limit, fields, conditions)
+    return jsonify({"contrats": contrats, "next_cursor": next_cursor})
 
 
-        contrat_data.append({
-            "id": contrat.id_contrat,
-            "latitude": float(contrat.latitude) if contrat.latitude else None,
-            "longitude": float(contrat.longitude) if contrat.longitude else None,
-            "nom_site": contrat.sites_cen[0].nom_site if contrat.sites_cen and len(contrat.sites_cen) > 0 else "Non spécifié",
-            "code_site": contrat.sites_cen[0].code_site if contrat.sites_cen and len(contrat.sites_cen) > 0 else "Non spécifié",
-            "nom_societe": contrat.societe.nom_societe if contrat.societe else "Non spécifié",
-            "agriculteur": f"{contrat.societe.agriculteurs_intermediaires[0].agriculteur.prenom_agri} {contrat.societe.agriculteurs_intermediaires[0].agriculteur.nom_agri}" if contrat.societe and contrat.societe.agriculteurs_intermediaires else "Non spécifié",
-            "telephone": contrat.societe.telephone if contrat.societe else "Non spécifié",
-            "email": contrat.societe.email if contrat.societe else "Non spécifié",
-            "siret": contrat.societe.siret,
-            "adresse_etablissement": contrat.societe.adresse_etablissement,
-            "tranche_effectif": contrat.societe.tranche_effectif_obj.lib_type_tranche_effectif if contrat.societe and contrat.societe.tranche_effectif_obj else "Non spécifié",
-            "categorie_juridique": contrat.societe.categorie_juridique_obj.lib_type_categorie_juridique if contrat.societe and contrat.societe.categorie_juridique_obj else "Non spécifié",
-            "activite_principale": contrat.societe.activite_principale_obj.lib_type_activite_principale if contrat.societe and contrat.societe.activite_principale_obj else "Non spécifié",
-            "date_naissance": contrat.societe.agriculteurs_intermediaires[0].agriculteur.date_naissance if contrat.societe and contrat.societe.agriculteurs_intermediaires else "Non spécifié",
-            "mode_production": mode_production,
-            "type_productions": type_productions,
-            "produits_finis": produits_finis,
-            "type_contrat": contrat.type_contrat.appellation_contrat if contrat.type_contrat else "Non spécifié",
-            "date_signature": contrat.date_signature.strftime("%Y-%m-%d") if contrat.date_signature else "Non spécifié",
-            "date_prise_effet": contrat.date_prise_effet.strftime("%Y-%m-%d") if contrat.date_prise_effet else "Non spécifié",
-            "date_fin": contrat.date_fin.strftime("%Y-%m-%d") if contrat.date_fin else "Non spécifié",
-            "date_ajout_bdd": contrat.date_ajout_bdd.strftime("%Y-%m-%d %H:%M:%S") if contrat.date_ajout_bdd else "Non spécifié",
-            "referent": f"{contrat.referent.prenom_referent} {contrat.referent.nom_referent}" if contrat.referent else "Non spécifié",
-            "surface_contractualisee": contrat.surf_contractualisee if contrat.surf_contractualisee else 'Non spécifié',
-            "type_milieux": type_milieux,
-            "remarques": contrat.societe.remarques if contrat.societe and contrat.societe.remarques else "Non spécifié",
-            "remarques_contrat": contrat.remarques if contrat.remarques else "Non spécifié",
-        })
-
-    # Envoyer les données au template après la boucle
-    return render_template('map.html', form=form, geojson=geojson, contrats=contrat_data)
+@bp.route('/api/contrats/query')
+@login_required
+def api_query_contrats():
+    """
+    Filtrage et facettes côté serveur : identifiants des contrats retenus et nombre de contrats par valeur
+    de chaque facette. Paramètres : voir contrat_filters.parse_contrat_filters ; ids=0 pour les seuls comptes.
+    """
+    try:
+        filters = parse_contrat_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    
-@app.route('/edit_contract/<int:contract_id>', methods=['GET', 'POST'])
-def edit_contract(contract_id):
+    return jsonify(query_contrats(filters, with_ids=request.args.get('ids') != '0')), 200
 
-    # Charger uniquement le GeoJSON du site associé au contrat (optimisation)
-    site_id = None
-    # Vérifier si le contrat a un site CEN associé
-    contrat = Contrat.query.options(selectinload(Contrat.sites_cen)).filter(Contrat.id_contrat == contract_id).first()
-    
-    if contrat and contrat.sites_cen and len(contrat.sites_cen) > 0:
-        # Récupérer le code du site pour faire la correspondance
-        code_site = contrat.sites_cen[0].code_site
-        
-        # Rechercher le site correspondant dans VueSites par son code
-        vue_site = VueSites.query.filter_by(codesite=code_site).first()
-        
-        if vue_site:
-            # Utiliser l'idsite de VueSites
-            site_id = vue_site.idsite
-            # Charger uniquement le site spécifique
-            sites_geojson = get_single_site_cen_geojson(site_id).json
-        else:
-            # Si le site n'est pas trouvé dans VueSites, renvoyer un GeoJSON vide
-            sites_geojson = {"type": "FeatureCollection", "features": []}
-    else:
-        # Si pas de site associé, renvoyer un GeoJSON vide
-        sites_geojson = {"type": "FeatureCollection", "features": []}
 
-    # Charger un formulaire unique contenant tous les champs
-    form = CombinedForm()
-    populate_form_choices(form)
+@bp.route('/api/contrats/import', methods=['POST'])
+@login_required
+def api_import_contrats():
+    """
+    Import en masse de contrats (fichier CSV, GeoPackage ou GeoJSON dans le champ « fichier »).
+    Paramètre dry_run=1 : validation seule, sans écriture. Retourne les compteurs et les erreurs par ligne.
+    L'import est synchrone : la taille de la requête est limitée à IMPORT_MAX_HTTP_SIZE, les fichiers plus
+    gros passent par la commande flask import-contrats.
+    """
+    max_size = current_app.config['IMPORT_MAX_HTTP_SIZE']
+    if request.content_length is None:
+        return jsonify({"error": "Taille de la requête non indiquée (en-tête Content-Length)."}), 411
+    if request.content_length > max_size:
+        return jsonify({"error": (
+            f"Fichier trop volumineux pour l'import en ligne (plus de {max_size // (1024 * 1024)} Mo) : "
+            "utilisez la commande « flask import-contrats »."
+        )}), 413
+
+    upload = request.files.get('fichier')
+    if upload is None or not upload.filename:
+        return jsonify({"error": "Aucun fichier transmis (champ « fichier »)."}), 400
+    try:
+        file_format = detect_format(upload.filename)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    # Charger le contrat avec toutes ses relations en une seule requête
-    contrat = (
-        db.session.query(Contrat)
-        .options(
-            selectinload(Contrat.societe).selectinload(Societe.activite_principale_obj),
-            selectinload(Contrat.societe).selectinload(Societe.categorie_juridique_obj),
-            selectinload(Contrat.societe).selectinload(Societe.tranche_effectif_obj),
-            selectinload(Contrat.societe).selectinload(Societe.types_production_societe).selectinload(TypeProductionSociete.type_production),
-            selectinload(Contrat.societe).selectinload(Societe.types_production_societe).selectinload(TypeProductionSociete.mode_production),
-            selectinload(Contrat.types_milieu).selectinload(TypeMilieuContrat.type_milieu),
-            selectinload(Contrat.produits_finis).selectinload(ProduitFiniContrat.produit_fini),
-            selectinload(Contrat.sites_cen),
-            selectinload(Contrat.referent)
+    max_errors = current_app.config['IMPORT_MAX_REPORTED_ERRORS']
+    errors = []
+
+    def collect_error(number, messages):
+        if len(errors) < max_errors:
+            errors.append({"ligne": number, "erreurs": messages})
+
+    # Le fichier est écrit sur disque : lecture en flux (et GeoPackage lisible par SQLite)
+    fd, path = tempfile.mkstemp(suffix=f".{file_format}")
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            upload.save(tmp_file)
+        stats = import_contrats(
+            path, file_format, dry_run=request.args.get('dry_run', type=int) == 1, on_error=collect_error
         )
-        .filter(Contrat.id_contrat == contract_id)
-        .first()
-    )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        os.remove(path)
+
+    return jsonify({**stats, "details_erreurs": errors, "details_tronques": stats['erreurs'] > len(errors)})
+
+
+@bp.cli.command('import-contrats')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(IMPORT_FORMATS), help="Format du fichier (déduit de l'extension par défaut).")
+@click.option('--chunk-size', type=int, help="Nombre de contrats insérés par transaction (IMPORT_CHUNK_SIZE par défaut).")
+@click.option('--dry-run', is_flag=True, help="Valider les lignes sans rien écrire en base.")
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False), help="Fichier CSV où écrire les erreurs ligne par ligne.")
+def import_contrats_command(path, file_format, chunk_size, dry_run, errors_path):
+    """Importe des contrats depuis un fichier CSV, GeoPackage ou GeoJSON."""
+    errors_file = open(errors_path, 'w', encoding='utf-8', newline='') if errors_path else None
+    writer = csv.writer(errors_file, delimiter=';') if errors_file else None
+    if writer:
+        writer.writerow(['ligne', 'erreurs'])
+
+    def report_error(number, messages):
+        if writer:
+            writer.writerow([number, ' | '.join(messages)])
+        else:
+            print(f"Ligne {number} : {' | '.join(messages)}")
+
+    try:
+        stats = import_contrats(path, file_format, chunk_size=chunk_size, dry_run=dry_run, on_error=report_error)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    finally:
+        if errors_file:
+            errors_file.close()
+
+    action = "validées" if dry_run else "importées"
+    print(f"Terminé : {stats['lues']} lignes lues, {stats['importees']} {action}, {stats['erreurs']} en erreur.")
     
+def fill_edit_form(form, contrat):
+    """Pré-remplit le formulaire de modification à partir du contrat chargé (sans requête supplémentaire)."""
+    # Site CEN
+    if contrat.sites_cen:
+        form.nom_site.data = contrat.sites_cen[0].nom_site
+        form.code_site.data = contrat.sites_cen[0].code_site
+    else:
+        form.nom_site.data = ""
+        form.code_site.data = ""
+
+    # Société
+    societe = contrat.societe
+    if societe:
+        form.siret.data = societe.siret
+        form.nom_societe.data = societe.nom_societe
+        form.activite_principale.data = societe.activite_principale
+        form.categorie_juridique.data = societe.categorie_juridique
+        form.tranche_effectif.data = societe.tranche_effectif
+        form.adresse_etablissement.data = societe.adresse_etablissement
+        form.telephone.data = societe.telephone
+        form.email.data = societe.email
+        form.remarques.data = societe.remarques
+
+    # Contrat
+    form.surf_contractualisee.data = contrat.surf_contractualisee
+    form.date_signature.data = contrat.date_signature
+    form.date_prise_effet.data = contrat.date_prise_effet
+    form.date_fin.data = contrat.date_fin
+    form.appellation_contrat.data = contrat.id_type_contrat
+    form.remarques_contrat.data = contrat.remarques
+
+    # Référent
+    if contrat.referent:
+        form.nom_referent.data = contrat.referent.nom_referent
+        form.prenom_referent.data = contrat.referent.prenom_referent
+
+    # Agriculteur
+    if societe and societe.agriculteurs_intermediaires:
+        agriculteur = societe.agriculteurs_intermediaires[0].agriculteur
+        form.nom_agri.data = agriculteur.nom_agri
+        form.prenom_agri.data = agriculteur.prenom_agri
+        form.date_naissance.data = agriculteur.date_naissance
+
+    # Sélection multiple (identifiants lus directement sur les lignes d'association)
+    form.type_milieu.data = [milieu.id_type_milieu for milieu in contrat.types_milieu]
+    form.produit_fini.data = [produit.id_type_produit_fini for produit in contrat.produits_finis]
+
+    # Types de production, séparés par mode (bio et conventionnel)
+    productions = societe.types_production_societe if societe else []
+    form.type_production.data = [tps.id_type_production for tps in productions]
+    form.type_production_bio = [tps.id_type_production for tps in productions if tps.id_mode_production == MODE_PRODUCTION_BIO]
+    form.type_production_conv = [tps.id_type_production for tps in productions if tps.id_mode_production == MODE_PRODUCTION_CONV]
+
+    # Mode de production par défaut
+    if productions:
+        form.mode_production.data = productions[0].id_mode_production
+
+    # Productions existantes groupées par mode, au format JSON pour le template
+    existing_productions = {}
+    for tps in productions:
+        existing_productions.setdefault(tps.id_mode_production, []).append(tps.id_type_production)
+    return [
+        {'type_production': type_prods, 'mode_production': str(mode_id)}
+        for mode_id, type_prods in existing_productions.items()
+    ]
+
+
+@bp.route('/edit_contract/<int:contract_id>', methods=['GET', 'POST'])
+def edit_contract(contract_id):
+    # Contrat, relations, autres contrats de la société (une requête) et GeoJSON du site (cache LRU)
+    context = get_edit_context(contract_id)
+
     # Vérification si le contrat existe
-    if not contrat:
+    if context is None:
         flash("Contrat introuvable.", "danger")
-        return redirect(url_for('map_page'))
+        return redirect(url_for('.map_page'))
 
+    contrat = context['contrat']
+
+    # Charger un formulaire unique contenant tous les champs
+    form = CombinedForm()
+    populate_form_choices(form)
 
     # 🟢 Pré-remplissage du formulaire en mode GET
     if request.method == 'GET':
-        # Vérifier que sites_cen existe et qu'il contient au moins un élément
-        if contrat.sites_cen and len(contrat.sites_cen) > 0:
-            form.nom_site.data = contrat.sites_cen[0].nom_site
-            form.code_site.data = contrat.sites_cen[0].code_site
-        else:
-            form.nom_site.data = ""
-            form.code_site.data = ""
+        initial_productions = fill_edit_form(form, contrat)
+        return render_template('edit_contract.html',
+                            form=form,
+                            initial_productions=json.dumps(initial_productions),
+                            **context)
 
-        # Société
-        if contrat.societe:
-            form.siret.data = contrat.societe.siret
-            form.nom_societe.data = contrat.societe.nom_societe
-            form.activite_principale.data = contrat.societe.activite_principale
-            form.categorie_juridique.data = contrat.societe.categorie_juridique
-            form.tranche_effectif.data = contrat.societe.tranche_effectif
-            form.adresse_etablissement.data = contrat.societe.adresse_etablissement
-            form.telephone.data = contrat.societe.telephone
-            form.email.data = contrat.societe.email
-            form.remarques.data = contrat.societe.remarques
-
-        # Contrat
-        form.surf_contractualisee.data = contrat.surf_contractualisee
-        form.date_signature.data = contrat.date_signature
-        form.date_prise_effet.data = contrat.date_prise_effet
-        form.date_fin.data = contrat.date_fin
-        form.appellation_contrat.data = contrat.id_type_contrat
-        form.remarques_contrat.data = contrat.remarques
-
-        # Référent
-        if contrat.referent:
-            form.nom_referent.data = contrat.referent.nom_referent
-            form.prenom_referent.data = contrat.referent.prenom_referent
+    # 🟢 Traitement du formulaire soumis
+    try:
+        # Mise à jour des informations générales
+        if contrat.sites_cen:
+            contrat.sites_cen[0].nom_site = form.nom_site.data
+            contrat.sites_cen[0].code_site = form.code_site.data
 
-        # Agriculteur
+        # Mise à jour de la société
+        if contrat.societe:
+            contrat.societe.nom_societe = form.nom_societe.data
+            contrat.societe.telephone = form.telephone.data
+            contrat.societe.email = form.email.data
+            contrat.societe.remarques = form.remarques.data
+            contrat.societe.siret = form.siret.data
+            contrat.societe.activite_principale = form.activite_principale.data
+            contrat.societe.categorie_juridique = form.categorie_juridique.data
+            contrat.societe.tranche_effectif = form.tranche_effectif.data
+            contrat.societe.adresse_etablissement = form.adresse_etablissement.data
+
+        # Mise à jour de l'agriculteur
         if contrat.societe and contrat.societe.agriculteurs_intermediaires:
-            form.nom_agri.data = contrat.societe.agriculteurs_intermediaires[0].agriculteur.nom_agri
-            form.prenom_agri.data = contrat.societe.agriculteurs_intermediaires[0].agriculteur.prenom_agri
-            form.date_naissance.data = contrat.societe.agriculteurs_intermediaires[0].agriculteur.date_naissance
-
-        # Sélection multiple
-        form.type_milieu.data = [milieu.type_milieu.id_type_milieu for milieu in contrat.types_milieu]
-        form.produit_fini.data = [produit.produit_fini.id_type_produit_fini for produit in contrat.produits_finis]
-        
-        # Récupérer tous les types de production
-        form.type_production.data = [prod.type_production.id_type_production for prod in contrat.societe.types_production_societe]
-        
-        # Séparer les types de production par mode (bio et conventionnel)
-        type_production_bio = []
-        type_production_conv = []
-        
-        # ID des modes de production
-        mode_production_bio_id = 1  # ID pour le mode Bio
-        mode_production_conv_id = 2  # ID pour le mode Conventionnelle
-        
-        # Parcourir les types de production associés à la société
-        if contrat.societe and contrat.societe.types_production_societe:
-            for tps in contrat.societe.types_production_societe:
-                if tps.id_mode_production == mode_production_bio_id:
-                    type_production_bio.append(tps.id_type_production)
-                elif tps.id_mode_production == mode_production_conv_id:
-                    type_production_conv.append(tps.id_type_production)
-        
-        # Ajouter ces listes au contexte pour le template
-        form.type_production_bio = type_production_bio
-        form.type_production_conv = type_production_conv
-        
-        # Mode de production par défaut
-        if contrat.societe.types_production_societe:
-            form.mode_production.data = contrat.societe.types_production_societe[0].id_mode_production
-
-        # Récupérer les productions existantes
-        existing_productions = {}
-        for prod in contrat.societe.types_production_societe:
-            mode_id = prod.id_mode_production
-            if mode_id not in existing_productions:
-                existing_productions[mode_id] = []
-            existing_productions[mode_id].append(prod.id_type_production)
-        
-        # Convertir en format JSON pour le template
-        initial_productions = [
-            {
-                'type_production': type_prods,
-                'mode_production': str(mode_id)
-            }
-            for mode_id, type_prods in existing_productions.items()
-        ]
-        
-        # Récupérer les autres contrats de la même société (s'il y en a)
-        autres_contrats = []
-        
-        # Récupérer d'abord l'id_societe du contrat actuel
-        id_societe_contrat_actuel = db.session.query(Contrat.id_societe).filter(Contrat.id_contrat == contract_id).scalar()
-        
-        if id_societe_contrat_actuel:
-            # Requête directe: tous les autres contrats ayant le même id_societe
-            autres_contrats = (
-                db.session.query(Contrat)
-                .options(
-                    selectinload(Contrat.sites_cen),
-                    selectinload(Contrat.type_contrat)
-                )
-                .filter(
-                    Contrat.id_societe == id_societe_contrat_actuel,
-                    Contrat.id_contrat != contract_id  # Exclure le contrat actuel
-                )
-                .all()
-            )
+            agriculteur = contrat.societe.agriculteurs_intermediaires[0].agriculteur
+            agriculteur.nom_agri = form.nom_agri.data
+            agriculteur.prenom_agri = form.prenom_agri.data
+            agriculteur.date_naissance = form.date_naissance.data
+
+        # Mise à jour du contrat
+        contrat.surf_contractualisee = form.surf_contractualisee.data
+        contrat.date_signature = form.date_signature.data
+        contrat.date_prise_effet = form.date_prise_effet.data
+        contrat.date_fin = form.date_fin.data
+        contrat.id_type_contrat = form.appellation_contrat.data
+        contrat.remarques = form.remarques_contrat.data
+
+        # Mise à jour du référent
+        if contrat.referent:
+            contrat.referent.nom_referent = form.nom_referent.data
+            contrat.referent.prenom_referent = form.prenom_referent.data
 
-        else:
-            autres_contrats = []
-        
-        return render_template('edit_contract.html', 
-                            contrat=contrat, 
-                            form=form, 
-                            initial_productions=json.dumps(initial_productions),
-                            geojson=sites_geojson,
-                            autres_contrats=autres_contrats)
+        # Mise à jour des relations
+        contrat.types_milieu = [TypeMilieuContrat(id_type_milieu=mid, id_contrat=contrat.id_contrat) for mid in form.type_milieu.data]
+        contrat.produits_finis = [ProduitFiniContrat(id_type_produit_fini=pid, id_contrat=contrat.id_contrat) for pid in form.produit_fini.data]
 
-    # 🟢 Traitement du formulaire soumis
-    elif request.method == 'POST':
+        # Récupérer les données de production du formulaire
         try:
-            # Mise à jour des informations générales
-            if contrat.sites_cen and len(contrat.sites_cen) > 0:
-                contrat.sites_cen[0].nom_site = form.nom_site.data
-                contrat.sites_cen[0].code_site = form.code_site.data
-
-            # Mise à jour de la société
-            if contrat.societe:
-                contrat.societe.nom_societe = form.nom_societe.data
-                contrat.societe.telephone = form.telephone.data
-                contrat.societe.email = form.email.data
-                contrat.societe.remarques = form.remarques.data
-                contrat.societe.siret = form.siret.data
-                contrat.societe.activite_principale = form.activite_principale.data
-                contrat.societe.categorie_juridique = form.categorie_juridique.data
-                contrat.societe.tranche_effectif = form.tranche_effectif.data
-                contrat.societe.adresse_etablissement = form.adresse_etablissement.data
-
-            # Mise à jour de l'agriculteur
-            if contrat.societe and contrat.societe.agriculteurs_intermediaires:
-                agriculteur = contrat.societe.agriculteurs_intermediaires[0].agriculteur
-                agriculteur.nom_agri = form.nom_agri.data
-                agriculteur.prenom_agri = form.prenom_agri.data
-                agriculteur.date_naissance = form.date_naissance.data
-
-            # Mise à jour du contrat
-            contrat.surf_contractualisee = form.surf_contractualisee.data
-            contrat.date_signature = form.date_signature.data
-            contrat.date_prise_effet = form.date_prise_effet.data
-            contrat.date_fin = form.date_fin.data
-            contrat.id_type_contrat = form.appellation_contrat.data
-            contrat.remarques = form.remarques_contrat.data
-
-            # Mise à jour du référent
-            if contrat.referent:
-                contrat.referent.nom_referent = form.nom_referent.data
-                contrat.referent.prenom_referent = form.prenom_referent.data
-
-            # Mise à jour des relations
-            contrat.types_milieu = [TypeMilieuContrat(id_type_milieu=mid, id_contrat=contrat.id_contrat) for mid in form.type_milieu.data]
-            contrat.produits_finis = [ProduitFiniContrat(id_type_produit_fini=pid, id_contrat=contrat.id_contrat) for pid in form.produit_fini.data]
-            
-            # Récupérer les données de production du formulaire
-            try:
-                all_productions = json.loads(request.form.get('all_productions', '[]'))
-                
-                # Vérifier que nous avons des données valides
-                if not all_productions:
-                    flash("Veuillez ajouter au moins un type de production avec son mode.", "danger")
-                    return render_template('edit_contract.html', contrat=contrat, form=form, geojson=sites_geojson)
-                
-                # Vérifier que chaque entrée a un mode de production
-                for prod in all_productions:
-                    if not prod.get('mode_production'):
-                        flash("Veuillez sélectionner un mode de production pour chaque type de production.", "danger")
-                        return render_template('edit_contract.html', contrat=contrat, form=form, geojson=sites_geojson)
-                
-                # Créer une nouvelle liste de TypeProductionSociete
-                new_types_production = []
-                for prod in all_productions:
-                    type_productions = prod.get('type_production', [])
-                    mode_production = prod.get('mode_production')
-                    
-                    if type_productions and mode_production:
-                        for type_prod in type_productions:
-                            new_types_production.append(
-                                TypeProductionSociete(
-                                    id_type_production=int(type_prod),
-                                    id_societe=contrat.societe.id_societe,
-                                    id_mode_production=int(mode_production)
-                                )
-                            )
-                
-                # Remplacer la liste existante par la nouvelle liste
-                contrat.societe.types_production_societe = new_types_production
-                
-            except json.JSONDecodeError:
-                flash("Erreur lors de la lecture des données de production.", "danger")
-                return render_template('edit_contract.html', contrat=contrat, form=form, geojson=sites_geojson)
+            all_productions = json.loads(request.form.get('all_productions', '[]'))
+        except json.JSONDecodeError:
+            flash("Erreur lors de la lecture des données de production.", "danger")
+            return render_template('edit_contract.html', form=form, **context)
+
+        # Vérifier que nous avons des données valides
+        if not all_productions:
+            flash("Veuillez ajouter au moins un type de production avec son mode.", "danger")
+            return render_template('edit_contract.html', form=form, **context)
+
+        # Vérifier que chaque entrée a un mode de production
+        if any(not prod.get('mode_production') for prod in all_productions):
+            flash("Veuillez sélectionner un mode de production pour chaque type de production.", "danger")
+            return render_template('edit_contract.html', form=form, **context)
+
+        # Remplacer la liste existante par la nouvelle liste de TypeProductionSociete
+        contrat.societe.types_production_societe = [
+            TypeProductionSociete(
+                id_type_production=int(type_prod),
+                id_societe=contrat.societe.id_societe,
+                id_mode_production=int(prod['mode_production'])
+            )
+            for prod in all_productions
+            for type_prod in prod.get('type_production', [])
+        ]
 
-            db.session.commit()
-            flash("Les modifications ont été enregistrées avec succès.", "success")
-            return redirect(url_for('map_page'))
+        # Lignes de la carte du contrat et de ceux qui partagent sa société, son agriculteur ou son référent
+        sync_contrat_map(
+            contrat_ids=[contrat.id_contrat],
+            societe_ids=[contrat.id_societe],
+            referent_ids=[contrat.id_referent] if contrat.id_referent else [],
+            agriculteur_ids=[lien.id_agriculteur for lien in contrat.societe.agriculteurs_intermediaires] if contrat.societe else [],
+        )
+        db.session.commit()
+        contrats_modifies()
+        flash("Les modifications ont été enregistrées avec succès.", "success")
+        return redirect(url_for('.map_page'))
 
-        except Exception as e:
-            db.session.rollback()
-            flash(f"Erreur lors de la mise à jour : {str(e)}", "danger")
+    except Exception as e:
+        db.session.rollback()
+        flash(f"Erreur lors de la mise à jour : {str(e)}", "danger")
 
-    # Récupérer les données GeoJSON pour la carte
-    sites_geojson = get_geojson_data()
-    
-    # Récupérer les autres contrats de la même société (s'il y en a)
-    autres_contrats = []
-    
-    # Récupérer d'abord l'id_societe du contrat actuel
-    id_societe_contrat_actuel = db.session.query(Contrat.id_societe).filter(Contrat.id_contrat == contract_id).scalar()
-    
-    if id_societe_contrat_actuel:
-        # Requête directe: tous les autres contrats ayant le même id_societe
-        autres_contrats = (
-            db.session.query(Contrat)
-            .options(
-                selectinload(Contrat.sites_cen),
-                selectinload(Contrat.type_contrat)
-            )
-            .filter(
-                Contrat.id_societe == id_societe_contrat_actuel,
-                Contrat.id_contrat != contract_id  # Exclure le contrat actuel
-            )
-            .all()
-        )
-        print(f"Autres contrats trouvés: {len(autres_contrats)}")
-        if autres_contrats:
-            for ac in autres_contrats:
-                print(f"  - Contrat #{ac.id_contrat} (société: {ac.id_societe})")
-        else:
-            print("Aucun autre contrat trouvé pour cette société.")
-    else:
-        print(f"Contrat {contract_id} n'a pas d'id_societe associé.")
-        autres_contrats = []
-    
-    return render_template('edit_contract.html', contrat=contrat, form=form, geojson=sites_geojson, autres_contrats=autres_contrats)
+    # Après une erreur, la session est annulée : le contexte est rechargé depuis la base
+    context = get_edit_context(contract_id)
+    if context is None:
+        return redirect(url_for('.map_page'))
+    return render_template('edit_contract.html', form=form, **context)
 
 
-@app.route('/delete_contract/<int:contract_id>', methods=['POST'])
+@bp.route('/delete_contract/<int:contract_id>', methods=['POST'])
 def delete_contract(contract_id):
     try:
-        # Récupérer le contrat principal
-        contrat = Contrat.query.get(contract_id)
-        if not contrat:
+        # Contrat, associations et données orphelines supprimés en une seule transaction (voir contrats.delete_contrats)
+        if not delete_contrats([contract_id]):
             flash("Contrat introuvable.", "danger")
-            return redirect(url_for('map_page'))
-
-        # Récupérer les IDs associés
-        societe_id = contrat.id_societe
-        referent_id = contrat.id_referent
-
-        # Supprimer les associations avec les sites CEN
-        # Comme les informations des sites sont maintenant directement dans ContratSiteCEN,
-        # il suffit de supprimer les enregistrements associés au contrat
-        ContratSiteCEN.query.filter_by(id_contrat=contract_id).delete()
-
-        # Supprimer les associations avec les types de milieu
-        db.session.query(TypeMilieuContrat).filter_by(id_contrat=contract_id).delete()
-
-        # Supprimer les associations avec les produits finis
-        db.session.query(ProduitFiniContrat).filter_by(id_contrat=contract_id).delete()
-
-        # Supprimer les associations dans TypeProductionSociete (types de production)
-        db.session.query(TypeProductionSociete).filter_by(id_societe=societe_id).delete()
-
-
-        # Supprimer le contrat principal
-        db.session.delete(contrat)
-        db.session.commit()
-
-        # Supprimer les associations dans AgriculteurSociete
-        db.session.query(AgriculteurSociete).filter_by(id_societe=societe_id).delete()
-
-        # Supprimer les agriculteurs orphelins
-        agriculteurs = db.session.query(Agriculteur).all()
-        for agriculteur in agriculteurs:
-            # Vérifier si l'agriculteur est lié à d'autres sociétés
-            if not db.session.query(AgriculteurSociete).filter_by(id_agriculteur=agriculteur.id_agriculteur).first():
-                db.session.delete(agriculteur)
-
+            return redirect(url_for('.map_page'))
 
-        # Supprimer la société si elle est orpheline
-        if not Contrat.query.filter_by(id_societe=societe_id).first():
-            societe = Societe.query.get(societe_id)
-            if societe:
-                db.session.delete(societe)
+        flash("Contrat et toutes les données associées ont été supprimés avec succès.", "success")
+        return redirect(url_for('.map_page'))
 
-        # Supprimer le référent si orphelin
-        if not Contrat.query.filter_by(id_referent=referent_id).first():
-            referent = Referent.query.get(referent_id)
-            if referent:
-                db.session.delete(referent)
+    except Exception as e:
+        flash(f"Erreur lors de la suppression du contrat : {str(e)}", "danger")
+        return redirect(url_for('.map_page'))
 
-        db.session.commit()
 
-        flash("Contrat et toutes les données associées ont été supprimés avec succès.", "success")
-        return redirect(url_for('map_page'))
+@bp.route('/api/contrats/delete', methods=['POST'])
+@login_required
+def api_delete_contrats():
+    """
+    Suppression en masse de contrats. Corps JSON : {"ids": [1, 2, 3]}.
+    Les sociétés, agriculteurs et référents devenus orphelins sont supprimés dans la même transaction.
+    """
+    ids = (request.get_json(silent=True) or {}).get('ids')
+    if not isinstance(ids, list) or not all(isinstance(contrat_id, int) and not isinstance(contrat_id, bool) for contrat_id in ids):
+        return jsonify({"error": "Le corps doit contenir une liste d'identifiants entiers « ids »."}), 400
 
+    try:
+        deleted = delete_contrats(ids)
     except Exception as e:
-        db.session.rollback()
-        flash(f"Erreur lors de la suppression du contrat : {str(e)}", "danger")
-        return redirect(url_for('map_page'))
+        return jsonify({"error": f"Erreur lors de la suppression des contrats : {str(e)}"}), 500
 
+    return jsonify({"demandes": len(set(ids)), "supprimes": deleted})
 
-@app.route('/dataviz_page')
+
+@bp.route('/dataviz_page')
 def dataviz_page():
     return redirect('https://superset.wanderzen.fr/superset/dashboard/ac7ee9d3-0b70-4b5a-ab12-85fa8902ad95/?native_filters_key=1E8OrhaQWKwHkNOL-XNkq3P7SqIrJ31O-dCGuceUos3gXMTbszYVrUmzjDrIZVcE')  
 
 
-@app.route('/api/search_agriculteur', methods=['POST'])
+def get_search_params():
+    """Terme et nombre maximal de résultats d'une recherche (corps JSON : search_term, limit)."""
+    payload = request.get_json(silent=True) or {}
+    search_term = str(payload.get("search_term", "")).strip()
+    try:
+        limit = int(payload.get("limit") or current_app.config['SEARCH_DEFAULT_LIMIT'])
+    except (TypeError, ValueError):
+        limit = current_app.config['SEARCH_DEFAULT_LIMIT']
+    return search_term, min(max(1, limit), current_app.config['SEARCH_MAX_LIMIT'])
+
+
+@bp.route('/api/search_agriculteur', methods=['POST'])
 def search_agriculteur():
-    search_term = request.json.get("search_term", "").strip().lower()
+    search_term, limit = get_search_params()
     if not search_term:
         return jsonify([]), 200
 
-    # Rechercher les agriculteurs dont le nom ou le prénom contient le terme de recherche
-    agriculteurs = Agriculteur.query.filter(
-        db.or_(
-            db.func.lower(Agriculteur.nom_agri).contains(search_term),
-            db.func.lower(Agriculteur.prenom_agri).contains(search_term)
-        )
-    ).all()
+    # Recherche indexée (trigrammes, sans accents), classée et limitée : voir search.py
+    agriculteurs = search_people('agriculteur', search_term, limit)
 
     # Formater les résultats
     results = [{
@@ -1044,20 +694,14 @@ def search_agriculteur():
     return jsonify(results), 200
 
 
-@app.route('/api/search_referent', methods=['POST'])
+@bp.route('/api/search_referent', methods=['POST'])
 def search_referent():
-    search_term = request.json.get("search_term", "").strip().lower()
+    search_term, limit = get_search_params()
     if not search_term:
         return jsonify([]), 200
 
-    # Rechercher les référents dont le nom ou le prénom contient le terme de recherche
-    referents = Referent.query.filter(
-        db.or_(
-            db.func.lower(Referent.nom_referent).contains(search_term),
-            db.func.lower(Referent.prenom_referent).contains(search_term),
-            db.func.lower(db.func.concat(Referent.nom_referent, ' ', Referent.prenom_referent)).contains(search_term)
-        )
-    ).all()
+    # Recherche indexée (trigrammes, sans accents), classée et limitée : voir search.py
+    referents = search_people('referent', search_term, limit)
 
     # Formater les résultats
     results = [
@@ -1072,7 +716,46 @@ def search_referent():
     return jsonify(results), 200
 
 
-@app.route('/api/check_existing_contract_by_siret/<siret>', methods=['GET'])
+@bp.route('/api/search')
+@login_required
+def api_search():
+    """
+    Recherche globale typée (sociétés, SIRET, agriculteurs, référents, sites, numéros de contrat).
+    Paramètres : q (terme), types (liste séparée par des virgules, tous par défaut), limit.
+    """
+    term = request.args.get('q', '').strip()
+    if not term:
+        return jsonify([]), 200
+
+    types = [t for t in request.args.get('types', '').split(',') if t] or SEARCH_INDEX_TYPES
+    unknown = [t for t in types if t not in SEARCH_INDEX_TYPES]
+    if unknown:
+        return jsonify({"error": f"Type(s) inconnu(s) : {', '.join(unknown)}"}), 400
+
+    limit = min(max(1, request.args.get('limit', type=int) or current_app.config['SEARCH_DEFAULT_LIMIT']), current_app.config['SEARCH_MAX_LIMIT'])
+    return jsonify(global_search(term, types, limit)), 200
+
+
+@bp.cli.command('refresh-search-index')
+def refresh_search_index_command():
+    """Recalcule la vue matérialisée de la recherche globale (saisie.search_index)."""
+    refresh_search_index()
+    print("Index de recherche globale rafraîchi.")
+
+
+@bp.cli.command('purge-sessions')
+def purge_sessions_command():
+    """Supprime les sessions expirées de la table saisie.flask_session."""
+    print(f"{purge_expired_sessions()} sessions expirées supprimées.")
+
+
+@bp.cli.command('refresh-contrat-map')
+def refresh_contrat_map_command():
+    """Recalcule toute la table des contrats de la carte (saisie.contrat_map), après une écriture hors application."""
+    print(f"Table des contrats de la carte recalculée : {rebuild_contrat_map()} contrats.")
+
+
+@bp.route('/api/check_existing_contract_by_siret/<siret>', methods=['GET'])
 def check_existing_contract_by_siret(siret):
     """
     Vérifie si un SIRET correspond à un contrat existant et renvoie l'ID du contrat et le nom de la société
@@ -1098,8 +781,3 @@ def check_existing_contract_by_siret(siret):
             'exists': False,
             'error': str(e)
         }), 500
-
-
-
-if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""
+Préchauffage des caches au démarrage et point d'accès de disponibilité.
+
+warm_caches() charge les référentiels et la FeatureCollection des sites CEN
+(niveaux de SITES_WARM_ZOOMS) avant que le worker ne serve des requêtes. Avec
+gunicorn --preload, il est exécuté une seule fois dans le processus maître :
+les workers créés ensuite par fork partagent ces caches en copie sur écriture
+(CACHE_TYPE=SimpleCache, cache propre au processus). Les connexions ouvertes
+pendant le préchauffage sont fermées avant le fork.
+
+Selon WARMUP, le préchauffage est fait avant de servir ("sync"), dans un
+thread pendant que le serveur démarre ("background", utile avec waitress) ou
+pas du tout ("off"). GET /ready répond 503 tant qu'il n'est pas terminé.
+
+Si une étape échoue (base FoncierCEN momentanément injoignable, par exemple),
+les étapes en échec sont relancées en arrière-plan lors des appels à /ready,
+avec un délai doublé à chaque tentative (WARMUP_RETRY_DELAY, au plus
+WARMUP_RETRY_MAX_DELAY secondes) : le worker redevient disponible dès
+qu'elles aboutissent.
+"""
+import threading
+import time
+
+from flask import current_app
+
+from models import db
+from referentiel import warm_referentiels
+from session_backend import check_session_table
+from sites_cen import warm_sites_cache
+
+WARMUP_MODES = ('sync', 'background', 'off')
+
+
+def warmup_steps():
+    """Étapes du préchauffage : nom -> fonction retournant un compte (à appeler dans un contexte d'application)."""
+    steps = {
+        # Relations des modèles résolues une fois (SQLAlchemy le ferait à la première requête)
+        'modeles': lambda: db.configure_mappers() or len(db.Model.registry.mappers),
+        'referentiels': warm_referentiels,
+        'sites_cen': lambda: len(warm_sites_cache()),
+    }
+    # Table des sessions absente (migration non appliquée) : /ready le signale dès le démarrage
+    if current_app.config['SESSION_TYPE'] == 'postgresql':
+        steps['sessions'] = check_session_table
+    return steps
+
+
+def warm_caches(app, names=None, dispose=True):
+    """
+    Charge les caches du worker (toutes les étapes, ou seulement `names`) et enregistre
+    l'état du préchauffage dans app.extensions['warmup'].
+    """
+    state = app.extensions['warmup']
+    start = time.perf_counter()
+    with app.app_context():
+        steps = warmup_steps()
+        for name in names or steps:
+            try:
+                state['caches'][name] = steps[name]()
+                state['erreurs'].pop(name, None)
+            except Exception as e:
+                db.session.rollback()
+                state['erreurs'][name] = str(e)
+                app.logger.error(f"Échec du préchauffage du cache {name} : {e}")
+        db.session.remove()
+        if dispose:
+            # Aucune connexion ne doit être héritée par les workers créés par fork
+            for engine in db.engines.values():
+                engine.dispose()
+    state['duree'] = round(time.perf_counter() - start, 3)
+    state['tentatives'] += 1
+    state['pret'] = not state['erreurs']
+    state['en_cours'] = False
+
+
+def retry_warmup(app):
+    """Relance en arrière-plan les étapes en échec, si le délai depuis la dernière tentative est écoulé."""
+    state = app.extensions['warmup']
+    retry = app.extensions['warmup_retry']
+    with retry['lock']:
+        if state['pret'] or state['en_cours'] or not state['erreurs'] or time.monotonic() < retry['prochain_essai']:
+            return
+        delay = min(app.config['WARMUP_RETRY_DELAY'] * 2 ** (state['tentatives'] - 1), app.config['WARMUP_RETRY_MAX_DELAY'])
+        retry['prochain_essai'] = time.monotonic() + delay
+        state['en_cours'] = True
+    threading.Thread(
+        target=warm_caches, args=(app, list(state['erreurs'])), kwargs={'dispose': False},
+        name='warmup-retry', daemon=True
+    ).start()
+
+
+def start_warmup(app):
+    """Lance le préchauffage selon WARMUP."""
+    mode = app.config['WARMUP']
+    if mode not in WARMUP_MODES:
+        raise ValueError(f"WARMUP doit valoir {', '.join(WARMUP_MODES)} (reçu : {mode}).")
+
+    state = app.extensions['warmup']
+    if mode == 'off':
+        state['pret'] = True
+        return
+    state['en_cours'] = True
+    app.extensions['warmup_retry']['prochain_essai'] = time.monotonic() + app.config['WARMUP_RETRY_DELAY']
+    if mode == 'sync':
+        warm_caches(app)
+    else:
+        threading.Thread(target=warm_caches, args=(app,), name='warmup', daemon=True).start()
+
+
+def init_warmup(app):
+    """Enregistre l'état du préchauffage (lu par la route /ready de views.py)."""
+    app.extensions['warmup'] = {
+        'pret': False, 'en_cours': False, 'tentatives': 0, 'duree': None, 'caches': {}, 'erreurs': {}
+    }
+    app.extensions['warmup_retry'] = {'lock': threading.Lock(), 'prochain_essai': 0.0}
@@ -0,0 +1,20 @@
+"""
+Point d'entrée WSGI de production.
+
+    gunicorn -c gunicorn.conf.py                  (wsgi_app = "wsgi:create_app()")
+    waitress-serve --call wsgi:create_app         (ou python serve.py)
+
+create_app() retourne l'application de application.create_app() après avoir
+lancé le préchauffage des caches (WARMUP, voir warmup.py). Avec gunicorn
+--preload, il est appelé une seule fois dans le processus maître, avant le
+fork des workers.
+"""
+import application
+from warmup import start_warmup
+
+
+def create_app():
+    """Application prête à servir, caches préchauffés selon WARMUP."""
+    app = application.create_app()
+    start_warmup(app)
+    return app